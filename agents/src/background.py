@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import importlib
+import threading
+from typing import Any, Dict, List, Optional, Set
+from langchain_core.load import dumpd, load
+from agents.src.loop_monitor import ensure_loop_monitor
+
+# Set to "http" to run background graphs as runs on the LangGraph API server
+# (e.g. multi-process deployments). Defaults to running them in this process.
+BACKGROUND_EXECUTION_ENV = "OC_BACKGROUND_EXECUTION"
+IN_PROCESS_EXECUTION = "in_process"
+HTTP_EXECUTION = "http"
+
+DEFAULT_QUEUE_PATH = ".oc_background_jobs.sqlite3"
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_PENDING_JOBS = 1000
+DEFAULT_MAX_ATTEMPTS = 3
+
+# How long an idle worker sleeps before re-checking for due jobs
+IDLE_POLL_SECONDS = 5.0
+
+BACKGROUND_GRAPHS = {
+    "reflection": "agents.src.reflection.index",
+    "thread_title": "agents.src.thread_title.index",
+    "summarizer": "agents.src.summarizer.index",
+}
+
+# Graphs that can't run without a store. Jobs queued before a restart wait
+# until the store is known again.
+STORE_GRAPHS = {"reflection"}
+
+def use_in_process_background_execution() -> bool:
+    """Check if background graphs should run in this process instead of over HTTP."""
+    return os.getenv(BACKGROUND_EXECUTION_ENV, IN_PROCESS_EXECUTION) != HTTP_EXECUTION
+
+class BackgroundExecutor:
+    """Runs the reflection, thread title and summarizer graphs in-process.
+
+    Jobs are persisted to a local SQLite queue before they are acknowledged, so
+    they survive a crash or restart and are picked up again when the executor
+    next starts. A bounded pool of asyncio workers runs due jobs, and `submit`
+    rejects new jobs once `max_pending_jobs` are queued. SQLite calls run in a
+    thread, so they never block the event loop.
+    """
+
+    def __init__(
+        self,
+        queue_path: str = DEFAULT_QUEUE_PATH,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending_jobs: int = DEFAULT_MAX_PENDING_JOBS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ):
+        self.max_workers = max_workers
+        self.max_pending_jobs = max_pending_jobs
+        self.max_attempts = max_attempts
+        # Runtime resources can't be persisted, so the latest seen are attached to each job
+        self.store: Any = None
+        self.checkpointer: Any = None
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(queue_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                graph TEXT NOT NULL,
+                input TEXT NOT NULL,
+                config TEXT NOT NULL,
+                run_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "dedupe_key" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN dedupe_key TEXT")
+        if "created_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN created_at REAL")
+        self._running: Set[str] = set()
+        self._running_keys: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def pending_count(self) -> int:
+        return await asyncio.to_thread(self._count_jobs)
+
+    def _count_jobs(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def start(self, store: Any = None, checkpointer: Any = None) -> None:
+        """Start the workers on the running event loop, if they aren't running.
+
+        Jobs left in the queue by a previous process are picked up right away.
+        Call this when the host starts, with the store and checkpointer the
+        graphs run with, so those jobs don't wait for the next `submit`.
+
+        Args:
+            store: The store to pass to the graphs
+            checkpointer: The checkpointer the graphs read and update threads with
+        """
+        if store is not None:
+            self.store = store
+        if checkpointer is not None:
+            self.checkpointer = checkpointer
+        self._ensure_started()
+        self._wakeup.set()
+
+    async def submit(
+        self,
+        graph_name: str,
+        input: Dict[str, Any],
+        config: Dict[str, Any],
+        delay_seconds: float = 0,
+        store: Any = None,
+        checkpointer: Any = None,
+        dedupe_key: Optional[str] = None,
+        max_delay_seconds: Optional[float] = None
+    ) -> bool:
+        """Queue a background graph run.
+
+        If `dedupe_key` is set and a job with the same key is still pending, no
+        new job is created. Instead the pending job is debounced: it is pushed
+        back to `delay_seconds` from now (but no later than `max_delay_seconds`
+        after it was first queued), and the new input is merged into it. List
+        values are merged as an ordered union, other values are replaced.
+        Jobs sharing a key never run concurrently.
+
+        Args:
+            graph_name: One of `BACKGROUND_GRAPHS`
+            input: The graph input. Messages are serialized with `langchain_core.load`.
+            config: The run config. Must be JSON serializable.
+            delay_seconds: Seconds to wait before running the job
+            store: The store to pass to the graph, if it needs one
+            checkpointer: The checkpointer the graph reads the source thread from
+            dedupe_key: Key to coalesce pending jobs on
+            max_delay_seconds: Upper bound on how long a debounced job can be delayed
+
+        Returns:
+            bool: False if the queue is full and the job was not accepted
+        """
+        if graph_name not in BACKGROUND_GRAPHS:
+            raise ValueError(f"Unknown background graph: {graph_name}")
+
+        accepted = await asyncio.to_thread(
+            self._insert_job, graph_name, dumpd(input), config, delay_seconds, dedupe_key, max_delay_seconds
+        )
+        if accepted:
+            self.start(store, checkpointer)
+        return accepted
+
+    def _insert_job(
+        self,
+        graph_name: str,
+        serialized_input: Dict[str, Any],
+        config: Dict[str, Any],
+        delay_seconds: float,
+        dedupe_key: Optional[str],
+        max_delay_seconds: Optional[float]
+    ) -> bool:
+        now = time.time()
+        with self._lock:
+            if dedupe_key is not None and self._debounce_pending_job(
+                dedupe_key, serialized_input, config, now, delay_seconds, max_delay_seconds
+            ):
+                return True
+
+            pending = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            if pending >= self.max_pending_jobs:
+                return False
+            self._conn.execute(
+                "INSERT INTO jobs (id, graph, input, config, run_at, dedupe_key, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(uuid.uuid4()),
+                    graph_name,
+                    json.dumps(serialized_input),
+                    json.dumps(config),
+                    now + delay_seconds,
+                    dedupe_key,
+                    now
+                )
+            )
+        return True
+
+    def _debounce_pending_job(
+        self,
+        dedupe_key: str,
+        serialized_input: Dict[str, Any],
+        config: Dict[str, Any],
+        now: float,
+        delay_seconds: float,
+        max_delay_seconds: Optional[float]
+    ) -> bool:
+        # Must be called with `self._lock` held
+        rows = self._conn.execute(
+            "SELECT id, input, created_at FROM jobs WHERE dedupe_key = ? ORDER BY run_at",
+            (dedupe_key,)
+        ).fetchall()
+        pending = [row for row in rows if row[0] not in self._running]
+        if not pending:
+            return False
+
+        job_id, existing_input, created_at = pending[0]
+        run_at = now + delay_seconds
+        if max_delay_seconds is not None and created_at is not None:
+            run_at = min(run_at, created_at + max_delay_seconds)
+
+        self._conn.execute(
+            "UPDATE jobs SET input = ?, config = ?, run_at = ? WHERE id = ?",
+            (
+                json.dumps(_merge_inputs(json.loads(existing_input), serialized_input)),
+                json.dumps(config),
+                run_at,
+                job_id
+            )
+        )
+        return True
+
+    def _ensure_started(self) -> None:
+        ensure_loop_monitor()
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers and not all(worker.done() for worker in self._workers):
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"oc-background-worker-{idx}")
+            for idx in range(self.max_workers)
+        ]
+
+    def _claim_due_job(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, graph, input, config, attempts, dedupe_key FROM jobs WHERE run_at <= ? ORDER BY run_at",
+                (time.time(),)
+            ).fetchall()
+            for job_id, graph_name, input, config, attempts, dedupe_key in rows:
+                if job_id in self._running or dedupe_key in self._running_keys:
+                    continue
+                if graph_name in STORE_GRAPHS and self.store is None:
+                    continue
+                self._running.add(job_id)
+                if dedupe_key is not None:
+                    self._running_keys.add(dedupe_key)
+                return {
+                    "id": job_id,
+                    "graph": graph_name,
+                    "input": input,
+                    "config": config,
+                    "attempts": attempts,
+                    "dedupe_key": dedupe_key
+                }
+        return None
+
+    def _seconds_until_next_job(self) -> float:
+        # Jobs waiting for a store aren't due yet
+        skipped = list(STORE_GRAPHS) if self.store is None else []
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MIN(run_at) FROM jobs WHERE graph NOT IN ({', '.join('?' * len(skipped))})",
+                skipped
+            ).fetchone()
+        if not row or row[0] is None:
+            return IDLE_POLL_SECONDS
+        return min(IDLE_POLL_SECONDS, max(0.0, row[0] - time.time()))
+
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self._claim_due_job)
+            if job is None:
+                self._wakeup.clear()
+                timeout = await asyncio.to_thread(self._seconds_until_next_job)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                await asyncio.to_thread(self._retry_or_drop_job, job, e)
+            else:
+                await asyncio.to_thread(self._delete_job, job["id"])
+            finally:
+                self._running.discard(job["id"])
+                self._running_keys.discard(job["dedupe_key"])
+                # A job sharing this key may have been held back while this one ran
+                self._wakeup.set()
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        graph = importlib.import_module(BACKGROUND_GRAPHS[job["graph"]]).graph
+        if self.store is not None:
+            # Nodes get the store from the graph's runtime, like on the server
+            graph = graph.copy(update={"store": self.store})
+        config = json.loads(job["config"])
+        if self.checkpointer is not None:
+            # The checkpointer of the source thread, which the graphs read and
+            # write their results to. It isn't the background graph's own
+            # `__pregel_checkpointer`, as background runs aren't checkpointed.
+            config.setdefault("configurable", {})["checkpointer"] = self.checkpointer
+        await graph.ainvoke(load(json.loads(job["input"])), config)
+
+    def _retry_or_drop_job(self, job: Dict[str, Any], error: Exception) -> None:
+        attempts = job["attempts"] + 1
+        with self._lock:
+            if attempts >= self.max_attempts:
+                print(f"Background {job['graph']} job {job['id']} failed after {attempts} attempts: {error}")
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job["id"],))
+            else:
+                print(f"Background {job['graph']} job {job['id']} failed, retrying: {error}")
+                self._conn.execute(
+                    "UPDATE jobs SET attempts = ?, run_at = ? WHERE id = ?",
+                    (attempts, time.time() + 10 * 2 ** attempts, job["id"])
+                )
+
+    def _delete_job(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+def _merge_inputs(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(existing)
+    for key, value in new.items():
+        if isinstance(value, list) and isinstance(merged.get(key), list):
+            merged[key] = merged[key] + [v for v in value if v not in merged[key]]
+        else:
+            merged[key] = value
+    return merged
+
+_executor: Optional[BackgroundExecutor] = None
+
+def get_background_executor() -> BackgroundExecutor:
+    """Get the process-wide background executor, configured from the environment."""
+    global _executor
+    if _executor is None:
+        _executor = BackgroundExecutor(
+            queue_path=os.getenv("OC_BACKGROUND_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+            max_workers=int(os.getenv("OC_BACKGROUND_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+            max_pending_jobs=int(os.getenv("OC_BACKGROUND_MAX_PENDING_JOBS", DEFAULT_MAX_PENDING_JOBS))
+        )
+    return _executor
+
+def start_background_executor(store: Any = None, checkpointer: Any = None) -> Optional[BackgroundExecutor]:
+    """Start the in-process background executor, resuming queued jobs.
+
+    Does nothing when background graphs run over HTTP, or outside an event loop.
+
+    Args:
+        store: The store to pass to the graphs
+        checkpointer: The checkpointer the graphs read and update threads with
+
+    Returns:
+        Optional[BackgroundExecutor]: The started executor, or None
+    """
+    if not use_in_process_background_execution():
+        return None
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    executor = get_background_executor()
+    executor.start(store, checkpointer)
+    return executor
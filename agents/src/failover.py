@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+from shared.src.models import DEFAULT_MODEL_NAME
+from agents.src import metrics
+from agents.src.rate_limits import is_retryable_error
+from agents.src.utils import coalesced_invoke, get_model_from_config
+
+# Equivalent models a request can fail over or be hedged to. Override with a
+# JSON object in the `OC_MODEL_ALTERNATIVES` env var, e.g. to add Azure deployments.
+DEFAULT_MODEL_ALTERNATIVES: Dict[str, List[str]] = {
+    "gpt-4o-mini": ["claude-3-5-haiku-latest"],
+    "gpt-4o": ["claude-3-5-sonnet-latest"],
+    "claude-3-5-haiku-latest": ["gpt-4o-mini"],
+    "claude-3-5-sonnet-latest": ["gpt-4o"],
+}
+
+# Set to "true" to hedge the calls that opt in to hedging
+HEDGED_REQUESTS_ENV = "OC_HEDGED_REQUESTS"
+
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+# A hedge is sent once the first request is slower than this share of its recent calls
+HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_DELAY_SECONDS = 2.0
+MIN_HEDGE_DELAY_SECONDS = 0.25
+
+# Consecutive failures that open a model's circuit, and how long it stays open
+# before a single trial request is let through
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_OPEN_SECONDS = 30.0
+
+# An alternative is tried first once the primary's median latency is this many times worse
+LATENCY_FAILOVER_RATIO = 2.0
+
+class ModelHealth:
+    """Live latency and error stats of a model, with a circuit breaker."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def is_available(self) -> bool:
+        """Check if the circuit is closed, or open long enough to allow a trial request."""
+        if self.opened_at is None:
+            return True
+        return not self._trial_in_flight and time.monotonic() - self.opened_at >= CIRCUIT_OPEN_SECONDS
+
+    def allow_request(self) -> bool:
+        """Claim permission to send a request. Half-open circuits let a single trial request through."""
+        if not self.is_available():
+            return False
+        if self.opened_at is not None:
+            self._trial_in_flight = True
+        return True
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._trial_in_flight or (self.opened_at is None and self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD):
+            self.opened_at = time.monotonic()
+            metrics.increment(f"failover.{self.model_name}.circuit_opened")
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Release a claimed request that was cancelled before completing."""
+        self._trial_in_flight = False
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+_health: Dict[str, ModelHealth] = {}
+
+def get_model_health(model_name: str) -> ModelHealth:
+    if model_name not in _health:
+        _health[model_name] = ModelHealth(model_name)
+    return _health[model_name]
+
+def get_model_alternatives(model_name: str) -> List[str]:
+    """Get the models equivalent to `model_name`, including overrides from `OC_MODEL_ALTERNATIVES`."""
+    alternatives = dict(DEFAULT_MODEL_ALTERNATIVES)
+    try:
+        alternatives.update(json.loads(os.getenv("OC_MODEL_ALTERNATIVES", "") or "{}"))
+    except ValueError as e:
+        print(f"Ignoring invalid OC_MODEL_ALTERNATIVES: {e}")
+    return [name for name in alternatives.get(model_name, []) if name != model_name]
+
+def get_config_with_model(config: dict, model_name: str) -> dict:
+    """Copy a config, replacing its `custom_model_name`."""
+    return {
+        **config,
+        "configurable": {**config.get("configurable", {}), "custom_model_name": model_name}
+    }
+
+def rank_model_candidates(model_name: str) -> List[str]:
+    """Order a model and its alternatives by health.
+
+    Models with an open circuit are skipped. The primary model goes first
+    unless an alternative's median latency is `LATENCY_FAILOVER_RATIO` times
+    better. If every circuit is open, only the primary is returned.
+    """
+    candidates = [name for name in [model_name, *get_model_alternatives(model_name)] if get_model_health(name).is_available()]
+    if not candidates:
+        return [model_name]
+    if candidates[0] == model_name and len(candidates) > 1:
+        primary_p50 = get_model_health(candidates[0]).percentile(0.5)
+        alternative_p50 = get_model_health(candidates[1]).percentile(0.5)
+        if primary_p50 and alternative_p50 and primary_p50 > alternative_p50 * LATENCY_FAILOVER_RATIO:
+            metrics.increment(f"failover.{model_name}.latency_failovers")
+            candidates[0], candidates[1] = candidates[1], candidates[0]
+    return candidates
+
+def get_hedge_delay(model_name: str) -> float:
+    """Get how long to wait for a model before sending a hedged request."""
+    latency = get_model_health(model_name).percentile(HEDGE_PERCENTILE)
+    return max(MIN_HEDGE_DELAY_SECONDS, latency if latency is not None else DEFAULT_HEDGE_DELAY_SECONDS)
+
+def is_hedging_enabled() -> bool:
+    return os.getenv(HEDGED_REQUESTS_ENV, "false").lower() == "true"
+
+async def invoke_with_failover(
+    config: dict,
+    messages: List[Any],
+    extra: Optional[Dict[str, Any]] = None,
+    bind: Optional[Callable[[Any], Any]] = None,
+    hedge: bool = False,
+    run_config: Optional[Dict[str, Any]] = None
+) -> Any:
+    """Invoke the configured model, failing over to equivalent models.
+
+    Candidates are ranked by `rank_model_candidates`. A candidate that fails
+    with a retryable error (after its own retries) is recorded in its circuit
+    breaker and the next candidate is tried.
+
+    With `hedge` set and hedging enabled (see `HEDGED_REQUESTS_ENV`), a
+    duplicate request is sent to the next candidate once the first is slower
+    than its `HEDGE_PERCENTILE` latency, and the first response wins. Only
+    hedge short calls whose response can be discarded, e.g. routing.
+
+    Args:
+        config: Configuration dictionary. Its `custom_model_name` is the primary model.
+        messages: The prompt messages
+        extra: Options passed to `get_model_from_config`
+        bind: Optional function applied to each model, e.g. to bind tools
+        hedge: Whether this call may be hedged
+        run_config: Optional runnable config for the model call
+
+    Returns:
+        Any: The model response
+    """
+    model_name = config.get("configurable", {}).get("custom_model_name") or DEFAULT_MODEL_NAME
+    candidates = rank_model_candidates(model_name)
+
+    async def call(candidate: str) -> Any:
+        health = get_model_health(candidate)
+        model = await get_model_from_config(get_config_with_model(config, candidate), extra)
+        if bind:
+            model = bind(model)
+        started = time.monotonic()
+        try:
+            response = await coalesced_invoke(model, messages, run_config)
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception as e:
+            # Bad requests say nothing about the model's health
+            if is_retryable_error(e):
+                health.record_failure()
+            else:
+                health.release()
+            raise
+        health.record_success(time.monotonic() - started)
+        return response
+
+    remaining = iter(candidates)
+    task_models: Dict[asyncio.Future, str] = {}
+
+    def start_next() -> Optional[asyncio.Future]:
+        for candidate in remaining:
+            if get_model_health(candidate).allow_request():
+                task = asyncio.ensure_future(call(candidate))
+                task_models[task] = candidate
+                return task
+        return None
+
+    first = start_next()
+    if first is None:
+        # Every circuit is open and its trial request is taken, so try the primary anyway
+        return await call(model_name)
+
+    pending = {first}
+    hedge_delay = get_hedge_delay(task_models[first]) if hedge and is_hedging_enabled() else None
+    hedged = False
+    last_error: Optional[BaseException] = None
+    try:
+        while pending:
+            timeout = hedge_delay if not hedged and hedge_delay is not None else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                hedge_task = start_next()
+                if hedge_task is not None:
+                    metrics.increment(f"failover.{model_name}.hedges")
+                    pending.add(hedge_task)
+                continue
+
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        metrics.increment(f"failover.{model_name}.fallback_wins")
+                    return task.result()
+                last_error = task.exception()
+                if not is_retryable_error(last_error) and not isinstance(last_error, asyncio.TimeoutError):
+                    raise last_error
+
+            if not pending:
+                next_task = start_next()
+                if next_task is not None:
+                    metrics.increment(f"failover.{model_name}.failovers")
+                    pending.add(next_task)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise last_error
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+import weakref
+from typing import Optional
+from agents.src import metrics
+
+# Set to "true" to report code that blocks the event loop. Meant for debugging,
+# as it runs a watchdog thread next to every monitored loop.
+LOOP_MONITOR_ENV = "OC_LOOP_MONITOR"
+# Stalls longer than this many milliseconds are reported
+LOOP_LAG_THRESHOLD_ENV = "OC_LOOP_LAG_THRESHOLD_MS"
+DEFAULT_LAG_THRESHOLD_MS = 100
+
+HEARTBEAT_INTERVAL_SECONDS = 0.02
+
+class LoopMonitor:
+    """Reports code that blocks an event loop for longer than `threshold` seconds.
+
+    A heartbeat task on the loop records when it last ran, and a watchdog
+    thread checks it. Once the loop has been blocked past the threshold, the
+    watchdog prints the stack of the loop's thread, i.e. the code blocking it,
+    while the stall is still in progress. Stalls are counted in the
+    `event_loop.*` metrics.
+
+    Must be created on the thread running the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float):
+        self.loop = loop
+        self.threshold = threshold
+        self._thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._reported = False
+        self._stopped = threading.Event()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def start(self) -> None:
+        task = self.loop.create_task(self._heartbeat(), name="oc-loop-monitor")
+        task.add_done_callback(lambda _: self._stopped.set())
+        threading.Thread(target=self._watch, name="oc-loop-monitor", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def _heartbeat(self) -> None:
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            self._last_beat = time.monotonic()
+            lag = self._last_beat - started - HEARTBEAT_INTERVAL_SECONDS
+            if lag > self.threshold:
+                metrics.increment("event_loop.stalls")
+                metrics.increment("event_loop.stall_seconds", lag)
+            self._reported = False
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(HEARTBEAT_INTERVAL_SECONDS):
+            if self.loop.is_closed():
+                return
+            blocked = time.monotonic() - self._last_beat - HEARTBEAT_INTERVAL_SECONDS
+            if blocked <= self.threshold or self._reported:
+                continue
+            # Report each stall once, while the blocking code is still on the stack
+            self._reported = True
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "  (stack unavailable)\n"
+            print(
+                f"Event loop blocked for over {blocked * 1000:.0f}ms "
+                f"(threshold {self.threshold * 1000:.0f}ms) at:\n{stack}",
+                end=""
+            )
+
+_monitors: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LoopMonitor]" = weakref.WeakKeyDictionary()
+
+def is_loop_monitor_enabled() -> bool:
+    return os.getenv(LOOP_MONITOR_ENV, "false").lower() == "true"
+
+def ensure_loop_monitor() -> Optional[LoopMonitor]:
+    """Start monitoring the running event loop, if enabled with `OC_LOOP_MONITOR`.
+
+    Cheap to call repeatedly: each loop is only monitored once.
+
+    Returns:
+        Optional[LoopMonitor]: The loop's monitor, or None if monitoring is disabled
+    """
+    if not is_loop_monitor_enabled():
+        return None
+    loop = asyncio.get_running_loop()
+    monitor = _monitors.get(loop)
+    if monitor is None or monitor.stopped:
+        threshold = float(os.getenv(LOOP_LAG_THRESHOLD_ENV, DEFAULT_LAG_THRESHOLD_MS)) / 1000
+        monitor = LoopMonitor(loop, threshold)
+        monitor.start()
+        _monitors[loop] = monitor
+    return monitor
@@ -0,0 +1,23 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# Process-wide counters, e.g. prompt cache hits. Read them with `get_metrics`.
+_counters: Dict[str, float] = defaultdict(float)
+_lock = threading.Lock()
+
+def increment(name: str, value: float = 1) -> None:
+    """Add `value` to the counter `name`."""
+    with _lock:
+        _counters[name] += value
+
+def get_metrics(prefix: str = "") -> Dict[str, float]:
+    """Get a snapshot of the counters whose name starts with `prefix`."""
+    with _lock:
+        return {name: value for name, value in _counters.items() if name.startswith(prefix)}
+
+def reset_metrics(prefix: str = "") -> None:
+    """Reset the counters whose name starts with `prefix`."""
+    with _lock:
+        for name in [name for name in _counters if name.startswith(prefix)]:
+            del _counters[name]
@@ -1,9 +1,17 @@
 from langgraph.graph import StateGraph, END, START
 from langgraph.types import Command, Send
+from langchain_core.runnables import RunnableConfig
 from shared.src.constants import DEFAULT_INPUTS
 from agents.src.open_canvas.state import OpenCanvasGraphState
-from agents.src.utils import create_ai_message_from_web_results
-from typing import Union
+from agents.src.background import start_background_executor
+from agents.src.utils import (
+    create_ai_message_from_web_results,
+    get_checkpointer_from_config,
+    get_model_config,
+    get_store_from_config
+)
+from shared.src.utils.tokens import count_messages_tokens, get_summarization_threshold
+from typing import Any, Dict, Union
 # Import all nodes
 from agents.src.open_canvas.nodes.generate_path.index import generate_path
 from agents.src.open_canvas.nodes.generate_artifact.index import generate_artifact
@@ -20,8 +28,29 @@ from agents.src.open_canvas.nodes.generate_title import generate_title as genera
 from agents.src.open_canvas.nodes.summarizer import summarizer
 from agents.src.web_search.index import graph as web_search_graph
 
-# ~ 4 chars per token, max tokens of 75000
-CHARACTER_MAX = 300000
+# Nodes that generate or update the artifact
+ARTIFACT_NODES = [
+    "generateArtifact",
+    "updateArtifact",
+    "updateHighlightedText",
+    "rewriteArtifact",
+    "rewriteArtifactTheme",
+    "rewriteCodeArtifactTheme",
+    "customAction"
+]
+
+# `generatePath` routes with snake_case names. These are the nodes they run.
+ROUTE_NODES = {
+    "update_artifact": "updateArtifact",
+    "update_highlighted_text": "updateHighlightedText",
+    "rewrite_artifact_theme": "rewriteArtifactTheme",
+    "rewrite_code_artifact_theme": "rewriteCodeArtifactTheme",
+    "custom_action": "customAction",
+    "web_search": "webSearch",
+    "reply_to_general_input": "replyToGeneralInput",
+    "rewrite_artifact": "rewriteArtifact",
+    "generate_artifact": "generateArtifact"
+}
 
 def route_node(state: dict) -> Send:
     """Route to next node based on state.
@@ -34,48 +63,109 @@ def route_node(state: dict) -> Send:
     """
     if not state.get("next"):
         raise ValueError("'next' state field not set")
-    return Send(state["next"], {**state})
+    return Send(ROUTE_NODES.get(state["next"], state["next"]), {**state})
+
+def update_messages_token_count(state: dict, model_name: str) -> Dict[str, Any]:
+    """Incrementally update the running token count of `_messages`.
+    
+    Only messages appended since the stored watermark are tokenized. If the
+    list was rewritten (e.g. replaced by a summary) the count is rebuilt, which
+    is cheap since per-message counts are cached by message ID.
+    
+    Args:
+        state: Current state
+        model_name: Name of the active model, used to pick the tokenizer
+        
+    Returns:
+        dict: The updated `_messages_token_count` and `_messages_token_watermark`
+    """
+    messages = state.get("_messages", [])
+    watermark = state.get("_messages_token_watermark") or {}
+    total = state.get("_messages_token_count") or 0
+    start = watermark.get("index", 0)
+
+    if start > len(messages) or watermark.get("model_name") != model_name:
+        start, total = 0, 0
+    elif start and watermark.get("message_id") and messages[start - 1].id != watermark["message_id"]:
+        start, total = 0, 0
 
-def clean_state(_: dict) -> dict:
-    """Reset state to default inputs.
+    total += count_messages_tokens(messages[start:], model_name)
+    return {
+        "_messages_token_count": total,
+        "_messages_token_watermark": {
+            "index": len(messages),
+            "message_id": messages[-1].id if messages else None,
+            "model_name": model_name
+        }
+    }
+
+def clean_state(state: dict, config: RunnableConfig) -> dict:
+    """Reset state to default inputs and refresh the `_messages` token count.
     
     Args:
-        _: Unused state parameter
+        state: Current state
+        config: Runnable configuration
         
     Returns:
         dict: Default input state
     """
-    return {**DEFAULT_INPUTS}
+    model_name = get_model_config(config)["model_name"]
+    return {**DEFAULT_INPUTS, **update_messages_token_count(state, model_name)}
 
-def simple_token_calculator(state: dict) -> str:
-    """Calculate if message length exceeds token limit.
+def simple_token_calculator(state: dict, config: RunnableConfig) -> str:
+    """Check if `_messages` exceeds the summarization threshold of the active model.
     
     Args:
         state: Current state
+        config: Runnable configuration
         
     Returns:
         str: 'summarizer' if over limit, END otherwise
     """
-    total_chars = 0
-    for msg in state.get("_messages", []):
-        if isinstance(msg.content, str):
-            total_chars += len(msg.content)
-        else:
-            total_chars += sum(len(c.get("text", "")) for c in msg.content if "text" in c)
-    return "summarizer" if total_chars > CHARACTER_MAX else END
-
-def conditionally_generate_title(state: dict) -> str:
-    """Route to title generation if appropriate.
+    model_name = get_model_config(config)["model_name"]
+    # Counted from the stored watermark, since this runs before `cleanState` refreshes the count
+    total_tokens = update_messages_token_count(state, model_name)["_messages_token_count"]
+    return "summarizer" if total_tokens > get_summarization_threshold(model_name) else END
+
+def conditionally_generate_title(state: dict, config: RunnableConfig) -> str:
+    """Check if the title should be generated or the conversation summarized.
     
     Args:
         state: Current state
+        config: Runnable configuration
         
     Returns:
-        str: Next node to route to
+        str: 'generateTitle', 'summarizer' or END
     """
     if len(state.get("messages", [])) > 2:
-        return simple_token_calculator(state)
-    return "generate_title"
+        return simple_token_calculator(state, config)
+    return "generateTitle"
+
+async def schedule_title_or_summary(state: dict, config: RunnableConfig) -> Dict[str, Any]:
+    """Start title generation or summarization in the background, if needed.
+    
+    Both only schedule background runs and don't depend on the followup, so
+    after artifact nodes this runs in parallel with `generateFollowup` and
+    `reflect`.
+    
+    This runs on every turn, so it also starts the in-process background
+    executor, resuming jobs queued before a restart with this run's store and
+    checkpointer.
+    
+    Args:
+        state: Current state
+        config: Runnable configuration
+        
+    Returns:
+        dict: Empty state update
+    """
+    start_background_executor(get_store_from_config(config), get_checkpointer_from_config(config))
+    next_step = conditionally_generate_title(state, config)
+    if next_step == "generateTitle":
+        return await generate_title_node(state, config)
+    if next_step == "summarizer":
+        return await summarizer(state, config)
+    return {}
 
 def route_post_web_search(state: dict) -> Union[Command, Send]:
     """Route after web search based on results.
@@ -90,15 +180,16 @@ def route_post_web_search(state: dict) -> Union[Command, Send]:
     artifact = state.get("artifact", {})
     includes_artifacts = len(artifact.get("contents", [])) > 1
 
+    next_node = ROUTE_NODES["rewrite_artifact" if includes_artifacts else "generate_artifact"]
     if not state.get("web_search_results"):
         return Send(
-            "rewrite_artifact" if includes_artifacts else "generate_artifact",
+            next_node,
             {**state, "web_search_enabled": False}
         )
 
     web_search_msg = create_ai_message_from_web_results(state["web_search_results"])
     return Command(
-        goto="rewrite_artifact" if includes_artifacts else "generate_artifact",
+        goto=next_node,
         update={
             "web_search_enabled": False,
             "messages": [web_search_msg],
@@ -124,8 +215,7 @@ builder = (
     .add_node("generateFollowup", generate_followup)
     .add_node("cleanState", clean_state)
     .add_node("reflect", reflect_node)
-    .add_node("generateTitle", generate_title_node)
-    .add_node("summarizer", summarizer)
+    .add_node("scheduleTitleOrSummary", schedule_title_or_summary)
     .add_node("webSearch", web_search_graph)
     .add_node("routePostWebSearch", route_post_web_search)
     # Initial router
@@ -145,28 +235,23 @@ builder = (
         ]
     )
     # Edges
-    .add_edge("generateArtifact", "generateFollowup")
-    .add_edge("updateArtifact", "generateFollowup")
-    .add_edge("updateHighlightedText", "generateFollowup")
-    .add_edge("rewriteArtifact", "generateFollowup")
-    .add_edge("rewriteArtifactTheme", "generateFollowup")
-    .add_edge("rewriteCodeArtifactTheme", "generateFollowup")
-    .add_edge("customAction", "generateFollowup")
     .add_edge("webSearch", "routePostWebSearch")
     # End edges
-    .add_edge("replyToGeneralInput", "cleanState")
-    # Only reflect if an artifact was generated/updated
-    .add_edge("generateFollowup", "reflect")
+    .add_edge("replyToGeneralInput", "scheduleTitleOrSummary")
+    # Each branch is a single node, so `cleanState` runs once, after all of them
+    .add_edge("generateFollowup", "cleanState")
     .add_edge("reflect", "cleanState")
-    .add_conditional_edges(
-        "cleanState",
-        conditionally_generate_title,
-        [END, "generateTitle", "summarizer"]
-    )
-    .add_edge("generateTitle", END)
-    .add_edge("summarizer", END)
+    .add_edge("scheduleTitleOrSummary", "cleanState")
+    .add_edge("cleanState", END)
 )
 
+# After an artifact is generated or updated, the followup, reflection and
+# title or summary branches run in parallel. Only reflect in that case.
+for artifact_node in ARTIFACT_NODES:
+    builder.add_edge(artifact_node, "generateFollowup")
+    builder.add_edge(artifact_node, "reflect")
+    builder.add_edge(artifact_node, "scheduleTitleOrSummary")
+
 # Compile graph
 graph = builder.compile()
 graph.name = "open_canvas"
\ No newline at end of file
@@ -1,20 +1,23 @@
 from typing import Optional, Dict, Any
 from uuid import uuid4
-from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from shared.src.types import (
     ArtifactCodeV3,
-    ArtifactMarkdownV3,
     ArtifactV3,
     CustomQuickAction,
     Reflections
 )
 from agents.src.utils import (
+    coalesced_invoke,
+    coalesced_store_get,
     ensure_store_in_config,
     format_reflections,
-    get_model_from_config
+    get_reflections_query,
+    get_model_from_config,
+    prefetch
 )
+from shared.src.utils.transcript import render_transcript
 from shared.src.prompts.quick_actions import (
     CUSTOM_QUICK_ACTION_ARTIFACT_CONTENT_PROMPT,
     CUSTOM_QUICK_ACTION_ARTIFACT_PROMPT_PREFIX,
@@ -22,21 +25,13 @@ from shared.src.prompts.quick_actions import (
     REFLECTIONS_QUICK_ACTION_PROMPT
 )
 
-def format_messages(messages: list[BaseMessage]) -> str:
-    return "\n".join(
-        f"<{msg.type}>\n{msg.content}\n</{msg.type}>"
-        for msg in messages
-    )
-
 async def custom_action(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
-    if not state.custom_quick_action_id:
+    if not state.get("custom_quick_action_id"):
         raise ValueError("No custom quick action ID found")
 
-    small_model = await get_model_from_config(config, {"temperature": 0.5})
-    
     store = ensure_store_in_config(config)
     assistant_id = config.get("configurable", {}).get("assistant_id")
     user_id = config.get("configurable", {}).get("supabase_user_id")
@@ -50,28 +45,43 @@ async def custom_action(
     custom_actions_namespace = ["custom_actions", user_id]
     memory_namespace = ["memories", assistant_id]
     
-    custom_actions_item, memories = await (
-        store.get(custom_actions_namespace, "actions"),
-        store.get(memory_namespace, "reflection")
-    )
+    fetched = await prefetch({
+        "model": get_model_from_config(config, {"temperature": 0.5, "cache": True}),
+        "custom_actions": coalesced_store_get(store, custom_actions_namespace, "actions"),
+        "memories": coalesced_store_get(store, memory_namespace, "reflection")
+    }, "custom_action")
+    small_model = fetched["model"]
+    custom_actions_item = fetched["custom_actions"]
+    memories = fetched["memories"]
 
     if not custom_actions_item or "value" not in custom_actions_item:
         raise ValueError("No custom actions found")
     
-    action_id = state.custom_quick_action_id
+    action_id = state["custom_quick_action_id"]
     custom_action = custom_actions_item["value"].get(action_id)
     if not custom_action:
         raise ValueError(f"No custom quick action found for ID {action_id}")
+    if isinstance(custom_action, dict):
+        custom_action = CustomQuickAction(**custom_action)
+
+    # The artifact is a dict when sent by the client
+    artifact = state.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
+    messages = state.get("_messages", [])
 
     current_artifact_content = None
-    if state.artifact:
-        current_artifact_content = state.artifact.contents[-1]  # Simplified from getArtifactContent
+    if artifact and artifact.contents:
+        current_artifact_content = artifact.contents[-1]  # Simplified from getArtifactContent
 
     # Build formatted prompt
     formatted_prompt = f"<custom-instructions>\n{custom_action.prompt}\n</custom-instructions>"
     
     if custom_action.include_reflections and memories and "value" in memories:
-        reflections_str = format_reflections(memories["value"])
+        reflections_str = format_reflections(
+            memories["value"],
+            query=get_reflections_query(messages, current_artifact_content)
+        )
         formatted_prompt += f"\n\n{REFLECTIONS_QUICK_ACTION_PROMPT.format(reflections=reflections_str)}"
     
     if custom_action.include_prefix:
@@ -79,7 +89,7 @@ async def custom_action(
     
     if custom_action.include_recent_history:
         conv_history = CUSTOM_QUICK_ACTION_CONVERSATION_CONTEXT.format(
-            conversation=format_messages(state._messages[-5:])
+            conversation=render_transcript(messages[-5:])
         )
         formatted_prompt += f"\n\n{conv_history}"
 
@@ -87,7 +97,7 @@ async def custom_action(
     formatted_prompt += f"\n\n{CUSTOM_QUICK_ACTION_ARTIFACT_CONTENT_PROMPT.format(artifact_content=artifact_content or 'No artifacts generated yet.')}"
 
     # Invoke model
-    response = await small_model.invoke([{"role": "user", "content": formatted_prompt}])
+    response = await coalesced_invoke(small_model, [{"role": "user", "content": formatted_prompt}])
 
     if not current_artifact_content:
         print("No current artifact content found")
@@ -95,17 +105,16 @@ async def custom_action(
 
     # Create new artifact content
     new_content = response.content
-    new_artifact_content = {
-        **current_artifact_content.dict(),
-        "index": len(state.artifact.contents) + 1,
-        "code": new_content if isinstance(current_artifact_content, ArtifactCodeV3) else None,
-        "full_markdown": new_content if isinstance(current_artifact_content, ArtifactMarkdownV3) else None
-    }
+    content_field = "code" if isinstance(current_artifact_content, ArtifactCodeV3) else "full_markdown"
+    new_artifact_content = current_artifact_content.copy(update={
+        "index": len(artifact.contents) + 1,
+        content_field: new_content
+    })
 
     # Create new artifact
     new_artifact = ArtifactV3(
-        current_index=len(state.artifact.contents) + 1,
-        contents=[*state.artifact.contents, new_artifact_content]
+        current_index=len(artifact.contents) + 1,
+        contents=[*artifact.contents, new_artifact_content]
     )
 
     return {"artifact": new_artifact} 
\ No newline at end of file
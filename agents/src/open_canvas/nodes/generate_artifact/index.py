@@ -1,63 +1,93 @@
 from typing import Dict, Any
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
+from agents.src.open_canvas.prompts import REFLECTIONS_AFTER_CONVERSATION
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from shared.src.types import ArtifactV3
+from shared.src.utils.prompt_budget import PromptSegment
 from agents.src.utils import (
-    create_context_document_messages,
+    build_prompt_messages,
+    fit_prompt_to_model,
+    get_context_document_segments,
+    get_fitted_context_documents,
     get_formatted_reflections,
+    get_reflections_query,
     get_model_config,
+    get_conversation_window_budget,
+    select_conversation_window,
     get_model_from_config,
-    is_using_o1_mini_model,
-    optionally_get_system_prompt_from_config
+    get_context_document_messages,
+    optionally_get_system_prompt_from_config,
+    prefetch
 )
-from agents.src.open_canvas.nodes.generate_artifact.utils import format_new_artifact_prompt, create_artifact_content
-from agents.src.open_canvas.nodes.generate_artifact.schemas import ArtifactToolSchema
+from agents.src.open_canvas.nodes.generate_artifact.utils import (
+    create_artifact_content,
+    format_new_artifact_prompt,
+    stream_artifact_tool_call
+)
+from agents.src.open_canvas.nodes.generate_artifact.schemas import ARTIFACT_TOOL_SCHEMA, ArtifactToolSchema
 
 async def generate_artifact(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
-    model_config = get_model_config(config, is_tool_calling=True)
+    model_config = get_model_config(config, {"is_tool_calling": True})
     model_name = model_config.get("model_name")
     
-    small_model = await get_model_from_config(
-        config,
-        {"temperature": 0.5, "is_tool_calling": True}
-    )
+    query = get_reflections_query(state.get("_messages", []))
+    fetched = await prefetch({
+        "model": get_model_from_config(config, {"temperature": 0.5, "is_tool_calling": True}),
+        "memories_str": get_formatted_reflections(config, query),
+        "context_docs": get_context_document_messages(config)
+    }, "generate_artifact")
+    small_model = fetched["model"]
+    memories_str = fetched["memories_str"]
+    context_docs = fetched["context_docs"]
     
     # Bind tool to model
     model_with_tool = small_model.bind_tools(
         [{
             "name": "generate_artifact",
-            "description": ArtifactToolSchema["description"],
-            "schema": ArtifactToolSchema
+            "description": "Generate a new artifact based on the users request.",
+            "schema": ARTIFACT_TOOL_SCHEMA
         }],
         tool_choice="generate_artifact"
     )
 
-    memories_str = await get_formatted_reflections(config)
-    formatted_prompt = format_new_artifact_prompt(memories_str, model_name)
-
     user_prompt = optionally_get_system_prompt_from_config(config)
-    full_prompt = f"{user_prompt}\n{formatted_prompt}" if user_prompt else formatted_prompt
-
-    context_docs = await create_context_document_messages(config)
-    is_o1_mini = is_using_o1_mini_model(config)
+    messages = select_conversation_window(
+        state.get("_messages", []),
+        get_conversation_window_budget(config, "generate_artifact", model_name),
+        model_name,
+        query
+    )
 
-    response = await model_with_tool.invoke(
+    # Trim context documents before reflections
+    fitted = fit_prompt_to_model(
+        config,
         [
-            {"role": "user" if is_o1_mini else "system", "content": full_prompt},
-            *context_docs,
-            *state._messages
+            *get_context_document_segments(context_docs),
+            PromptSegment(name="reflections", text=memories_str, priority=1)
         ],
-        {"run_name": "generate_artifact"}
+        fixed_texts=[format_new_artifact_prompt("", model_name), user_prompt or ""],
+        messages=messages,
+        run_name="generate_artifact"
     )
+    context_docs = get_fitted_context_documents(context_docs, fitted)
 
-    if not response.tool_calls or not response.tool_calls[0].args:
-        raise ValueError("No valid tool arguments found in response")
+    formatted_prompt = format_new_artifact_prompt(REFLECTIONS_AFTER_CONVERSATION, model_name)
+    full_prompt = f"{user_prompt}\n{formatted_prompt}" if user_prompt else formatted_prompt
+
+    # Stream the artifact as it is generated, instead of waiting for the whole tool call
+    tool_args = await stream_artifact_tool_call(
+        model_with_tool,
+        build_prompt_messages(
+            config, full_prompt, context_docs, messages, fitted.texts["reflections"] or "No reflections found."
+        ),
+        config
+    )
 
-    new_content = create_artifact_content(response.tool_calls[0].args)
+    new_content = create_artifact_content(ArtifactToolSchema(**tool_args))
     
     new_artifact = ArtifactV3(
         current_index=1,
@@ -1,5 +1,12 @@
+import json
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.prompts import NEW_ARTIFACT_PROMPT
+from agents.src.utils import astream_model
+from shared.src.constants import OC_ARTIFACT_STREAM_EVENT
 from shared.src.types import ArtifactCodeV3, ArtifactMarkdownV3, ProgrammingLanguageOptions
+from shared.src.utils.partial_json import PartialJsonObjectParser
 from agents.src.open_canvas.nodes.generate_artifact.schemas import ArtifactToolSchema
 
 def format_new_artifact_prompt(memories_str: str, model_name: str) -> str:
@@ -27,4 +34,66 @@ def create_artifact_content(tool_call: ArtifactToolSchema) -> ArtifactCodeV3 | A
         type="text",
         title=tool_call.title,
         full_markdown=tool_call.artifact
-    ) 
\ No newline at end of file
+    ) 
+
+async def stream_artifact_tool_call(
+    model_with_tool: Any,
+    messages: List[Any],
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """
+    Stream the `generate_artifact` tool call, dispatching the artifact text as it is generated.
+
+    Tool call argument deltas are parsed incrementally, and each new piece of
+    the `artifact` argument is dispatched as an `OC_ARTIFACT_STREAM_EVENT`
+    custom event, along with the type, title and language parsed so far.
+
+    Args:
+        model_with_tool: The model with the `generate_artifact` tool bound
+        messages: The prompt messages
+        config: The node's runnable config
+
+    Returns:
+        Dict[str, Any]: The complete tool call arguments
+    """
+    parser: Optional[PartialJsonObjectParser] = PartialJsonObjectParser()
+    tool_call_index = None
+    args_parts: List[str] = []
+
+    async for chunk in astream_model(model_with_tool, messages, {"run_name": "generate_artifact"}):
+        for tool_call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+            # Only the first tool call is used, so only it is streamed
+            if tool_call_index is None and tool_call_chunk.get("name"):
+                tool_call_index = tool_call_chunk.get("index")
+            if tool_call_chunk.get("index") != tool_call_index or not tool_call_chunk.get("args"):
+                continue
+            args_parts.append(tool_call_chunk["args"])
+            if parser is None:
+                continue
+
+            try:
+                artifact_delta = parser.feed(tool_call_chunk["args"]).get("artifact")
+            except ValueError as e:
+                # The complete arguments are still parsed once the call finishes
+                print(f"Stopped streaming the artifact, failed to parse tool call arguments: {e}")
+                parser = None
+                continue
+            if artifact_delta:
+                await adispatch_custom_event(
+                    OC_ARTIFACT_STREAM_EVENT,
+                    {
+                        "type": parser.values.get("type"),
+                        "title": parser.values.get("title"),
+                        "language": parser.values.get("language"),
+                        "delta": artifact_delta
+                    },
+                    config=config
+                )
+
+    try:
+        args = json.loads("".join(args_parts)) if args_parts else None
+    except ValueError:
+        args = None
+    if not args:
+        raise ValueError("No valid tool arguments found in response")
+    return args
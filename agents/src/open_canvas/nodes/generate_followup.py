@@ -4,21 +4,22 @@ from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from shared.src.types import ArtifactV3, Reflections
 from agents.src.utils import (
+    coalesced_store_get,
     ensure_store_in_config,
     format_reflections,
-    get_model_from_config
+    get_reflections_query,
+    get_conversation_window_budget,
+    get_model_config,
+    select_conversation_window
 )
+from agents.src.failover import invoke_with_failover
+from shared.src.utils.transcript import render_transcript
 from agents.src.open_canvas.prompts import FOLLOWUP_ARTIFACT_PROMPT
 
 async def generate_followup(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
-    small_model = await get_model_from_config(
-        config, 
-        {"max_tokens": 250, "is_tool_calling": True}
-    )
-    
     store = ensure_store_in_config(config)
     assistant_id = config.get("configurable", {}).get("assistant_id")
     if not assistant_id:
@@ -26,16 +27,18 @@ async def generate_followup(
     
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
-    memories = await store.get(memory_namespace, memory_key)
+    memories = await coalesced_store_get(store, memory_namespace, memory_key)
     
+    artifact = state.get("artifact")
+    current_artifact = artifact.contents[-1] if artifact and artifact.contents else None
+    query = get_reflections_query(state.get("_messages", []), current_artifact)
     memories_str = format_reflections(
         memories.get("value") if memories else None,
-        {"only_content": True}
+        {"only_content": True},
+        query=query
     ) if memories else "No reflections found."
 
-    current_artifact_content = None
-    if state.artifact and state.artifact.contents:
-        current_artifact = state.artifact.contents[-1]
+    if current_artifact:
         artifact_content = (
             current_artifact.full_markdown 
             if hasattr(current_artifact, "full_markdown")
@@ -44,16 +47,26 @@ async def generate_followup(
     else:
         artifact_content = "No artifacts generated yet."
 
+    model_name = get_model_config(config).get("model_name")
+    messages = select_conversation_window(
+        state.get("_messages", []),
+        get_conversation_window_budget(config, "generate_followup", model_name),
+        model_name,
+        query
+    )
+
     formatted_prompt = FOLLOWUP_ARTIFACT_PROMPT.format(
         artifact_content=artifact_content,
         reflections=memories_str,
-        conversation="\n".join(
-            f"<{msg.type}>\n{msg.content}\n</{msg.type}>" 
-            for msg in state._messages
-        )
+        conversation=render_transcript(messages)
     )
 
-    response = await small_model.invoke([{"role": "user", "content": formatted_prompt}])
+    response = await invoke_with_failover(
+        config,
+        [{"role": "user", "content": formatted_prompt}],
+        extra={"max_tokens": 250, "is_tool_calling": True, "cache": True},
+        hedge=True
+    )
     
     return {
         "messages": [AIMessage(content=response.content)],
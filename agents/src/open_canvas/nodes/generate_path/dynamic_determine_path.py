@@ -11,11 +11,12 @@ from agents.src.open_canvas.prompts import (
 )
 from agents.src.utils import (
     format_artifact_content_with_template,
-    get_model_from_config,
     create_context_document_messages,
     get_context_documents
 )
 from shared.src.utils.artifacts import get_artifact_content
+from agents.src.failover import invoke_with_failover
+from shared.src.utils.transcript import render_transcript
 from langsmith import traceable
 
 class RouteSchema(BaseModel):
@@ -34,9 +35,6 @@ async def dynamic_determine_path(
 ) -> Dict[str, str]:
     """Determine the next route based on user input and current state."""
     try:
-        # Initialize model
-        model = await get_model_from_config(config, {"temperature": 0, "is_tool_calling": True})
-        
         # Get current artifact content
         current_artifact = state.get("artifact")
         current_artifact_content = get_artifact_content(current_artifact) if current_artifact else None
@@ -47,15 +45,14 @@ async def dynamic_determine_path(
             else ROUTE_QUERY_OPTIONS_NO_ARTIFACTS
         )
         
-        recent_messages = "\n\n".join(
-            f"{msg.type}: {msg.content}" 
-            for msg in state.get("_messages", [])[-3:]
-        )
+        recent_messages = render_transcript(state.get("_messages", [])[-3:], "plain", "\n\n")
         
+        # Routing only needs to know what the artifact is, so its outline is used instead of its content
         current_artifact_prompt = (
             format_artifact_content_with_template(
                 CURRENT_ARTIFACT_PROMPT,
-                current_artifact_content
+                current_artifact_content,
+                outline=True
             ) if current_artifact_content else NO_ARTIFACT_PROMPT
         )
         
@@ -80,26 +77,27 @@ async def dynamic_determine_path(
             HumanMessage(content=formatted_prompt)
         ]
 
-        # Get route from model
-        model_with_tools = model.bind_tools(
-            tools=[{
-                "name": "route_query",
-                "description": "Determine the next route based on user input",
-                "schema": RouteSchema.model_json_schema()
-            }],
-            tool_choice="route_query"
+        # Get route from model. Routing is short and idempotent, so it may be hedged.
+        response = await invoke_with_failover(
+            config,
+            messages,
+            extra={"temperature": 0, "is_tool_calling": True, "cache": True},
+            bind=lambda model: model.bind_tools(
+                tools=[{
+                    "name": "route_query",
+                    "description": "Determine the next route based on user input",
+                    "schema": RouteSchema.model_json_schema()
+                }],
+                tool_choice="route_query"
+            ),
+            hedge=True
         )
         
-        response = model_with_tools.invoke(messages)
-        
         # Extract route from response
         if response.tool_calls:
-            tool_call = response.tool_calls[0]
-            if hasattr(tool_call, "function"):
-                import json
-                args = json.loads(tool_call.function.arguments)
-                if args.get("route"):
-                    return {"next": args["route"]}
+            route = response.tool_calls[0]["args"].get("route")
+            if route:
+                return {"next": route}
 
         # Default fallback
         return {"next": "reply_to_general_input"}
@@ -1,7 +1,7 @@
 from typing import Optional, List, Dict, Any
 import uuid
 from langchain_core.messages import HumanMessage
-from agents.src.utils import get_model_from_config
+from agents.src.utils import ainvoke_model, get_model_from_config
 from shared.src.types import SearchResult
 from shared.src.constants import OC_WEB_SEARCH_RESULTS_MESSAGE_KEY
 from langchain_community.document_loaders import FireCrawlLoader
@@ -78,7 +78,7 @@ async def include_url_contents(
         )
 
         # Get model's decision
-        result = await model_with_tools.invoke([
+        result = await ainvoke_model(model_with_tools, [
             {"role": "user", "content": formatted_prompt}
         ])
 
@@ -55,12 +55,12 @@ async def generate_path(
             new_messages.extend(fixed_messages)
 
     # Check highlighted content
-    if state.get("highlighted_code"):
+    if state.get("highlighted_code") or state.get("highlighted_codes"):
         return {
             "next": "update_artifact",
             **({"messages": new_messages, "_messages": new_messages} if new_messages else {})
         }
-    if state.get("highlighted_text"):
+    if state.get("highlighted_text") or state.get("highlighted_texts"):
         return {
             "next": "update_highlighted_text",
             **({"messages": new_messages, "_messages": new_messages} if new_messages else {})
@@ -128,7 +128,7 @@ async def generate_path(
     # Determine path
     routing_result = await dynamic_determine_path(**dynamic_path_args)
     
-    if not routing_result or not routing_result.get("route"):
+    if not routing_result or not routing_result.get("next"):
         raise ValueError("Route not found")
 
     # Create messages object
@@ -142,6 +142,6 @@ async def generate_path(
     )
 
     return {
-        "next": routing_result["route"],
+        "next": routing_result["next"],
         **messages
     }
@@ -3,29 +3,42 @@ from typing import Dict, Any
 from langgraph_sdk import get_client
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
+from agents.src.background import get_background_executor, use_in_process_background_execution
+from agents.src.utils import get_checkpointer_from_config
 
 async def generate_title(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
-    if len(state.messages) > 2:
+    if len(state.get("messages", [])) > 2:
         # Skip if not first human-AI conversation
         return {}
 
     try:
-        lang_graph_client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+        thread_id = config.get("configurable", {}).get("thread_id")
 
-        title_input = {
-            "messages": state.messages,
-            "artifact": state.artifact.dict() if state.artifact else None
-        }
+        # Only pass a reference to the thread. The title graph reads the
+        # messages and artifact it needs from the checkpointer or thread API.
+        title_input = {"thread_id": thread_id}
         
         title_config = {
             "configurable": {
-                "open_canvas_thread_id": config.get("configurable", {}).get("thread_id")
+                "open_canvas_thread_id": thread_id
             }
         }
 
+        if use_in_process_background_execution():
+            if not await get_background_executor().submit(
+                "thread_title",
+                title_input,
+                title_config,
+                checkpointer=get_checkpointer_from_config(config)
+            ):
+                print("Background queue is full, skipping title generation")
+            return {}
+
+        lang_graph_client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+
         # Create new thread for title generation
         new_thread = await lang_graph_client.threads.create()
         
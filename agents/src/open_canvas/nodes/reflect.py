@@ -1,39 +1,69 @@
 import os
+import uuid
 from typing import Dict, Any
 from langgraph_sdk import get_client
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
+from agents.src.background import get_background_executor, use_in_process_background_execution
+from agents.src.utils import get_checkpointer_from_config, get_store_from_config
+
+# Reflection waits for this long without new activity from the assistant
+REFLECTION_DEBOUNCE_SECONDS = 5 * 60  # 5 minutes
+
+# A debounced reflection is never delayed more than this after it was first scheduled
+REFLECTION_MAX_DELAY_SECONDS = 30 * 60  # 30 minutes
 
 async def reflect(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
     try:
-        lang_graph_client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+        assistant_id = config.get("configurable", {}).get("assistant_id")
 
+        # Only pass a reference to the thread. The reflection graph reads the
+        # messages and artifact it needs from the checkpointer or thread API.
         reflection_input = {
-            "messages": state._messages,
-            "artifact": state.artifact.dict() if state.artifact else None
+            "thread_ids": [config.get("configurable", {}).get("thread_id")]
         }
         
         reflection_config = {
             "configurable": {
-                "open_canvas_assistant_id": config.get("configurable", {}).get("assistant_id")
+                "open_canvas_assistant_id": assistant_id
             }
         }
 
-        new_thread = await lang_graph_client.threads.create()
+        # Reflections are keyed by assistant, so a burst of turns is coalesced
+        # into a single reflection over every thread with new activity
+        if use_in_process_background_execution():
+            if not await get_background_executor().submit(
+                "reflection",
+                reflection_input,
+                reflection_config,
+                delay_seconds=REFLECTION_DEBOUNCE_SECONDS,
+                store=get_store_from_config(config),
+                checkpointer=get_checkpointer_from_config(config),
+                dedupe_key=f"reflection:{assistant_id}",
+                max_delay_seconds=REFLECTION_MAX_DELAY_SECONDS
+            ):
+                print("Background queue is full, skipping reflection")
+            return {}
+
+        # Over HTTP, a fixed reflection thread per assistant with the "rollback"
+        # multitask strategy replaces the pending run, debouncing it
+        lang_graph_client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+        reflection_thread_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"open-canvas/reflection/{assistant_id}"))
+        await lang_graph_client.threads.create(thread_id=reflection_thread_id, if_exists="do_nothing")
         
         await lang_graph_client.runs.create(
-            thread_id=new_thread.thread_id,
+            thread_id=reflection_thread_id,
             app_id="reflection",
             input=reflection_input,
             config=reflection_config,
-            multitask_strategy="enqueue",
-            after_seconds=5 * 60  # 5 minutes
+            multitask_strategy="rollback",
+            after_seconds=REFLECTION_DEBOUNCE_SECONDS
         )
         
     except Exception as e:
         print(f"Failed to start reflection\n{e}")
 
-    return {} 
\ No newline at end of file
+    return {}
\ No newline at end of file
@@ -2,23 +2,37 @@ from typing import Dict, Any
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
-from shared.src.types import Reflections
+from shared.src.types import ArtifactV3, Reflections
+from shared.src.utils.prompt_budget import PromptSegment
 from agents.src.utils import (
+    ainvoke_model,
+    coalesced_store_get,
+    build_prompt_messages,
     ensure_store_in_config,
     format_artifact_content_with_template,
     format_reflections,
+    fit_prompt_to_model,
+    get_artifact_text,
+    get_context_document_segments,
+    get_fitted_context_documents,
+    get_reflections_query,
+    get_conversation_window_budget,
+    get_model_config,
+    select_conversation_window,
     get_model_from_config,
-    is_using_o1_mini_model,
-    create_context_document_messages
+    get_context_document_messages,
+    prefetch
+)
+from agents.src.open_canvas.prompts import (
+    CURRENT_ARTIFACT_PROMPT,
+    NO_ARTIFACT_PROMPT,
+    REFLECTIONS_AFTER_CONVERSATION
 )
-from agents.src.open_canvas.prompts import CURRENT_ARTIFACT_PROMPT, NO_ARTIFACT_PROMPT
 
 async def reply_to_general_input(
     state: OpenCanvasGraphState,
     config: RunnableConfig
 ) -> Dict[str, Any]:
-    small_model = await get_model_from_config(config)
-    
     prompt_template = """You are an AI assistant tasked with responding to the users question.
     
 The user has generated artifacts in the past. Use the following artifacts as context when responding to the users question.
@@ -30,9 +44,14 @@ You also have the following reflections on style guidelines and general memories
 
 {current_artifact_prompt}"""
 
+    # The artifact is a dict when sent by the client
+    artifact = state.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
+
     current_artifact_content = None
-    if state.artifact and state.artifact.contents:
-        current_artifact_content = state.artifact.contents[-1]
+    if artifact and artifact.contents:
+        current_artifact_content = artifact.contents[-1]
 
     store = ensure_store_in_config(config)
     assistant_id = config.get("configurable", {}).get("assistant_id")
@@ -41,32 +60,67 @@ You also have the following reflections on style guidelines and general memories
     
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
-    memories = await store.get(memory_namespace, memory_key)
+    fetched = await prefetch({
+        "model": get_model_from_config(config),
+        "memories": coalesced_store_get(store, memory_namespace, memory_key),
+        "context_docs": get_context_document_messages(config)
+    }, "reply_to_general_input")
+    small_model = fetched["model"]
+    memories = fetched["memories"]
+    context_docs = fetched["context_docs"]
     
+    query = get_reflections_query(state.get("_messages", []), current_artifact_content)
     memories_str = format_reflections(
-        memories.get("value") if memories else None
+        memories.get("value") if memories else None,
+        query=query
     ) if memories else "No reflections found."
 
+    model_name = get_model_config(config).get("model_name")
+    messages = select_conversation_window(
+        state.get("_messages", []),
+        get_conversation_window_budget(config, "reply_to_general_input", model_name),
+        model_name,
+        query
+    )
+
+    # Trim context documents first, then reflections, then the artifact
+    segments = [
+        *get_context_document_segments(context_docs),
+        PromptSegment(name="reflections", text=memories_str, priority=1)
+    ]
+    if current_artifact_content:
+        segments.append(PromptSegment(
+            name="artifact", text=get_artifact_text(current_artifact_content), priority=2, min_tokens=1000
+        ))
+    fitted = fit_prompt_to_model(
+        config,
+        segments,
+        fixed_texts=[prompt_template, CURRENT_ARTIFACT_PROMPT],
+        messages=messages,
+        run_name="reply_to_general_input"
+    )
+    context_docs = get_fitted_context_documents(context_docs, fitted)
+
     current_artifact_prompt = NO_ARTIFACT_PROMPT
     if current_artifact_content:
         current_artifact_prompt = format_artifact_content_with_template(
             CURRENT_ARTIFACT_PROMPT,
-            current_artifact_content
+            current_artifact_content,
+            max_tokens=fitted.tokens["artifact"],
+            model_name=model_name
         )
 
     formatted_prompt = prompt_template.format(
-        reflections=memories_str,
+        reflections=REFLECTIONS_AFTER_CONVERSATION,
         current_artifact_prompt=current_artifact_prompt
     )
 
-    context_docs = await create_context_document_messages(config)
-    is_o1_mini = is_using_o1_mini_model(config)
-    
-    response = await small_model.invoke([
-        {"role": "user" if is_o1_mini else "system", "content": formatted_prompt},
-        *context_docs,
-        *state._messages
-    ])
+    response = await ainvoke_model(
+        small_model,
+        build_prompt_messages(
+            config, formatted_prompt, context_docs, messages, fitted.texts["reflections"] or "No reflections found."
+        )
+    )
 
     return {
         "messages": [response],
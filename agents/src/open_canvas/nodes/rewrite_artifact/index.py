@@ -1,27 +1,41 @@
 import uuid
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional, Tuple
+from langchain_core.callbacks import adispatch_custom_event
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
+from agents.src import metrics
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from agents.src.utils import (
+    ainvoke_model,
+    astream_model,
+    build_prompt_messages,
     get_model_config,
     get_model_from_config,
     get_formatted_reflections,
-    create_context_document_messages,
-    is_using_o1_mini_model,
-    optionally_get_system_prompt_from_config
+    get_reflections_query,
+    get_context_document_messages,
+    fit_prompt_to_model,
+    get_context_document_segments,
+    get_fitted_context_documents,
+    optionally_get_system_prompt_from_config,
+    prefetch
 )
+from agents.src.open_canvas.prompts import REFLECTIONS_AFTER_CONVERSATION, UPDATE_ENTIRE_ARTIFACT_PROMPT
 from agents.src.open_canvas.nodes.rewrite_artifact.update_meta import optionally_update_artifact_meta
 from agents.src.open_canvas.nodes.rewrite_artifact.utils import (
+    BuildPromptArgs,
+    CreateNewArtifactContentArgs,
     validate_state,
     build_prompt,
     create_new_artifact_content
 )
+from shared.src.constants import OC_ARTIFACT_STREAM_EVENT, OC_THINKING_STREAM_EVENT
+from shared.src.types import ArtifactV3
 from shared.src.utils.artifacts import is_artifact_markdown_content
-from shared.src.utils.thinking import (
-    extract_thinking_and_response_tokens,
-    is_thinking_model
-)
+from shared.src.utils.prompt_budget import PromptSegment
+from shared.src.utils.thinking import ThinkingStreamParser, is_thinking_model
+from shared.src.utils.transcript import get_message_text
 
 async def rewrite_artifact(
     state: OpenCanvasGraphState,
@@ -30,65 +44,120 @@ async def rewrite_artifact(
     model_config = get_model_config(config)
     model_name = model_config.get("model_name")
     
-    # Initialize model
-    small_model = await get_model_from_config(config)
-    small_model_with_config = small_model.with_config(
-        {"run_name": "rewrite_artifact_model_call"}
-    )
-    
-    # Get reflections and validate state
-    memories_str = await get_formatted_reflections(config)
+    # Validate state
     validated = validate_state(state)
     current_artifact = validated.current_artifact_content
     recent_human = validated.recent_human_message
 
-    # Get meta updates
-    meta_tool_call = await optionally_update_artifact_meta(state, config)
-    artifact_type = meta_tool_call.get("type", current_artifact.type)
-    is_new_type = artifact_type != current_artifact.type
-
-    # Get artifact content
-    if is_artifact_markdown_content(current_artifact):
-        artifact_content = current_artifact.full_markdown
-    else:
-        artifact_content = current_artifact.code
-
-    # Build prompt
-    prompt_args = {
-        "artifact_content": artifact_content,
-        "memories_str": memories_str,
-        "is_new_type": is_new_type,
-        "artifact_meta_tool_call": meta_tool_call
-    }
-    formatted_prompt = build_prompt(prompt_args)
-
-    # Prepare system prompt
-    user_prompt = optionally_get_system_prompt_from_config(config)
-    full_prompt = f"{user_prompt}\n{formatted_prompt}" if user_prompt else formatted_prompt
-
-    # Get context documents
-    context_docs = await create_context_document_messages(config)
-    is_o1 = is_using_o1_mini_model(config)
-
-    # Invoke model
-    response = await small_model_with_config.invoke([
-        {"role": "user" if is_o1 else "system", "content": full_prompt},
-        *context_docs,
-        recent_human
-    ])
-
-    # Handle thinking message
-    thinking_msg = None
-    content = response.content
-    if is_thinking_model(model_name):
-        thinking, content = extract_thinking_and_response_tokens(content)
-        thinking_msg = AIMessage(
-            id=f"thinking-{uuid.uuid4()}",
-            content=thinking
+    # Start the meta update first, so it runs while the rewrite is prepared
+    meta_task = asyncio.ensure_future(optionally_update_artifact_meta(state, config))
+    speculative_task = None
+    try:
+        # Initialize model, and get the reflections relevant to the request and context documents
+        fetched = await prefetch({
+            "model": get_model_from_config(config),
+            "memories_str": get_formatted_reflections(
+                config, get_reflections_query(state.get("_messages", []), current_artifact)
+            ),
+            "context_docs": get_context_document_messages(config)
+        }, "rewrite_artifact")
+        small_model_with_config = fetched["model"].with_config(
+            {"run_name": "rewrite_artifact_model_call"}
+        )
+        memories_str = fetched["memories_str"]
+        context_docs = fetched["context_docs"]
+
+        # Get artifact content
+        if is_artifact_markdown_content(current_artifact):
+            artifact_content = current_artifact.full_markdown
+        else:
+            artifact_content = current_artifact.code
+
+        user_prompt = optionally_get_system_prompt_from_config(config)
+
+        # The artifact is rewritten in full, so only context documents and reflections are trimmed
+        fitted = fit_prompt_to_model(
+            config,
+            [
+                *get_context_document_segments(context_docs),
+                PromptSegment(name="reflections", text=memories_str, priority=1),
+                PromptSegment(name="artifact", text=artifact_content, required=True)
+            ],
+            fixed_texts=[UPDATE_ENTIRE_ARTIFACT_PROMPT, user_prompt or ""],
+            messages=[recent_human],
+            run_name="rewrite_artifact"
         )
+        context_docs = get_fitted_context_documents(context_docs, fitted)
+
+        async def rewrite(is_new_type: bool, meta_tool_call: Dict[str, Any]) -> Tuple[str, Optional[AIMessage]]:
+            # Build prompt
+            prompt_args: BuildPromptArgs = {
+                "artifact_content": artifact_content,
+                "memories_str": REFLECTIONS_AFTER_CONVERSATION,
+                "is_new_type": is_new_type,
+                "artifact_meta_tool_call": meta_tool_call
+            }
+            formatted_prompt = build_prompt(prompt_args)
+
+            # Prepare system prompt
+            full_prompt = f"{user_prompt}\n{formatted_prompt}" if user_prompt else formatted_prompt
+
+            prompt_messages = build_prompt_messages(
+                config, full_prompt, context_docs, [recent_human], fitted.texts["reflections"] or "No reflections found."
+            )
+            if not is_thinking_model(model_name):
+                response = await ainvoke_model(small_model_with_config, prompt_messages)
+                return response.content, None
+
+            # Stream reasoning models, separating their thinking from the new artifact as it arrives
+            thinking_id = f"thinking-{uuid.uuid4()}"
+            parser = ThinkingStreamParser()
+
+            async def dispatch(deltas) -> None:
+                # A speculative rewrite only streams once the meta update confirms the type
+                tool_call = await asyncio.shield(meta_task) or {}
+                if deltas.thinking:
+                    await adispatch_custom_event(
+                        OC_THINKING_STREAM_EVENT, {"id": thinking_id, "delta": deltas.thinking}, config=config
+                    )
+                if deltas.response:
+                    await adispatch_custom_event(
+                        OC_ARTIFACT_STREAM_EVENT,
+                        {
+                            "type": tool_call.get("type", current_artifact.type),
+                            "title": tool_call.get("title") or current_artifact.title,
+                            "language": tool_call.get("language") or getattr(current_artifact, "language", None),
+                            "delta": deltas.response
+                        },
+                        config=config
+                    )
+
+            async for chunk in astream_model(small_model_with_config, prompt_messages):
+                await dispatch(parser.feed(get_message_text(chunk)))
+            await dispatch(parser.finish())
+
+            thinking_msg = AIMessage(id=thinking_id, content=parser.thinking) if parser.thinking else None
+            return parser.response, thinking_msg
+
+        # The type rarely changes, so rewrite with the current type while the meta update
+        # runs. The prompt only depends on the meta update if the type changes.
+        speculative_task = asyncio.ensure_future(rewrite(False, {}))
+        meta_tool_call = await meta_task or {}
+        artifact_type = meta_tool_call.get("type", current_artifact.type)
+        if artifact_type == current_artifact.type:
+            metrics.increment("rewrite_artifact.speculation_hits")
+            content, thinking_msg = await speculative_task
+        else:
+            metrics.increment("rewrite_artifact.speculation_misses")
+            speculative_task.cancel()
+            content, thinking_msg = await rewrite(True, meta_tool_call)
+    finally:
+        for task in (meta_task, speculative_task):
+            if task is not None and not task.done():
+                task.cancel()
 
     # Create new artifact content
-    new_content_args = {
+    new_content_args: CreateNewArtifactContentArgs = {
         "artifact_type": artifact_type,
         "state": state,
         "current_artifact_content": current_artifact,
@@ -98,12 +167,12 @@ async def rewrite_artifact(
     new_artifact = create_new_artifact_content(new_content_args)
 
     # Prepare response
+    artifact = state["artifact"]
     response_data = {
-        "artifact": {
-            **state.artifact.dict(),
-            "current_index": len(state.artifact.contents) + 1,
-            "contents": [*state.artifact.contents, new_artifact]
-        }
+        "artifact": ArtifactV3(
+            current_index=len(artifact.contents) + 1,
+            contents=[*artifact.contents, new_artifact]
+        )
     }
     if thinking_msg:
         response_data.update({
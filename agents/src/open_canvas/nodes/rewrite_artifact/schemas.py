@@ -25,4 +25,10 @@ class OptionallyUpdateArtifactMetaSchema(BaseModel):
     class Config:
         schema_extra = {
             "description": "Update the artifact meta information, if necessary."
-        } 
\ No newline at end of file
+        } 
+
+OPTIONALLY_UPDATE_ARTIFACT_META_SCHEMA = {
+    "name": "optionally_update_artifact_meta",
+    "description": "Update the artifact meta information, if necessary.",
+    "schema": OptionallyUpdateArtifactMetaSchema.schema()
+}
@@ -5,10 +5,14 @@ from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from shared.src.types import ArtifactV3, ArtifactMarkdownV3
 from agents.src.utils import (
+    ainvoke_model,
+    coalesced_store_get,
     get_model_config,
     get_model_from_config,
     format_reflections,
-    ensure_store_in_config
+    get_reflections_query,
+    ensure_store_in_config,
+    prefetch
 )
 from agents.src.open_canvas.prompts import (
     CHANGE_ARTIFACT_LANGUAGE_PROMPT,
@@ -23,7 +27,6 @@ async def rewrite_artifact_theme(
     config: RunnableConfig
 ) -> Dict[str, Any]:
     model_config = get_model_config(config)
-    small_model = await get_model_from_config(config)
     
     store = ensure_store_in_config(config)
     assistant_id = config.get("configurable", {}).get("assistant_id")
@@ -32,28 +35,38 @@ async def rewrite_artifact_theme(
     
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
-    memories = await store.get(memory_namespace, memory_key)
+    fetched = await prefetch({
+        "model": get_model_from_config(config),
+        "memories": coalesced_store_get(store, memory_namespace, memory_key)
+    }, "rewrite_artifact_theme")
+    small_model = fetched["model"]
+    memories = fetched["memories"]
     
+    # The artifact is a dict when sent by the client
+    artifact = state.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
+
+    latest_content = artifact.contents[-1] if artifact and artifact.contents else None
     memories_str = format_reflections(
-        memories.get("value") if memories else None
+        memories.get("value") if memories else None,
+        query=get_reflections_query(state.get("_messages", []), latest_content)
     ) if memories else "No reflections found."
 
-    current_artifact_content = None
-    if state.artifact and state.artifact.contents:
-        current_artifact_content = state.artifact.contents[-1]
-        if not isinstance(current_artifact_content, ArtifactMarkdownV3):
-            raise ValueError("Current artifact content is not markdown")
+    current_artifact_content = latest_content
+    if current_artifact_content and not isinstance(current_artifact_content, ArtifactMarkdownV3):
+        raise ValueError("Current artifact content is not markdown")
 
     if not current_artifact_content:
         raise ValueError("No artifact found")
 
     formatted_prompt = ""
-    if state.language:
+    if state.get("language"):
         formatted_prompt = CHANGE_ARTIFACT_LANGUAGE_PROMPT.format(
-            new_language=state.language,
+            new_language=state.get("language"),
             artifact_content=current_artifact_content.full_markdown
         )
-    elif state.reading_level and state.reading_level != "pirate":
+    elif state.get("reading_level") and state.get("reading_level") != "pirate":
         reading_level_map = {
             "child": "elementary school student",
             "teenager": "high school student",
@@ -61,14 +74,14 @@ async def rewrite_artifact_theme(
             "phd": "PhD student"
         }
         formatted_prompt = CHANGE_ARTIFACT_READING_LEVEL_PROMPT.format(
-            new_reading_level=reading_level_map.get(state.reading_level, ""),
+            new_reading_level=reading_level_map.get(state.get("reading_level"), ""),
             artifact_content=current_artifact_content.full_markdown
         )
-    elif state.reading_level == "pirate":
+    elif state.get("reading_level") == "pirate":
         formatted_prompt = CHANGE_ARTIFACT_TO_PIRATE_PROMPT.format(
             artifact_content=current_artifact_content.full_markdown
         )
-    elif state.artifact_length:
+    elif state.get("artifact_length"):
         length_map = {
             "shortest": "much shorter than it currently is",
             "short": "slightly shorter than it currently is",
@@ -76,10 +89,10 @@ async def rewrite_artifact_theme(
             "longest": "much longer than it currently is"
         }
         formatted_prompt = CHANGE_ARTIFACT_LENGTH_PROMPT.format(
-            new_length=length_map.get(state.artifact_length, ""),
+            new_length=length_map.get(state.get("artifact_length"), ""),
             artifact_content=current_artifact_content.full_markdown
         )
-    elif state.regenerate_with_emojis:
+    elif state.get("regenerate_with_emojis"):
         formatted_prompt = ADD_EMOJIS_TO_ARTIFACT_PROMPT.format(
             artifact_content=current_artifact_content.full_markdown
         )
@@ -88,7 +101,7 @@ async def rewrite_artifact_theme(
 
     formatted_prompt = formatted_prompt.replace("{reflections}", memories_str)
 
-    response = await small_model.invoke([{"role": "user", "content": formatted_prompt}])
+    response = await ainvoke_model(small_model, [{"role": "user", "content": formatted_prompt}])
     
     new_content = response.content
     thinking_message = None
@@ -103,15 +116,15 @@ async def rewrite_artifact_theme(
         new_content = content
 
     new_artifact_content = ArtifactMarkdownV3(
-        index=len(state.artifact.contents) + 1,
+        index=len(artifact.contents) + 1,
         type="text",
         title=current_artifact_content.title,
         full_markdown=new_content
     )
 
     new_artifact = ArtifactV3(
-        current_index=len(state.artifact.contents) + 1,
-        contents=[*state.artifact.contents, new_artifact_content]
+        current_index=len(artifact.contents) + 1,
+        contents=[*artifact.contents, new_artifact_content]
     )
 
     return {
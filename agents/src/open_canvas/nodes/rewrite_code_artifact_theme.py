@@ -4,7 +4,7 @@ from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
 from shared.src.types import ArtifactV3, ArtifactCodeV3
-from agents.src.utils import get_model_config, get_model_from_config
+from agents.src.utils import ainvoke_model, get_model_config, get_model_from_config
 from agents.src.open_canvas.prompts import (
     ADD_COMMENTS_TO_CODE_ARTIFACT_PROMPT,
     ADD_LOGS_TO_CODE_ARTIFACT_PROMPT,
@@ -58,7 +58,7 @@ async def rewrite_code_artifact_theme(
         artifact_content=current_artifact_content.code
     )
 
-    response = await small_model.invoke([{"role": "user", "content": formatted_prompt}])
+    response = await ainvoke_model(small_model, [{"role": "user", "content": formatted_prompt}])
     
     new_content = response.content
     thinking_message = None
@@ -3,6 +3,8 @@ from typing import Dict, Any
 from langgraph_sdk import get_client
 from langchain_core.runnables import RunnableConfig
 from agents.src.open_canvas.state import OpenCanvasGraphState
+from agents.src.background import get_background_executor, use_in_process_background_execution
+from agents.src.utils import get_checkpointer_from_config
 
 async def summarizer(
     state: OpenCanvasGraphState,
@@ -12,17 +14,45 @@ async def summarizer(
     if not thread_id:
         raise ValueError("Missing thread_id in summarizer config")
 
-    client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+    # Forward the summary budgets, if set, to the summarizer graph
+    configurable = config.get("configurable", {})
+    summarizer_config = {
+        "configurable": {
+            key: configurable[key]
+            for key in (
+                "summarizer_tail_tokens",
+                "summarizer_summary_max_tokens",
+                "summarizer_chunk_tokens",
+                "summarizer_max_concurrency"
+            )
+            if key in configurable
+        }
+    }
+
+    # Only pass a reference to the thread. The summarizer graph reads `_messages`
+    # from the checkpointer or thread API, and folds only those after its watermark.
+    summarizer_input = {
+        "thread_id": thread_id  # Changed from threadId to snake_case
+    }
 
     try:
+        if use_in_process_background_execution():
+            if not await get_background_executor().submit(
+                "summarizer",
+                summarizer_input,
+                summarizer_config,
+                checkpointer=get_checkpointer_from_config(config)
+            ):
+                print("Background queue is full, skipping summarization")
+            return {}
+
+        client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
         new_thread = await client.threads.create()
         await client.runs.create(
             thread_id=new_thread.thread_id,
             app_id="summarizer",
-            input={
-                "messages": state._messages,
-                "thread_id": thread_id  # Changed from threadId to snake_case
-            }
+            input=summarizer_input,
+            config=summarizer_config
         )
     except Exception as e:
         print(f"Error in summarizer: {e}")
@@ -1,20 +1,25 @@
+import asyncio
 from typing import Dict, Any
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from agents.src.utils import (
-    create_context_document_messages,
+    coalesced_store_get,
+    build_prompt_messages,
     ensure_store_in_config,
     format_reflections,
+    get_context_document_messages,
+    get_reflections_query,
     get_model_config,
-    get_model_from_config,
-    is_using_o1_mini_model
+    prefetch
 )
+from agents.src.failover import get_config_with_model, invoke_with_failover
 from shared.src.utils.artifacts import (
     get_artifact_content,
     is_artifact_code_content
 )
-from shared.src.types import ArtifactV3, ArtifactCodeV3
-from agents.src.open_canvas.prompts import UPDATE_HIGHLIGHTED_ARTIFACT_PROMPT
+from shared.src.types import ArtifactV3, ArtifactCodeV3, CodeHighlight
+from shared.src.utils.edits import TextEdit, TextRegion, apply_text_edits, merge_nested_ranges
+from agents.src.open_canvas.prompts import REFLECTIONS_AFTER_CONVERSATION, UPDATE_HIGHLIGHTED_ARTIFACT_PROMPT
 
 async def update_artifact(
     state: Dict[str, Any],
@@ -37,14 +42,10 @@ async def update_artifact(
     # Select appropriate model based on provider
     if "openai" in model_provider or "3-5-sonnet" in model_name:
         # Custom model is intelligent enough for updating artifacts
-        small_model = await get_model_from_config(config, {"temperature": 0})
+        model_run_config = config
     else:
         # Custom model is not intelligent enough for updating artifacts
-        fallback_config = {
-            **config,
-            "configurable": {"custom_model_name": "gpt-4o"}
-        }
-        small_model = await get_model_from_config(fallback_config, {"temperature": 0})
+        model_run_config = get_config_with_model(config, "gpt-4o")
 
     # Get reflections from store
     store = ensure_store_in_config(config)
@@ -54,44 +55,52 @@ async def update_artifact(
     
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
-    memories = await store.get(memory_namespace, memory_key)
+    fetched = await prefetch({
+        "memories": coalesced_store_get(store, memory_namespace, memory_key),
+        "context_docs": get_context_document_messages(config)
+    }, "update_artifact")
+    memories = fetched["memories"]
     memories_str = memories.get("value", None) if memories else None
-    memories_as_string = format_reflections(memories_str) if memories_str else "No reflections found."
+    memories_as_string = format_reflections(
+        memories_str,
+        query=get_reflections_query(state.get("_messages", []))
+    ) if memories_str else "No reflections found."
+
+    # The artifact and highlights are dicts when sent by the client
+    artifact = state.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
 
     # Get current artifact content
     current_artifact_content = None
-    if state.get("artifact"):
-        current_artifact_content = get_artifact_content(state["artifact"])
+    if artifact:
+        current_artifact_content = get_artifact_content(artifact)
     if not current_artifact_content:
         raise ValueError("No artifact found")
     if not is_artifact_code_content(current_artifact_content):
         raise ValueError("Current artifact content is not code")
 
-    # Check for highlighted code
-    highlighted_code = state.get("highlighted_code")
-    if not highlighted_code:
+    # Get highlighted code. All highlights are updated in one pass.
+    highlights = [
+        CodeHighlight(**highlight) if isinstance(highlight, dict) else highlight
+        for highlight in [
+            *([state["highlighted_code"]] if state.get("highlighted_code") else []),
+            *(state.get("highlighted_codes") or [])
+        ]
+    ]
+    if not highlights:
         raise ValueError("Cannot partially regenerate an artifact without a highlight")
 
-    # Extract code sections with context
-    start = max(0, highlighted_code["start_char_index"] - 500)
-    end = min(
-        len(current_artifact_content["code"]),
-        highlighted_code["end_char_index"] + 500
-    )
+    code = current_artifact_content.code
+    for highlight in highlights:
+        if not 0 <= highlight.start_char_index <= highlight.end_char_index <= len(code):
+            raise ValueError("Highlight is outside of the current artifact content")
 
-    before_highlight = current_artifact_content["code"][start:highlighted_code["start_char_index"]]
-    highlighted_text = current_artifact_content["code"][
-        highlighted_code["start_char_index"]:highlighted_code["end_char_index"]
-    ]
-    after_highlight = current_artifact_content["code"][highlighted_code["end_char_index"]:end]
-
-    # Format prompt
-    formatted_prompt = UPDATE_HIGHLIGHTED_ARTIFACT_PROMPT.format(
-        highlighted_text=highlighted_text,
-        before_highlight=before_highlight,
-        after_highlight=after_highlight,
-        reflections=memories_as_string
-    )
+    # A highlight nested in another is updated as part of it, like highlighted
+    # text blocks. Highlights that only partially overlap are rejected.
+    regions = merge_nested_ranges([
+        (highlight.start_char_index, highlight.end_char_index) for highlight in highlights
+    ])
 
     # Get recent human message
     recent_human_message = next(
@@ -101,32 +110,43 @@ async def update_artifact(
     if not recent_human_message:
         raise ValueError("No recent human message found")
 
-    # Get context and invoke model
-    context_docs = await create_context_document_messages(config)
-    is_o1_mini = is_using_o1_mini_model(config)
-    
-    updated_artifact = await small_model.invoke([
-        {"role": "user" if is_o1_mini else "system", "content": formatted_prompt},
-        *context_docs,
-        recent_human_message
-    ])
+    async def update_region(region: TextRegion) -> TextEdit:
+        # Extract code sections with context
+        before_highlight = code[max(0, region.start - 500):region.start]
+        highlighted_text = code[region.start:region.end]
+        after_highlight = code[region.end:region.end + 500]
 
-    # Update artifact content
-    artifact = state["artifact"]
-    entire_text_before = current_artifact_content["code"][:highlighted_code["start_char_index"]]
-    entire_text_after = current_artifact_content["code"][highlighted_code["end_char_index"]:]
-    entire_updated_content = f"{entire_text_before}{updated_artifact.content}{entire_text_after}"
+        # Format prompt
+        formatted_prompt = UPDATE_HIGHLIGHTED_ARTIFACT_PROMPT.format(
+            highlighted_text=highlighted_text,
+            before_highlight=before_highlight,
+            after_highlight=after_highlight,
+            reflections=REFLECTIONS_AFTER_CONVERSATION
+        )
+
+        # Invoke model
+        updated_region = await invoke_with_failover(
+            model_run_config,
+            build_prompt_messages(
+                config, formatted_prompt, fetched["context_docs"], [recent_human_message], memories_as_string
+            ),
+            {"temperature": 0}
+        )
+        return TextEdit(start=region.start, end=region.end, text=updated_region.content)
 
-    new_artifact_content = {
-        **current_artifact_content,
-        "index": len(artifact["contents"]) + 1,
-        "code": entire_updated_content
-    }
+    # Update every region concurrently, then apply the edits by offset as a single new version
+    edits = await asyncio.gather(*[update_region(region) for region in regions])
+    entire_updated_content = apply_text_edits(code, edits)
+
+    # Update artifact content
+    new_curr_index = len(artifact.contents) + 1
+    new_artifact_content = ArtifactCodeV3(
+        **{**current_artifact_content.model_dump(), "index": new_curr_index, "code": entire_updated_content}
+    )
 
     return {
-        "artifact": {
-            **artifact,
-            "current_index": len(artifact["contents"]) + 1,
-            "contents": [*artifact["contents"], new_artifact_content]
-        }
+        "artifact": ArtifactV3(
+            current_index=new_curr_index,
+            contents=[*artifact.contents, new_artifact_content]
+        )
     } 
\ No newline at end of file
@@ -1,17 +1,19 @@
+import asyncio
 from typing import Dict, Any
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from agents.src.utils import (
-    create_context_document_messages,
-    get_model_config,
-    get_model_from_config,
-    is_using_o1_mini_model
+    build_prompt_messages,
+    get_context_document_messages,
+    get_model_config
 )
+from agents.src.failover import get_config_with_model, invoke_with_failover
 from shared.src.utils.artifacts import (
     get_artifact_content,
     is_artifact_markdown_content
 )
-from shared.src.types import ArtifactV3, ArtifactMarkdownV3
+from shared.src.types import ArtifactV3, ArtifactMarkdownV3, TextHighlight
+from shared.src.utils.edits import TextEdit, TextRegion, apply_text_edits, find_blocks, merge_nested_ranges
 
 PROMPT = """You are an expert AI writing assistant, tasked with rewriting some text a user has selected. The selected text is nested inside a larger 'block'. You should always respond with ONLY the updated text block in accordance with the user's request.
 You should always respond with the full markdown text block, as it will simply replace the existing block in the artifact.
@@ -53,36 +55,53 @@ async def update_highlighted_text(
     # Select appropriate model based on provider
     if "openai" in model_provider or "3-5-sonnet" in model_name:
         # Custom model is intelligent enough for updating artifacts
-        model = await get_model_from_config(config, {"temperature": 0})
-        model.config = {"run_name": "update_highlighted_markdown"}
+        model_run_config = config
     else:
         # Custom model is not intelligent enough for updating artifacts
-        fallback_config = {
-            **config,
-            "configurable": {"custom_model_name": "gpt-4o"}
-        }
-        model = await get_model_from_config(fallback_config, {"temperature": 0})
-        model.config = {"run_name": "update_highlighted_markdown"}
+        model_run_config = get_config_with_model(config, "gpt-4o")
+
+    # The artifact and highlights are dicts when sent by the client
+    artifact = state.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
 
     # Get current artifact content
     current_artifact_content = None
-    if state.get("artifact"):
-        current_artifact_content = get_artifact_content(state["artifact"])
+    if artifact:
+        current_artifact_content = get_artifact_content(artifact)
     if not current_artifact_content:
         raise ValueError("No artifact found")
     if not is_artifact_markdown_content(current_artifact_content):
         raise ValueError("Artifact is not markdown content")
 
-    # Check for highlighted text
-    highlighted_text = state.get("highlighted_text")
-    if not highlighted_text:
+    # Get highlighted text. All highlights are updated in one pass.
+    highlights = [
+        TextHighlight(**highlight) if isinstance(highlight, dict) else highlight
+        for highlight in [
+            *([state["highlighted_text"]] if state.get("highlighted_text") else []),
+            *(state.get("highlighted_texts") or [])
+        ]
+    ]
+    if not highlights:
         raise ValueError("Cannot partially regenerate an artifact without a highlight")
 
-    # Format prompt
-    formatted_prompt = PROMPT.format(
-        highlighted_text=highlighted_text["selected_text"],
-        text_blocks=highlighted_text["markdown_block"]
-    )
+    full_markdown = highlights[0].full_markdown
+    if any(highlight.full_markdown != full_markdown for highlight in highlights):
+        raise ValueError("Highlights must be made on the same version of the artifact")
+
+    # Locate each block, so it is replaced at its offset rather than wherever its text repeats
+    try:
+        ranges = find_blocks(
+            full_markdown,
+            [highlight.markdown_block for highlight in highlights],
+            [highlight.block_start for highlight in highlights]
+        )
+    except ValueError as e:
+        raise ValueError(f"Selected text not found in current content: {e}")
+
+    # Highlights in the same block, or in a block nested in another, are updated
+    # as one region. Blocks that only partially overlap are rejected.
+    regions = merge_nested_ranges(ranges)
 
     # Get recent user message
     messages = state.get("_messages", [])
@@ -92,45 +111,44 @@ async def update_highlighted_text(
     if recent_user_message.type != "human":
         raise ValueError("Expected a human message")
 
-    # Get context and invoke model
-    context_docs = await create_context_document_messages(config)
-    is_o1_mini = is_using_o1_mini_model(config)
-    
-    response = await model.invoke([
-        {"role": "user" if is_o1_mini else "system", "content": formatted_prompt},
-        *context_docs,
-        recent_user_message
-    ])
+    context_docs = await get_context_document_messages(config)
+
+    async def update_region(region: TextRegion) -> TextEdit:
+        # Format prompt
+        formatted_prompt = PROMPT.format(
+            highlighted_text="\n\n".join(highlights[i].selected_text for i in region.members),
+            text_blocks=full_markdown[region.start:region.end]
+        )
+
+        # Invoke model
+        response = await invoke_with_failover(
+            model_run_config,
+            build_prompt_messages(config, formatted_prompt, context_docs, [recent_user_message]),
+            {"temperature": 0},
+            run_config={"run_name": "update_highlighted_markdown"}
+        )
+        return TextEdit(start=region.start, end=region.end, text=response.content)
+
+    # Update every region concurrently, then apply the edits by offset as a single new version
+    edits = await asyncio.gather(*[update_region(region) for region in regions])
+    new_full_markdown = apply_text_edits(full_markdown, edits)
 
     # Update artifact content
-    artifact = state["artifact"]
-    new_curr_index = len(artifact["contents"]) + 1
     prev_content = next(
-        (c for c in artifact["contents"] 
-         if c["index"] == artifact["current_index"] and c["type"] == "text"),
+        (c for c in artifact.contents if c.index == artifact.current_index and c.type == "text"),
         None
     )
     if not prev_content:
         raise ValueError("Previous content not found")
 
-    if highlighted_text["full_markdown"].find(highlighted_text["markdown_block"]) == -1:
-        raise ValueError("Selected text not found in current content")
-
-    new_full_markdown = highlighted_text["full_markdown"].replace(
-        highlighted_text["markdown_block"],
-        response.content
+    new_curr_index = len(artifact.contents) + 1
+    updated_artifact_content = ArtifactMarkdownV3(
+        **{**prev_content.model_dump(), "index": new_curr_index, "full_markdown": new_full_markdown}
     )
 
-    updated_artifact_content = {
-        **prev_content,
-        "index": new_curr_index,
-        "full_markdown": new_full_markdown
-    }
-
     return {
-        "artifact": {
-            **artifact,
-            "current_index": new_curr_index,
-            "contents": [*artifact["contents"], updated_artifact_content]
-        }
-    } 
\ No newline at end of file
+        "artifact": ArtifactV3(
+            current_index=new_curr_index,
+            contents=[*artifact.contents, updated_artifact_content]
+        )
+    }
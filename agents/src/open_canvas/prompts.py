@@ -73,7 +73,7 @@ Be careful when selecting the type, as this will update how the artifact is disp
 
 Remember, if you change the type from 'text' to 'code' you must also define the programming language the code should be written in.
 
-Here is the current artifact (only the first 500 characters, or less if the artifact is shorter):
+Here is an outline of the current artifact, with its headings or definitions and its opening lines:
 <artifact>
 {{artifact}}
 </artifact>
@@ -365,4 +365,13 @@ Rules and guidelines:
 - Do not wrap it in any XML tags you see in this prompt. Ensure it's just the updated code
 - Ensure you do not port over language specific modules. E.g if the code contains imports from Node's fs module, you must use the closest equivalent in {{new_language}}.
 {0}
-</rules-guidelines>""".format(DEFAULT_CODE_PROMPT_RULES) 
\ No newline at end of file
+</rules-guidelines>""".format(DEFAULT_CODE_PROMPT_RULES) 
+# Fills the `reflections` slot of system prompts sent with `build_prompt_messages`.
+# The reflections are selected for each request, so they follow the conversation
+# instead of changing the cached prompt prefix.
+REFLECTIONS_AFTER_CONVERSATION = "The reflections relevant to the user's latest request follow the conversation."
+
+RELEVANT_REFLECTIONS_PROMPT = """Here are the reflections on style guidelines and general memories/facts about the user that are relevant to this request:
+<reflections>
+{reflections}
+</reflections>"""
@@ -1,5 +1,6 @@
-from typing import List, Optional, Dict, Any, Union, TypedDict, Annotated
-from langchain_core.messages import BaseMessage
+from typing import List, Optional, Dict, Any, Union, Annotated
+from typing_extensions import TypedDict
+from langchain_core.messages import BaseMessage, convert_to_messages
 from langgraph.graph.message import add_messages
 from shared.src.types import (
     ArtifactV3,
@@ -11,7 +12,7 @@ from shared.src.types import (
     ProgrammingLanguageOptions,
     SearchResult
 )
-from shared.src.constants import OC_SUMMARIZED_MESSAGE_KEY
+from shared.src.constants import OC_SUMMARIZED_MESSAGE_KEY, OC_SUMMARY_WATERMARK_KEY
 
 # Define Messages type without BaseMessageLike
 Messages = Union[List[BaseMessage], BaseMessage]
@@ -43,6 +44,35 @@ def is_summary_message(msg: Any) -> bool:
 
     return False
 
+def add_internal_messages(left: Messages, right: Messages) -> List[BaseMessage]:
+    """Reducer for `_messages`.
+    
+    Appends messages, or replaces those with the same ID, like `add_messages`,
+    which also assigns an ID to every message without one. Watermarks on
+    `_messages` can then always refer to a message by its ID.
+    
+    An update containing a summary message replaces the messages it folded in:
+    the result is the update, followed by the messages after the summary's
+    watermark, e.g. those added while the summarizer was running.
+    
+    Args:
+        left: The current messages
+        right: The messages to add
+        
+    Returns:
+        List[BaseMessage]: The updated messages
+    """
+    updates = convert_to_messages(right if isinstance(right, list) else [right])
+    summary = next((msg for msg in reversed(updates) if is_summary_message(msg)), None)
+    if summary is None:
+        return add_messages(left, updates)
+
+    current = convert_to_messages(left if isinstance(left, list) else [left])
+    watermark = summary.additional_kwargs.get(OC_SUMMARY_WATERMARK_KEY)
+    position = next((idx for idx, msg in enumerate(current) if watermark and msg.id == watermark), None)
+    kept = current[position + 1:] if position is not None else []
+    return add_messages(add_messages([], updates), kept)
+
 class OpenCanvasGraphState(TypedDict, total=False):
     """State representation for Open Canvas graph"""
     
@@ -51,7 +81,14 @@ class OpenCanvasGraphState(TypedDict, total=False):
     
     # The list of messages passed to the model. Can include summarized messages,
     # and others which are NOT shown to the user
-    _messages: List[BaseMessage]
+    _messages: Annotated[List[BaseMessage], add_internal_messages]
+    
+    # Running token count of `_messages`. Maintained incrementally, so only
+    # messages appended since the last turn are tokenized
+    _messages_token_count: Optional[int]
+    
+    # Position and ID of the last message included in `_messages_token_count`
+    _messages_token_watermark: Optional[Dict[str, Any]]
     
     # The part of the artifact the user highlighted
     highlighted_code: Optional[CodeHighlight]
@@ -59,6 +96,14 @@ class OpenCanvasGraphState(TypedDict, total=False):
     # The highlighted text including markdown blocks and plain text content
     highlighted_text: Optional[TextHighlight]
     
+    # Several parts of the artifact to update with a single request. Combined
+    # with `highlighted_code`, and edited in one run as a single new version
+    highlighted_codes: Optional[List[CodeHighlight]]
+    
+    # Several highlighted texts to update with a single request. Combined with
+    # `highlighted_text`, and edited in one run as a single new version
+    highlighted_texts: Optional[List[TextHighlight]]
+    
     # The artifacts generated in the conversation
     artifact: Optional[ArtifactV3]
     
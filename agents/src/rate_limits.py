@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+from shared.src.utils.tokens import count_messages_tokens
+from agents.src import metrics
+
+# Limits per API key, per provider. `total_*` limits apply across all keys of
+# a provider. Override with a JSON object in the `OC_RATE_LIMITS` env var,
+# e.g. {"anthropic": {"requests_per_minute": 1000}}.
+DEFAULT_PROVIDER_LIMITS: Dict[str, Dict[str, float]] = {
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+    "azure_openai": {"requests_per_minute": 300, "tokens_per_minute": 150000},
+    "anthropic": {"requests_per_minute": 50, "tokens_per_minute": 80000},
+}
+
+# Bucket state is shared by every process using the same file. Set
+# `OC_RATE_LIMIT_PATH` to an empty string to keep it in this process only.
+DEFAULT_STATE_PATH = ".oc_rate_limits.sqlite3"
+
+# Max seconds to sleep between checks while waiting for a bucket
+MAX_WAIT_SLICE_SECONDS = 1.0
+
+# Each successful request earns this fraction of a retry, so retries stay a
+# bounded share of traffic during an outage instead of multiplying it
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_CAPACITY = 20
+# Retries earned per second regardless of traffic, so a quiet process can still retry
+RETRY_BUDGET_MIN_RATE = 0.2
+
+DEFAULT_MAX_RETRIES = 3
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 30.0
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+RETRYABLE_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError", "TimeoutError"})
+
+class TokenBucketStore:
+    """Token buckets persisted in SQLite, so worker processes share them.
+
+    Buckets refill continuously at `rate` tokens per second up to `capacity`.
+    Each operation runs in an immediate transaction, which serializes
+    concurrent processes. With no path, buckets are kept in memory.
+
+    Transactions can wait on other processes, so the async methods run them
+    in a thread instead of on the event loop.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_STATE_PATH):
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Tuple[float, float]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def _read(self, name: str, capacity: float) -> Tuple[float, float]:
+        if self._conn is None:
+            return self._memory.get(name, (capacity, time.time()))
+        row = self._conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+        return row if row else (capacity, time.time())
+
+    def _write(self, name: str, tokens: float, updated_at: float) -> None:
+        if self._conn is None:
+            self._memory[name] = (tokens, updated_at)
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, tokens, updated_at)
+            )
+
+    def _update(self, name: str, rate: float, capacity: float, change) -> Any:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                tokens, updated_at = self._read(name, capacity)
+                tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+                tokens, result = change(tokens)
+                self._write(name, tokens, now)
+            except BaseException:
+                if self._conn is not None:
+                    self._conn.execute("ROLLBACK")
+                raise
+            if self._conn is not None:
+                self._conn.execute("COMMIT")
+            return result
+
+    def take(self, name: str, amount: float, rate: float, capacity: float) -> float:
+        """Take `amount` tokens if available.
+
+        Amounts larger than the capacity are admitted once the bucket is full,
+        leaving it in debt.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds until they will be available
+        """
+        def change(tokens: float) -> Tuple[float, float]:
+            needed = min(amount, capacity)
+            if tokens >= needed:
+                return tokens - amount, 0.0
+            return tokens, (needed - tokens) / rate if rate > 0 else MAX_WAIT_SLICE_SECONDS
+        return self._update(name, rate, capacity, change)
+
+    def add(self, name: str, amount: float, rate: float, capacity: float) -> None:
+        """Add tokens to a bucket, or remove them if `amount` is negative. May leave the bucket in debt."""
+        self._update(name, rate, capacity, lambda tokens: (min(capacity, tokens + amount), None))
+
+    async def _arun(self, fn, *args: Any) -> Any:
+        # In-memory buckets never wait, so they are updated inline
+        if self._conn is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def atake(self, name: str, amount: float, rate: float, capacity: float) -> float:
+        """Async version of `take`."""
+        return await self._arun(self.take, name, amount, rate, capacity)
+
+    async def aadd(self, name: str, amount: float, rate: float, capacity: float) -> None:
+        """Async version of `add`."""
+        await self._arun(self.add, name, amount, rate, capacity)
+
+def _key_id(api_key: Optional[str]) -> str:
+    # Buckets are per key, without persisting the key itself
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+def get_provider_limits(provider: str) -> Dict[str, float]:
+    """Get the rate limits of a provider, including overrides from `OC_RATE_LIMITS`."""
+    limits = dict(DEFAULT_PROVIDER_LIMITS.get(provider, {}))
+    try:
+        overrides = json.loads(os.getenv("OC_RATE_LIMITS", "") or "{}")
+    except ValueError as e:
+        print(f"Ignoring invalid OC_RATE_LIMITS: {e}")
+        overrides = {}
+    limits.update(overrides.get(provider, {}))
+    return limits
+
+def _bucket_specs(provider: str, api_key: Optional[str], kind: str) -> List[Tuple[str, float, float]]:
+    # (name, rate per second, capacity) of every bucket a request must pass
+    limits = get_provider_limits(provider)
+    specs = []
+    for limit_name, bucket_name in (
+        (f"{kind}_per_minute", f"{provider}:{_key_id(api_key)}:{kind}"),
+        (f"total_{kind}_per_minute", f"{provider}:{kind}")
+    ):
+        per_minute = limits.get(limit_name)
+        if per_minute:
+            specs.append((bucket_name, per_minute / 60, per_minute))
+    return specs
+
+async def _wait_for_buckets(
+    store: TokenBucketStore,
+    specs: List[Tuple[str, float, float]],
+    amount: float,
+    metric_prefix: str
+) -> None:
+    started = time.monotonic()
+    for name, rate, capacity in specs:
+        while True:
+            wait = await store.atake(name, amount, rate, capacity)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+    queued = time.monotonic() - started
+    metrics.increment(f"{metric_prefix}.acquired")
+    if queued > 0.001:
+        metrics.increment(f"{metric_prefix}.queued")
+        metrics.increment(f"{metric_prefix}.queue_seconds", queued)
+
+class ProviderRateLimiter(BaseRateLimiter):
+    """Limits requests per minute per provider and per API key.
+
+    Passed to chat models as `rate_limiter`, so LangChain waits for it before
+    each request that is not served from cache. Time spent waiting is
+    recorded in the `rate_limit.<provider>.requests.*` metrics.
+    """
+
+    def __init__(self, provider: str, api_key: Optional[str], store: TokenBucketStore):
+        self.provider = provider
+        self._specs = _bucket_specs(provider, api_key, "requests")
+        self._store = store
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        for name, rate, capacity in self._specs:
+            while True:
+                wait = self._store.take(name, 1, rate, capacity)
+                if wait <= 0:
+                    break
+                if not blocking:
+                    return False
+                time.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+        metrics.increment(f"rate_limit.{self.provider}.requests.queue_seconds", time.monotonic() - started)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            for name, rate, capacity in self._specs:
+                if await self._store.atake(name, 1, rate, capacity) > 0:
+                    return False
+            return True
+        await _wait_for_buckets(self._store, self._specs, 1, f"rate_limit.{self.provider}.requests")
+        return True
+
+class TokenRateLimitHandler(AsyncCallbackHandler):
+    """Limits tokens per minute per provider and per API key.
+
+    Waits for the estimated prompt tokens before each model call, then
+    charges the output tokens reported by the provider once it completes.
+    """
+
+    def __init__(self, provider: str, api_key: Optional[str], model_name: str, store: TokenBucketStore):
+        self.provider = provider
+        self.model_name = model_name
+        self._specs = _bucket_specs(provider, api_key, "tokens")
+        self._store = store
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], **kwargs: Any) -> None:
+        prompt_tokens = sum(count_messages_tokens(prompt, self.model_name) for prompt in messages)
+        await _wait_for_buckets(self._store, self._specs, prompt_tokens, f"rate_limit.{self.provider}.tokens")
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                output_tokens += (usage or {}).get("output_tokens", 0)
+        for name, rate, capacity in self._specs:
+            await self._store.aadd(name, -output_tokens, rate, capacity)
+
+class RetryBudget:
+    """Caps retries at a share of successful requests, across every process sharing the store."""
+
+    def __init__(self, store: TokenBucketStore, name: str = "retry_budget"):
+        self._store = store
+        self._name = name
+
+    def record_success(self) -> None:
+        self._store.add(self._name, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_RATE, RETRY_BUDGET_CAPACITY)
+
+    def try_spend(self) -> bool:
+        return self._store.take(self._name, 1, RETRY_BUDGET_MIN_RATE, RETRY_BUDGET_CAPACITY) <= 0
+
+    async def arecord_success(self) -> None:
+        await self._store.aadd(self._name, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_RATE, RETRY_BUDGET_CAPACITY)
+
+    async def atry_spend(self) -> bool:
+        return await self._store.atake(self._name, 1, RETRY_BUDGET_MIN_RATE, RETRY_BUDGET_CAPACITY) <= 0
+
+def is_retryable_error(error: Exception) -> bool:
+    """Check if a model call failed with a rate limit, overload, server or connection error."""
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+def get_retry_delay(error: Exception, attempt: int) -> float:
+    """Get the delay before a retry, honoring `retry-after` and otherwise using full-jitter backoff."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after"))
+        if 0 < retry_after <= RETRY_MAX_DELAY_SECONDS:
+            return retry_after
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+
+_store: Optional[TokenBucketStore] = None
+
+def get_rate_limit_store() -> TokenBucketStore:
+    """Get the process-wide bucket store, configured from the environment."""
+    global _store
+    if _store is None:
+        _store = TokenBucketStore(os.getenv("OC_RATE_LIMIT_PATH", DEFAULT_STATE_PATH) or None)
+    return _store
+
+def get_rate_limiter(provider: str, api_key: Optional[str]) -> ProviderRateLimiter:
+    return ProviderRateLimiter(provider, api_key, get_rate_limit_store())
+
+def get_token_rate_limit_handler(provider: str, api_key: Optional[str], model_name: str) -> TokenRateLimitHandler:
+    return TokenRateLimitHandler(provider, api_key, model_name, get_rate_limit_store())
+
+def get_retry_budget() -> RetryBudget:
+    return RetryBudget(get_rate_limit_store())
@@ -1,65 +1,237 @@
-from typing import Dict, Any
+import asyncio
+import difflib
+import hashlib
+from typing import Dict, Any, List, Literal, Optional, Tuple
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START
 from langgraph.prebuilt import ToolNode
 from pydantic import BaseModel, Field
 from shared.src.types import ArtifactV3, Reflections
-from agents.src.utils import ensure_store_in_config, format_reflections
+from agents.src.utils import (
+    CONVERSATION_WINDOW_TOKEN_BUDGETS,
+    ainvoke_model,
+    ensure_store_in_config,
+    get_thread_values
+)
 from agents.src.reflection.state import ReflectionGraphState
 from agents.src.reflection.prompts import REFLECT_SYSTEM_PROMPT, REFLECT_USER_PROMPT
 from shared.src.utils.artifacts import get_artifact_content, is_artifact_markdown_content
+from shared.src.utils.relevance import dedupe_texts
+from shared.src.utils.tokens import count_message_tokens
+from shared.src.utils.transcript import get_message_text, render_transcript
 import dotenv
 dotenv.load_dotenv()
 
+# Store key holding, per thread, the last message and artifact version reflected on
+WATERMARKS_KEY = "reflection_watermarks"
+
+REFLECTION_MODEL_NAME = "claude-3-5-sonnet-20240620"
+
+# Longest artifact diff included in the prompt, in characters
+MAX_ARTIFACT_DIFF_CHARS = 6000
+
+class ReflectionOperation(BaseModel):
+    action: Literal["add", "remove", "modify"] = Field(..., description="Whether to add a new entry, or remove or modify an existing one.")
+    index: Optional[int] = Field(None, description="The index of the existing entry to remove or modify. Omit when adding.")
+    text: Optional[str] = Field(None, description="The text of the added or modified entry. Omit when removing.")
+
 class ReflectionToolSchema(BaseModel):
-    style_rules: list[str] = Field(..., description="The complete new list of style rules and guidelines.")
-    content: list[str] = Field(..., description="The complete new list of memories/facts about the user.")
+    style_rules: list[ReflectionOperation] = Field(default_factory=list, description="Changes to make to the list of style rules and guidelines.")
+    content: list[ReflectionOperation] = Field(default_factory=list, description="Changes to make to the list of memories/facts about the user.")
+
+REFLECTION_TOOL = {
+    "name": "generate_reflections",
+    "description": "Add, remove or modify reflections based on the new messages and artifact changes.",
+    "input_schema": ReflectionToolSchema.model_json_schema()
+}
+
+def apply_reflection_operations(rules: List[str], operations: List[Dict[str, Any]]) -> List[str]:
+    """Apply add/remove/modify operations to a list of reflections.
+
+    Indices refer to the list as it was shown to the model, so removals and
+    modifications are resolved against the original list before additions.
+
+    Args:
+        rules: The existing reflections
+        operations: The operations returned by the model
+
+    Returns:
+        List[str]: The updated reflections
+    """
+    updated: List[Optional[str]] = list(rules)
+    added: List[str] = []
+    for op in operations:
+        action, index, text = op.get("action"), op.get("index"), op.get("text")
+        if action == "add" and text:
+            added.append(text)
+        elif action in ("remove", "modify") and isinstance(index, int) and 0 <= index < len(rules):
+            updated[index] = text if action == "modify" and text else None
+        else:
+            print(f"Ignoring invalid reflection operation: {op}")
+
+    result = [rule for rule in updated if rule]
+    return result + [rule for rule in added if rule not in result]
+
+def format_indexed_reflections(reflections: Dict[str, Any]) -> str:
+    def format_list(rules: List[str], empty: str) -> str:
+        return "\n".join(f"[{idx}] {rule}" for idx, rule in enumerate(rules)) or empty
+
+    return f"""<style-guidelines>
+{format_list(reflections.get("style_rules", []), "No style guidelines found.")}
+</style-guidelines>
+
+<user-facts>
+{format_list(reflections.get("content", []), "No memories/facts found.")}
+</user-facts>"""
+
+def _get_content_text(content: Any) -> str:
+    return content.full_markdown if is_artifact_markdown_content(content) else content.code
+
+def format_artifact_changes(artifact: Optional[ArtifactV3], since_index: Optional[int]) -> Optional[str]:
+    """Describe how the artifact changed since the version last reflected on.
+
+    Returns a compact unified diff against that version, the full content if
+    there is no earlier version, or None if the artifact did not change.
+    """
+    if not artifact:
+        return None
+    current = get_artifact_content(artifact)
+    if since_index is not None and since_index == current.index:
+        return None
+
+    previous = next((c for c in artifact.contents if c.index == since_index), None)
+    if previous is None:
+        return f"<artifact>\n{_get_content_text(current)}\n</artifact>"
+
+    diff = "\n".join(difflib.unified_diff(
+        _get_content_text(previous).splitlines(),
+        _get_content_text(current).splitlines(),
+        fromfile=f"version-{previous.index}",
+        tofile=f"version-{current.index}",
+        n=1,
+        lineterm=""
+    ))
+    if len(diff) > MAX_ARTIFACT_DIFF_CHARS:
+        diff = f"{diff[:MAX_ARTIFACT_DIFF_CHARS]}\n... (diff truncated)"
+    return f"<artifact-diff>\n{diff}\n</artifact-diff>"
+
+def get_watermark_id(message: BaseMessage) -> str:
+    """Get the ID a reflection watermark records for a message.
+
+    Messages passed inline may have no ID, so those are identified by their content.
+    """
+    if message.id:
+        return message.id
+    return hashlib.sha256(f"{message.type}\x00{get_message_text(message)}".encode("utf-8")).hexdigest()
+
+def get_new_turns(messages: List[BaseMessage], since_message_id: Optional[str]) -> List[BaseMessage]:
+    """Get the messages after the last one reflected on."""
+    if since_message_id:
+        idx = next((i for i, msg in enumerate(messages) if get_watermark_id(msg) == since_message_id), None)
+        if idx is not None:
+            return messages[idx + 1:]
+    return messages
+
+def take_turns_within_budget(messages: List[BaseMessage], token_budget: int) -> List[BaseMessage]:
+    """Take the oldest new messages that fit in `token_budget`, and at least one.
+
+    The watermark only moves past the messages taken, so the rest are
+    reflected on next time instead of being skipped.
+    """
+    taken: List[BaseMessage] = []
+    for msg in messages:
+        token_budget -= count_message_tokens(msg, REFLECTION_MODEL_NAME)
+        if taken and token_budget < 0:
+            break
+        taken.append(msg)
+    return taken
 
 async def reflect(
     state: ReflectionGraphState,
-    config: Dict[str, Any]
+    config: RunnableConfig
 ) -> Dict[str, Any]:
     store = ensure_store_in_config(config)
     assistant_id = config.get("configurable", {}).get("open_canvas_assistant_id")
     if not assistant_id:
         raise ValueError("`open_canvas_assistant_id` not found in configurable")
-    
+
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
-    
-    # Get existing memories
-    memories = await store.get(memory_namespace, memory_key)
-    memories_str = format_reflections(memories.get("value")) if memories else "No reflections found."
+
+    memories, watermarks_item = await asyncio.gather(
+        store.aget(tuple(memory_namespace), memory_key),
+        store.aget(tuple(memory_namespace), WATERMARKS_KEY)
+    )
+    reflections = memories.value if memories else None
+    reflections = reflections or {"style_rules": [], "content": []}
+    watermarks = dict(watermarks_item.value) if watermarks_item else {}
+
+    # Read the conversations from the threads instead of receiving a copy of them.
+    # Coalesced reflections cover every thread with activity since they were scheduled.
+    sources: List[Tuple[Optional[str], List[BaseMessage], Any]] = []
+    if state.messages:
+        sources.append((state.thread_id, state.messages, state.artifact))
+    else:
+        thread_ids = list(dict.fromkeys([*state.thread_ids, *([state.thread_id] if state.thread_id else [])]))
+        thread_values = await asyncio.gather(*[
+            get_thread_values(config, thread_id) for thread_id in thread_ids
+        ])
+        sources = [
+            (thread_id, values.get("_messages", []), values.get("artifact"))
+            for thread_id, values in zip(thread_ids, thread_values)
+        ]
+
+    # Only the turns and artifact changes since each thread's watermark are reflected on
+    conversations = []
+    artifact_changes = []
+    # The conversation budget is shared by every thread reflected on
+    window_budget = CONVERSATION_WINDOW_TOKEN_BUDGETS["reflection"] // max(len(sources), 1)
+    for thread_id, messages, artifact in sources:
+        if isinstance(artifact, dict):
+            artifact = ArtifactV3(**artifact)
+        watermark = watermarks.get(thread_id, {}) if thread_id else {}
+
+        new_turns = take_turns_within_budget(
+            get_new_turns(messages, watermark.get("message_id")), window_budget
+        )
+        if new_turns:
+            conversations.append(render_transcript(new_turns, separator="\n\n"))
+        changes = format_artifact_changes(artifact, watermark.get("artifact_index"))
+        if changes:
+            artifact_changes.append(changes)
+
+        if thread_id:
+            watermarks[thread_id] = {
+                "message_id": get_watermark_id(new_turns[-1]) if new_turns else watermark.get("message_id"),
+                "artifact_index": get_artifact_content(artifact).index if artifact else watermark.get("artifact_index")
+            }
+
+    if not conversations and not artifact_changes:
+        # Nothing new since the last reflection
+        return {}
 
     # Initialize model with tool
     model = ChatAnthropic(
-        model="claude-3-5-sonnet-20240620",
+        model=REFLECTION_MODEL_NAME,
         temperature=0
-    ).bind_tools([ReflectionToolSchema], tool_choice="generate_reflections")
-
-    # Get artifact content
-    artifact_content = None
-    if state.artifact:
-        current_artifact = get_artifact_content(state.artifact)
-        if is_artifact_markdown_content(current_artifact):
-            artifact_content = current_artifact.full_markdown
-        else:
-            artifact_content = current_artifact.code
+    ).bind_tools([REFLECTION_TOOL], tool_choice="generate_reflections")
 
     # Format prompts
     system_prompt = REFLECT_SYSTEM_PROMPT.format(
-        artifact=artifact_content or "No artifact found.",
-        reflections=memories_str
+        artifact="\n\n".join(artifact_changes) or "The artifact has not changed.",
+        reflections=format_indexed_reflections(reflections)
     )
     user_prompt = REFLECT_USER_PROMPT.format(
         conversation="\n\n".join(
-            f"<{msg.type}>\n{msg.content}\n</{msg.type}>" for msg in state.messages
-        )
+            f"<conversation index=\"{idx}\">\n{conversation}\n</conversation>"
+            for idx, conversation in enumerate(conversations)
+        ) or "There are no new messages."
     )
 
     # Invoke model
-    response = await model.invoke([
+    response = await ainvoke_model(model, [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ])
@@ -67,15 +239,21 @@ async def reflect(
     # Process response
     if not response.tool_calls:
         raise ValueError("Reflection tool call failed")
-    
+
+    # Near-identical rules are merged on write, so the lists only grow with new information
     tool_call = response.tool_calls[0]
     new_memories = {
-        "style_rules": tool_call["args"].get("styleRules", []),
-        "content": tool_call["args"].get("content", [])
+        "style_rules": dedupe_texts(apply_reflection_operations(
+            reflections.get("style_rules", []), tool_call["args"].get("style_rules", [])
+        )),
+        "content": dedupe_texts(apply_reflection_operations(
+            reflections.get("content", []), tool_call["args"].get("content", [])
+        ))
     }
 
     # Save to store
-    await store.put(memory_namespace, memory_key, new_memories)
+    await store.aput(tuple(memory_namespace), memory_key, new_memories)
+    await store.aput(tuple(memory_namespace), WATERMARKS_KEY, watermarks)
     return {}
 
 # Create and configure the graph
@@ -83,4 +261,4 @@ builder = StateGraph(ReflectionGraphState)
 builder.add_node("reflect", reflect)
 builder.add_edge(START, "reflect")
 graph = builder.compile()
-graph.name = "reflection" 
\ No newline at end of file
+graph.name = "reflection"
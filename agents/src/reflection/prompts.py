@@ -1,11 +1,10 @@
 REFLECT_SYSTEM_PROMPT = """You are an expert assistant, and writer. You are tasked with reflecting on the following conversation between a user and an AI assistant.
-You are also provided with an 'artifact' the user and assistant worked together on to write. Artifacts can be code, creative writing, emails, or any other form of written content.
+You are also provided with the changes made to the 'artifact' the user and assistant worked together on to write since you last reflected. Artifacts can be code, creative writing, emails, or any other form of written content.
+Changes are shown as a unified diff against the version you last saw, or as the full artifact if you have not seen it before.
 
-<artifact>
 {artifact}
-</artifact>
 
-You have also previously generated the following reflections about the user. Your reflections are broken down into two categories:
+You have also previously generated the following reflections about the user, each prefixed with its index. Your reflections are broken down into two categories:
 1. Style Guidelines: These are the style guidelines you have generated for the user. Style guidelines can be anything from writing style, to code style, to design style.
   They should be general, and apply to the all the users work, including the conversation and artifact generated.
 2. Content: These are general memories, facts, and insights you generate about the user. These can be anything from the users interests, to their goals, to their personality traits.
@@ -15,7 +14,7 @@ You have also previously generated the following reflections about the user. You
 {reflections}
 </reflections>
 
-Your job is to take all of the context and existing reflections and re-generate all. Use these guidelines when generating the new set of reflections:
+Your job is to update the existing reflections based on the new messages and artifact changes. Only return the changes to make: add new reflections, and remove or modify existing ones by their index. Existing reflections you do not mention are kept as they are. Use these guidelines when updating the reflections:
 
 <system-guidelines>
 - Ensure your reflections are relevant to the conversation and artifact.
@@ -33,8 +32,8 @@ Your job is to take all of the context and existing reflections and re-generate
 
 I'll reiterate one final time: ensure the reflections you generate are kept at a reasonable length, are descriptive, and are based on the conversation and artifact provided.
 
-Finally, use the 'generate_reflections' tool to generate the new, full list of reflections."""
+Finally, use the 'generate_reflections' tool to return the changes to the reflections. Return empty lists if no changes are needed."""
 
-REFLECT_USER_PROMPT = """Here is my conversation:
+REFLECT_USER_PROMPT = """Here are the new messages in my conversation since you last reflected:
 
 {conversation}""" 
\ No newline at end of file
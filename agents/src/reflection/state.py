@@ -10,6 +10,14 @@ class ReflectionGraphState(BaseModel):
         default_factory=list,
         description="List of messages to reflect on"
     )
+    thread_id: Optional[str] = Field(
+        default=None,
+        description="Open Canvas thread to read messages and artifact from, if they are not provided"
+    )
+    thread_ids: List[str] = Field(
+        default_factory=list,
+        description="Open Canvas threads to reflect on together, when reflections were coalesced"
+    )
     artifact: Optional[ArtifactV3] = Field(
         default=None,
         description="Artifact to reflect on"
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from agents.src import metrics
+
+DEFAULT_CACHE_PATH = ".oc_response_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_MEMORY_ENTRIES = 1000
+DEFAULT_MAX_PERSISTENT_ENTRIES = 20000
+
+# Expired and least recently used entries are evicted from SQLite once every
+# this many writes, so the table may briefly exceed its max size by this much
+EVICTION_INTERVAL_WRITES = 100
+
+# Serialized message fields that differ between otherwise identical prompts
+VOLATILE_MESSAGE_KEYS = frozenset({"id", "response_metadata", "usage_metadata"})
+
+def _hash_key(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _strip_volatile(item.strip() if isinstance(item, str) and key in ("content", "text") else item)
+            for key, item in value.items() if key not in VOLATILE_MESSAGE_KEYS
+        }
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value]
+    return value
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonicalize a serialized chat prompt.
+
+    Message IDs and metadata are removed, content is stripped of surrounding
+    whitespace and keys are sorted, so replays of the same conversation and
+    retried requests produce the same key.
+    """
+    try:
+        data = json.loads(prompt)
+    except ValueError:
+        return prompt.strip()
+    return json.dumps(_strip_volatile(data), sort_keys=True, separators=(",", ":"))
+
+class ResponseCache(BaseCache):
+    """A two-tier LangChain cache for model responses.
+
+    Responses are kept in a bounded in-memory LRU, backed by a local SQLite
+    table so they survive restarts. Entries expire after `ttl_seconds`. Keys
+    cover the model, its parameters and bound tools (LangChain's `llm_string`)
+    and the prompt. Lookups try the exact prompt first, then its normalized
+    form (see `normalize_prompt`).
+
+    Models opt in by passing the cache to the chat model's `cache` parameter,
+    e.g. through `get_model_from_config(config, {"cache": True})`. The async
+    methods check the memory tier inline, and run SQLite reads and writes in
+    a thread.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+        max_persistent_entries: int = DEFAULT_MAX_PERSISTENT_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_persistent_entries = max_persistent_entries
+        self._memory: "OrderedDict[str, Tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+
+        # Set `path` to None to only cache in memory
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _memory_get(self, key: str, now: float) -> Optional[RETURN_VAL_TYPE]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: RETURN_VAL_TYPE, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup_memory(self, prompt: str, llm_string: str, now: float) -> Tuple[Optional[RETURN_VAL_TYPE], str, str]:
+        # Returns the cached value, if any, with the exact and normalized keys
+        exact_key = _hash_key(llm_string, prompt)
+        with self._lock:
+            value = self._memory_get(exact_key, now)
+            if value is not None:
+                return value, exact_key, ""
+
+            normalized_key = _hash_key(llm_string, normalize_prompt(prompt))
+            value = self._memory_get(normalized_key, now)
+            if value is not None:
+                self._memory_put(exact_key, value, now + self.ttl_seconds)
+            return value, exact_key, normalized_key
+
+    def _lookup_persistent(self, exact_key: str, normalized_key: str, now: float) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (normalized_key,)
+            ).fetchone()
+            if not row or row[1] <= now:
+                return None
+            value = loads(row[0])
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, normalized_key)
+            )
+            self._memory_put(exact_key, value, row[1])
+            self._memory_put(normalized_key, value, row[1])
+            return value
+
+    def _record_lookup(self, value: Optional[RETURN_VAL_TYPE], tier: str) -> Optional[RETURN_VAL_TYPE]:
+        metrics.increment(f"response_cache.hits.{tier}" if value is not None else "response_cache.misses")
+        return value
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        now = time.time()
+        value, exact_key, normalized_key = self._lookup_memory(prompt, llm_string, now)
+        if value is not None or self._conn is None:
+            return self._record_lookup(value, "memory")
+        return self._record_lookup(self._lookup_persistent(exact_key, normalized_key, now), "persistent")
+
+    def _update_memory(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE, expires_at: float) -> str:
+        normalized_key = _hash_key(llm_string, normalize_prompt(prompt))
+        with self._lock:
+            self._memory_put(_hash_key(llm_string, prompt), return_val, expires_at)
+            self._memory_put(normalized_key, return_val, expires_at)
+        return normalized_key
+
+    def _update_persistent(self, normalized_key: str, return_val: RETURN_VAL_TYPE, expires_at: float, now: float) -> None:
+        value = dumps(return_val)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (normalized_key, value, expires_at, now)
+            )
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= EVICTION_INTERVAL_WRITES:
+                self._writes_since_eviction = 0
+                self._evict(now)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        normalized_key = self._update_memory(prompt, llm_string, return_val, expires_at)
+        if self._conn is not None:
+            self._update_persistent(normalized_key, return_val, expires_at, now)
+
+    def _evict(self, now: float) -> None:
+        # Must be called with `self._lock` held
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_persistent_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_persistent_entries,)
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        now = time.time()
+        value, exact_key, normalized_key = self._lookup_memory(prompt, llm_string, now)
+        if value is not None or self._conn is None:
+            return self._record_lookup(value, "memory")
+        value = await asyncio.to_thread(self._lookup_persistent, exact_key, normalized_key, now)
+        return self._record_lookup(value, "persistent")
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        normalized_key = self._update_memory(prompt, llm_string, return_val, expires_at)
+        if self._conn is not None:
+            await asyncio.to_thread(self._update_persistent, normalized_key, return_val, expires_at, now)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear, **kwargs)
+
+_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache, configured from the environment."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(
+            path=os.getenv("OC_RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+            ttl_seconds=float(os.getenv("OC_RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            max_memory_entries=int(os.getenv("OC_RESPONSE_CACHE_MAX_MEMORY_ENTRIES", DEFAULT_MAX_MEMORY_ENTRIES)),
+            max_persistent_entries=int(os.getenv("OC_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_PERSISTENT_ENTRIES))
+        )
+    return _cache
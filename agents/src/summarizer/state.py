@@ -7,11 +7,11 @@ class SummarizerGraphState(BaseModel):
     
     messages: List[BaseMessage] = Field(
         default_factory=list,
-        description="List of messages to summarize"
+        description="List of messages to summarize. Read from the original thread if empty."
     )
     thread_id: str = Field(
         ...,
-        description="Original thread ID for state updates"
+        description="Original thread ID for state reads and updates"
     )
 
 SummarizeState = SummarizerGraphState
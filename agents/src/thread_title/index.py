@@ -1,45 +1,52 @@
-import os
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Optional
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START
-from langgraph_sdk import get_client
 from pydantic import BaseModel, Field
+from shared.src.types import ArtifactV3
 from shared.src.utils.artifacts import get_artifact_content, is_artifact_markdown_content
+from shared.src.utils.transcript import render_transcript
+from agents.src.utils import (
+    CONVERSATION_WINDOW_TOKEN_BUDGETS,
+    get_thread_values,
+    select_conversation_window,
+    update_thread
+)
+from agents.src.failover import invoke_with_failover
 from agents.src.thread_title.prompts import TITLE_SYSTEM_PROMPT, TITLE_USER_PROMPT
 import dotenv
 
 dotenv.load_dotenv()
 
+TITLE_MODEL_NAME = "gpt-4o-mini"
+
 
 class TitleGenerationState(BaseModel):
-    messages: list[BaseMessage] = Field(..., description="Chat history to generate title for")
+    messages: list[BaseMessage] = Field(default_factory=list, description="Chat history to generate title for. Read from the thread if empty.")
     artifact: Any = Field(None, description="Generated artifact if exists")
+    thread_id: Optional[str] = Field(None, description="Thread to generate title for")
 
 async def generate_title(
     state: TitleGenerationState,
-    config: Dict[str, Any]
+    config: RunnableConfig
 ) -> Dict[str, Any]:
-    thread_id = config.get("configurable", {}).get("open_canvas_thread_id")
+    thread_id = state.thread_id or config.get("configurable", {}).get("open_canvas_thread_id")
     if not thread_id:
         raise ValueError("open_canvas_thread_id not found in configurable")
 
-    # Initialize model with tool
-    model = ChatOpenAI(model="gpt-4o-mini", temperature=0).bind_tools(
-        [{
-            "name": "generate_title",
-            "description": "Generate a concise title for the conversation.",
-            "schema": {
-                "title": {"type": "string", "description": "The generated title for the conversation."}
-            }
-        }],
-        tool_choice="generate_title"
-    )
+    # Read the conversation from the thread instead of receiving a copy of it
+    messages, artifact = state.messages, state.artifact
+    if not messages:
+        values = await get_thread_values(config, thread_id)
+        messages = values.get("messages", [])
+        artifact = values.get("artifact")
+    if isinstance(artifact, dict):
+        artifact = ArtifactV3(**artifact)
 
     # Get artifact content
     artifact_content = None
-    if state.artifact:
-        current_artifact = get_artifact_content(state.artifact)
+    if artifact:
+        current_artifact = get_artifact_content(artifact)
         if is_artifact_markdown_content(current_artifact):
             artifact_content = current_artifact.full_markdown
         else:
@@ -47,32 +54,43 @@ async def generate_title(
 
     # Format prompts
     artifact_context = f"An artifact was generated during this conversation:\n\n{artifact_content}" if artifact_content else "No artifact was generated during this conversation."
-    conversation = "\n\n".join(
-        f"<{msg.type}>\n{msg.content}\n</{msg.type}>" for msg in state.messages
+    # Long conversations are windowed like every other prompt
+    messages = select_conversation_window(
+        messages, CONVERSATION_WINDOW_TOKEN_BUDGETS["thread_title"], TITLE_MODEL_NAME
     )
+    conversation = render_transcript(messages, separator="\n\n")
     user_prompt = TITLE_USER_PROMPT.format(
         conversation=conversation,
         artifact_context=artifact_context
     )
 
     # Invoke model
-    response = await model.invoke([
-        {"role": "system", "content": TITLE_SYSTEM_PROMPT},
-        {"role": "user", "content": user_prompt}
-    ])
+    response = await invoke_with_failover(
+        {"configurable": {"custom_model_name": TITLE_MODEL_NAME}},
+        [
+            {"role": "system", "content": TITLE_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        extra={"temperature": 0, "cache": True},
+        bind=lambda model: model.bind_tools(
+            [{
+                "name": "generate_title",
+                "description": "Generate a concise title for the conversation.",
+                "schema": {
+                    "title": {"type": "string", "description": "The generated title for the conversation."}
+                }
+            }],
+            tool_choice="generate_title"
+        ),
+        hedge=True
+    )
 
     # Process response
     if not response.tool_calls:
         raise ValueError("Title generation tool call failed")
     title = response.tool_calls[0]["args"]["title"]
 
-    # Update thread metadata using langgraph_sdk
-    client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
-    await client.threads.update(thread_id, {
-        "metadata": {
-            "thread_title": title
-        }
-    })
+    await update_thread(config, thread_id, metadata={"thread_title": title})
 
     return {}
 
@@ -7,8 +7,12 @@ class TitleGenerationState(BaseModel):
     """State representation for Title Generation graph"""
     
     messages: List[BaseMessage] = Field(
-        ...,
-        description="The chat history to generate a title for"
+        default_factory=list,
+        description="The chat history to generate a title for. Read from the thread if empty."
+    )
+    thread_id: Optional[str] = Field(
+        default=None,
+        description="The thread to generate a title for"
     )
     artifact: Optional[ArtifactV3] = Field(
         default=None,
@@ -2,14 +2,21 @@ import os
 import uuid
 import json
 import base64
-from typing import Optional, List, Dict, Any, Union, TypedDict
+import time
+import asyncio
+import hashlib
+from typing import Optional, List, Dict, Any, Union, AsyncIterator, Awaitable, Callable, Hashable
 from pydantic import BaseModel
 from langchain_core.documents import Document
+from langchain_core.load import dumps
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, convert_to_messages
+from langchain_core.outputs import LLMResult
 from langchain_core.runnables import RunnableConfig
+from langgraph_sdk import get_client
 from supabase import create_client, Client
 from shared.src.types import (
     CustomModelConfig,
@@ -28,11 +35,76 @@ from shared.src.constants import (
 from shared.src.models import (
     TEMPERATURE_EXCLUDED_MODELS,
     LANGCHAIN_USER_ONLY_MODELS)
+from shared.src.utils.outline import format_artifact_outline, get_artifact_outline
+from shared.src.utils.relevance import LexicalIndex, get_lexical_index
+from shared.src.utils.transcript import render_transcript
+from shared.src.utils.tokens import (
+    count_messages_tokens,
+    count_text_tokens,
+    get_summarization_threshold
+)
+from shared.src.utils.prompt_budget import (
+    PromptBudgetResult,
+    PromptSegment,
+    fit_prompt_segments,
+    get_prompt_token_budget,
+    truncate_text_to_tokens
+)
+from agents.src.open_canvas.prompts import RELEVANT_REFLECTIONS_PROMPT
+from agents.src.open_canvas.state import is_summary_message
+from agents.src import metrics
+from agents.src.response_cache import get_response_cache, normalize_prompt
+from agents.src.rate_limits import (
+    DEFAULT_MAX_RETRIES,
+    get_rate_limiter,
+    get_retry_budget,
+    get_retry_delay,
+    get_token_rate_limit_handler,
+    is_retryable_error
+)
+from agents.src.loop_monitor import ensure_loop_monitor
+
+# Max style rules and max user facts included in a prompt when reflections
+# are selected by relevance to the current request
+DEFAULT_REFLECTIONS_TOP_K = 15
+
+# Token budget of conversation history included in each node's prompt.
+# Override per run with `configurable.conversation_window_tokens`, either a
+# number or a dict keyed by node name.
+CONVERSATION_WINDOW_TOKEN_BUDGETS = {
+    "generate_artifact": 16000,
+    "reply_to_general_input": 16000,
+    "generate_followup": 4000,
+    "reflection": 12000,
+    "thread_title": 2000,
+}
+DEFAULT_CONVERSATION_WINDOW_TOKENS = 8000
+
+# Tokens of artifact content included when a prompt only needs a preview of it
+SHORTENED_ARTIFACT_CONTENT_TOKENS = 150
 
+# Marks the end of a prompt prefix Anthropic should cache
+PROMPT_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Share of a conversation window reserved for the most recent turns. The rest
+# is filled with the older turns most relevant to the current request.
+CONVERSATION_WINDOW_TAIL_RATIO = 0.6
+
+
+def _parse_reflection_rules(rules: Union[str, List[str]], name: str) -> List[str]:
+    if isinstance(rules, list):
+        return rules
+    try:
+        return json.loads(rules)
+    except Exception as e:
+        print(f"Failed to parse {name}: {e}")
+        return []
 
 def format_reflections(
     reflections: Reflections,
-    extra: Optional[Dict[str, bool]] = None
+    extra: Optional[Dict[str, bool]] = None,
+    query: Optional[str] = None,
+    top_k: int = DEFAULT_REFLECTIONS_TOP_K
 ) -> str:
     """Format reflections into a string.
     
@@ -41,29 +113,24 @@ def format_reflections(
         extra: Optional settings for formatting
             only_style: Only include style guidelines
             only_content: Only include content
+        query: Optional text of the current request. If set, only the `top_k`
+            style rules and user facts most relevant to it are included.
+        top_k: Max style rules and max user facts to include when `query` is set
     """
     if extra and extra.get("only_style") and extra.get("only_content"):
         raise ValueError("Cannot specify both 'only_style' and 'only_content' as true")
 
     # Handle style rules
-    style_rules = reflections.get("style_rules", [])
-    style_rules_str = "No style guidelines found."
-    if not isinstance(style_rules, list):
-        try:
-            style_rules = json.loads(style_rules)
-            style_rules_str = "\n- ".join(style_rules)
-        except Exception as e:
-            print(f"Failed to parse style rules: {e}")
+    style_rules = _parse_reflection_rules(reflections.get("style_rules", []), "style rules")
+    if query:
+        style_rules = get_lexical_index(tuple(style_rules)).top_k(query, top_k)
+    style_rules_str = "\n- ".join(style_rules) if style_rules else "No style guidelines found."
 
     # Handle content rules
-    content_rules = reflections.get("content", [])
-    content_rules_str = "No memories/facts found."
-    if not isinstance(content_rules, list):
-        try:
-            content_rules = json.loads(content_rules)
-            content_rules_str = "\n- ".join(content_rules)
-        except Exception as e:
-            print(f"Failed to parse content rules: {e}")
+    content_rules = _parse_reflection_rules(reflections.get("content", []), "content rules")
+    if query:
+        content_rules = get_lexical_index(tuple(content_rules)).top_k(query, top_k)
+    content_rules_str = "\n- ".join(content_rules) if content_rules else "No memories/facts found."
 
     style_string = f"""The following is a list of style guidelines previously generated by you:
 <style-guidelines>
@@ -82,12 +149,257 @@ def format_reflections(
 
     return f"{style_string}\n\n{content_string}"
 
+def get_store_from_config(config: dict) -> Any:
+    """Get the store from config, if one is available.
+    
+    LangGraph passes the store to nodes in the runtime under `configurable`.
+    A store passed in the run config is moved under `configurable` as well.
+    
+    Args:
+        config: Configuration dictionary
+        
+    Returns:
+        Any: The store, or None
+    """
+    configurable = config.get('configurable', {})
+    runtime = configurable.get('__pregel_runtime')
+    for store in (config.get('store'), configurable.get('store'), getattr(runtime, 'store', None)):
+        if store is not None:
+            return store
+    return None
+
 def ensure_store_in_config(config: dict) -> Any:
-    if 'store' not in config:
+    store = get_store_from_config(config)
+    if store is None:
         raise ValueError("`store` not found in config")
-    return config['store']
+    return store
+
+class SingleFlight:
+    """Merges concurrent identical requests into a single in-flight call.
+    
+    Callers passing the same key while a call is in flight await that call
+    instead of starting their own. Calls and coalesced calls are counted in
+    the `singleflight.<name>.*` metrics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Futures belong to an event loop, so calls are only merged within one
+        key = (id(asyncio.get_running_loop()), key)
+        metrics.increment(f"singleflight.{self.name}.calls")
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            metrics.increment(f"singleflight.{self.name}.coalesced")
+            return await asyncio.shield(in_flight)
+
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        # Shielded, so a cancelled caller doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved, in case every caller was cancelled
+            task.exception()
+
+_store_flight = SingleFlight("store")
+_model_flight = SingleFlight("model")
+
+async def coalesced_store_get(store: Any, namespace: List[str], key: str) -> Optional[Dict[str, Any]]:
+    """Read an item from the store, sharing the read with identical in-flight reads.
+    
+    Returns:
+        Optional[Dict[str, Any]]: The item as a dict with its `value`, or None if not found
+    """
+    item = await _store_flight.do(
+        (id(store), tuple(namespace), key),
+        lambda: store.aget(tuple(namespace), key)
+    )
+    return item.dict() if item is not None else None
+
+async def ainvoke_model(
+    model: Any,
+    messages: Any,
+    config: Optional[Dict[str, Any]] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES
+) -> Any:
+    """Invoke a model, retrying rate limit, overload and connection errors.
+    
+    Retries back off with full jitter (or the provider's `retry-after`), and
+    are only made while the global retry budget allows, so a provider outage
+    doesn't turn every request into several. Always uses the model's async
+    API, so the event loop is never blocked on the network.
+    
+    Args:
+        model: The chat model or model with bound tools
+        messages: The prompt messages
+        config: Optional runnable config
+        max_retries: Max retries of this call
+        
+    Returns:
+        Any: The model response
+    """
+    ensure_loop_monitor()
+    retry_budget = get_retry_budget()
+    attempt = 0
+    while True:
+        try:
+            response = await model.ainvoke(messages, config)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e) or not await retry_budget.atry_spend():
+                raise
+            attempt += 1
+            metrics.increment("model_retries")
+            await asyncio.sleep(get_retry_delay(e, attempt))
+            continue
+        await retry_budget.arecord_success()
+        return response
+
+async def astream_model(
+    model: Any,
+    messages: Any,
+    config: Optional[Dict[str, Any]] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES
+) -> AsyncIterator[Any]:
+    """Stream a model's response chunks, retrying like `ainvoke_model`.
+    
+    Retries are only made until the first chunk is received. Chunks already
+    passed to the caller can't be taken back, so later errors are raised.
+    
+    Args:
+        model: The chat model or model with bound tools
+        messages: The prompt messages
+        config: Optional runnable config
+        max_retries: Max retries of this call
+        
+    Yields:
+        Any: The response chunks
+    """
+    ensure_loop_monitor()
+    retry_budget = get_retry_budget()
+    attempt = 0
+    while True:
+        received = False
+        try:
+            async for chunk in model.astream(messages, config):
+                received = True
+                yield chunk
+        except Exception as e:
+            if received or attempt >= max_retries or not is_retryable_error(e) or not await retry_budget.atry_spend():
+                raise
+            attempt += 1
+            metrics.increment("model_retries")
+            await asyncio.sleep(get_retry_delay(e, attempt))
+            continue
+        await retry_budget.arecord_success()
+        return
 
-async def get_formatted_reflections(config: dict) -> str:
+async def coalesced_invoke(model: Any, messages: List[Any], config: Optional[Dict[str, Any]] = None) -> Any:
+    """Invoke a model, sharing the call with identical in-flight calls.
+    
+    Calls are identical if the model, its parameters and bound tools, and the
+    normalized prompt (see `normalize_prompt`) match. Only use this for calls
+    whose response can be shared, e.g. routing and classification.
+    
+    Args:
+        model: The chat model or model with bound tools
+        messages: The prompt messages
+        config: Optional runnable config. Coalesced callers share the config
+            of the call that is in flight.
+        
+    Returns:
+        Any: The model response
+    """
+    messages = convert_to_messages(messages)
+    try:
+        key = hashlib.sha256(f"{dumps(model)}\x00{normalize_prompt(dumps(messages))}".encode("utf-8")).hexdigest()
+    except Exception:
+        # Not serializable, so identical calls can't be detected
+        return await ainvoke_model(model, messages, config)
+    return await _model_flight.do(key, lambda: ainvoke_model(model, messages, config))
+
+def get_singleflight_stats() -> Dict[str, Dict[str, float]]:
+    """Get call counts per singleflight group, including the share of calls coalesced."""
+    stats: Dict[str, Dict[str, float]] = {}
+    for name, value in metrics.get_metrics("singleflight.").items():
+        _, group, key = name.split(".", 2)
+        stats.setdefault(group, {})[key] = value
+    for group_stats in stats.values():
+        calls = group_stats.get("calls", 0)
+        group_stats["coalesced_ratio"] = group_stats.get("coalesced", 0) / calls if calls else 0.0
+    return stats
+
+async def prefetch(fetches: Dict[str, Awaitable[Any]], run_name: str) -> Dict[str, Any]:
+    """Run a node's independent fetches concurrently, e.g. store reads and model setup.
+    
+    The time of each fetch is recorded in the `prefetch.<run_name>.<fetch>.*`
+    metrics, and the time of the whole prefetch under the fetch name `total`
+    (see `get_prefetch_stats`). If a fetch fails, the others are cancelled.
+    
+    Args:
+        fetches: The awaitables to run, by name
+        run_name: Name of the node, for the metrics
+        
+    Returns:
+        Dict[str, Any]: The result of each fetch, by name
+    """
+    async def timed(name: str, awaitable: Awaitable[Any]) -> Any:
+        started = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            metrics.increment(f"prefetch.{run_name}.{name}.calls")
+            metrics.increment(f"prefetch.{run_name}.{name}.seconds", time.monotonic() - started)
+
+    tasks = {name: asyncio.ensure_future(timed(name, awaitable)) for name, awaitable in fetches.items()}
+    try:
+        await timed("total", asyncio.gather(*tasks.values()))
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+    return {name: task.result() for name, task in tasks.items()}
+
+def get_prefetch_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Get the call count and mean time of each fetch, by node."""
+    stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, value in metrics.get_metrics("prefetch.").items():
+        _, run_name, fetch, key = name.split(".", 3)
+        stats.setdefault(run_name, {}).setdefault(fetch, {})[key] = value
+    for run_stats in stats.values():
+        for fetch_stats in run_stats.values():
+            calls = fetch_stats.get("calls", 0)
+            fetch_stats["mean_seconds"] = fetch_stats.get("seconds", 0) / calls if calls else 0.0
+    return stats
+
+def get_reflections_query(messages: List[BaseMessage], artifact_content: Any = None) -> str:
+    """Build the text reflections are matched against for the current request.
+    
+    Args:
+        messages: The conversation. The most recent human message is used.
+        artifact_content: Optional current artifact content, whose type, language
+            and title are included
+        
+    Returns:
+        str: The query text
+    """
+    parts = []
+    recent_human = next((msg for msg in reversed(messages) if msg.type == "human"), None)
+    if recent_human:
+        parts.append(get_string_from_content(recent_human.content))
+    if artifact_content:
+        get_field = artifact_content.get if isinstance(artifact_content, dict) else (
+            lambda key: getattr(artifact_content, key, None)
+        )
+        parts.extend(str(get_field(key)) for key in ("type", "language", "title") if get_field(key))
+    return "\n".join(parts)
+
+async def get_formatted_reflections(config: dict, query: Optional[str] = None) -> str:
     store = ensure_store_in_config(config)
     assistant_id = config.get('configurable', {}).get('assistant_id')
     if not assistant_id:
@@ -96,30 +408,199 @@ async def get_formatted_reflections(config: dict) -> str:
     memory_namespace = ["memories", assistant_id]
     memory_key = "reflection"
     
-    memories = await store.get(memory_namespace, memory_key)
+    memories = await coalesced_store_get(store, memory_namespace, memory_key)
     if memories and 'value' in memories:
-        return format_reflections(memories['value'])
+        return format_reflections(memories['value'], query=query)
     return "No reflections found."
 
+def get_conversation_window_budget(config: dict, node_name: str, model_name: Optional[str]) -> int:
+    """Get the token budget of conversation history for a node.
+    
+    Args:
+        config: Configuration dictionary
+        node_name: One of `CONVERSATION_WINDOW_TOKEN_BUDGETS`
+        model_name: The model the history is sent to. The budget never exceeds
+            half of its summarization threshold.
+        
+    Returns:
+        int: The token budget
+    """
+    configured = config.get('configurable', {}).get('conversation_window_tokens')
+    if isinstance(configured, dict):
+        configured = configured.get(node_name)
+    budget = configured or CONVERSATION_WINDOW_TOKEN_BUDGETS.get(node_name, DEFAULT_CONVERSATION_WINDOW_TOKENS)
+    return min(int(budget), get_summarization_threshold(model_name) // 2)
+
+def _group_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    # A turn is a human message and every message after it, so selected
+    # history never contains a reply without the request it answers
+    turns: List[List[BaseMessage]] = []
+    for msg in messages:
+        if msg.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+def select_conversation_window(
+    messages: List[BaseMessage],
+    token_budget: int,
+    model_name: Optional[str] = None,
+    query: Optional[str] = None
+) -> List[BaseMessage]:
+    """Select the part of the conversation to send to a model.
+    
+    If the messages fit in `token_budget` they are returned unchanged.
+    Otherwise the window is the latest summary message, the most recent turns
+    (up to `CONVERSATION_WINDOW_TAIL_RATIO` of the budget, and always the
+    latest turn), then the older turns most relevant to `query` that still
+    fit. Turns are kept whole and returned in their original order.
+    
+    Args:
+        messages: The conversation, e.g. `_messages`
+        token_budget: Max tokens of the selected messages
+        model_name: Model name used to pick the tokenizer
+        query: Text older turns are ranked against. Defaults to the most
+            recent human message.
+        
+    Returns:
+        List[BaseMessage]: The selected messages
+    """
+    if count_messages_tokens(messages, model_name) <= token_budget:
+        return list(messages)
+
+    summary_idx = max((i for i, msg in enumerate(messages) if is_summary_message(msg)), default=-1)
+    summary = [messages[summary_idx]] if summary_idx >= 0 else []
+    turns = _group_turns([msg for msg in messages[summary_idx + 1:] if not is_summary_message(msg)])
+    if not turns:
+        return summary
+
+    remaining = token_budget - count_messages_tokens(summary, model_name)
+    turn_tokens = [count_messages_tokens(turn, model_name) for turn in turns]
+
+    # Recent turns
+    tail_start = len(turns) - 1
+    remaining -= turn_tokens[tail_start]
+    tail_budget = remaining - token_budget * (1 - CONVERSATION_WINDOW_TAIL_RATIO)
+    while tail_start > 0 and turn_tokens[tail_start - 1] <= tail_budget:
+        tail_start -= 1
+        tail_budget -= turn_tokens[tail_start]
+        remaining -= turn_tokens[tail_start]
+
+    # Relevant older turns
+    selected = set(range(tail_start, len(turns)))
+    older = [idx for idx in range(tail_start) if turn_tokens[idx] <= remaining]
+    if older:
+        query = query or get_reflections_query(messages)
+        index = LexicalIndex([
+            "\n".join(get_string_from_content(msg.content) for msg in turns[idx]) for idx in older
+        ])
+        scores = index.score(query)
+        for score, idx in sorted(zip(scores, older), key=lambda pair: (-pair[0], -pair[1])):
+            if score <= 0:
+                break
+            if turn_tokens[idx] <= remaining:
+                selected.add(idx)
+                remaining -= turn_tokens[idx]
+
+    return [*summary, *(msg for idx in sorted(selected) for msg in turns[idx])]
+
+def fit_prompt_to_model(
+    config: dict,
+    segments: List[PromptSegment],
+    fixed_texts: Optional[List[str]] = None,
+    messages: Optional[List[BaseMessage]] = None,
+    run_name: str = "model call"
+) -> PromptBudgetResult:
+    """Fit prompt segments to the context window of the configured model.
+    
+    Trimmed prompts are logged and counted in the `prompt_budget.*` metrics.
+    
+    Args:
+        config: Configuration dictionary
+        segments: The trimmable parts of the prompt
+        fixed_texts: Parts of the prompt that are never trimmed, e.g. the template
+        messages: The conversation sent with the prompt
+        run_name: Name of the model call, for logging
+        
+    Returns:
+        PromptBudgetResult: The fitted segments and what was trimmed or dropped
+    """
+    model_name = get_model_config(config).get("model_name")
+    fixed_tokens = sum(count_text_tokens(text, model_name) for text in fixed_texts or [])
+    fixed_tokens += count_messages_tokens(messages or [], model_name)
+    result = fit_prompt_segments(segments, get_prompt_token_budget(model_name), model_name, fixed_tokens)
+    if result.trimmed:
+        metrics.increment("prompt_budget.trimmed_prompts")
+        metrics.increment("prompt_budget.trimmed_tokens", sum(result.trimmed.values()))
+        print(
+            f"Prompt for {run_name} exceeded the {result.budget} token budget of {model_name}. "
+            f"Trimmed tokens: {result.trimmed}. Dropped: {result.dropped or 'none'}"
+        )
+    return result
+
+def get_context_document_segments(context_docs: List[Any], priority: int = 0) -> List[PromptSegment]:
+    """Get a prompt segment for each text context document."""
+    return [
+        PromptSegment(name=f"context_document_{idx}", text=doc, priority=priority)
+        for idx, doc in enumerate(context_docs) if isinstance(doc, str)
+    ]
+
+def get_fitted_context_documents(context_docs: List[Any], result: PromptBudgetResult) -> List[Any]:
+    """Replace text context documents with their fitted text, removing dropped ones."""
+    fitted = []
+    for idx, doc in enumerate(context_docs):
+        if isinstance(doc, str):
+            doc = result.texts.get(f"context_document_{idx}", doc)
+        if doc:
+            fitted.append(doc)
+    return fitted
+
+def get_artifact_text(content: Union[ArtifactMarkdownV3, ArtifactCodeV3]) -> str:
+    return content.code if isinstance(content, ArtifactCodeV3) else content.full_markdown
+
 def format_artifact_content(
     content: Union[ArtifactMarkdownV3, ArtifactCodeV3],
-    shorten_content: bool = False
+    shorten_content: bool = False,
+    max_tokens: Optional[int] = None,
+    model_name: Optional[str] = None,
+    outline: bool = False
 ) -> str:
-    if isinstance(content, ArtifactCodeV3):
-        artifact_content = content.code[:500] if shorten_content else content.code
-    else:
-        artifact_content = content.full_markdown[:500] if shorten_content else content.full_markdown
+    """Format artifact content for a prompt.
+    
+    Args:
+        content: The artifact content
+        shorten_content: Only include the first `SHORTENED_ARTIFACT_CONTENT_TOKENS` tokens
+        max_tokens: Optional max tokens of the content, e.g. from `fit_prompt_to_model`
+        model_name: Model name used to pick the tokenizer
+        outline: Include the cached outline of the content (see `get_artifact_outline`)
+            instead of the content, for prompts that only need to know what the artifact is
+    """
+    if outline:
+        return format_artifact_outline(get_artifact_outline(
+            content.title,
+            content.type,
+            get_artifact_text(content),
+            getattr(content, "language", None)
+        ))
+    if shorten_content:
+        max_tokens = min(max_tokens or SHORTENED_ARTIFACT_CONTENT_TOKENS, SHORTENED_ARTIFACT_CONTENT_TOKENS)
+    artifact_content = get_artifact_text(content)
+    if max_tokens is not None:
+        artifact_content = truncate_text_to_tokens(artifact_content, max_tokens, model_name)
     
     return f"Title: {content.title}\nArtifact type: {content.type}\nContent: {artifact_content}"
 
 def format_artifact_content_with_template(
     template: str,
     content: Union[ArtifactMarkdownV3, ArtifactCodeV3],
-    shorten_content: bool = False
+    shorten_content: bool = False,
+    max_tokens: Optional[int] = None,
+    model_name: Optional[str] = None,
+    outline: bool = False
 ) -> str:
     return template.replace(
         "{artifact}",
-        format_artifact_content(content, shorten_content)
+        format_artifact_content(content, shorten_content, max_tokens, model_name, outline)
     )
 
 def get_model_config(
@@ -227,15 +708,7 @@ async def create_context_document_messages(
     return messages
 
 def format_messages(messages: List[BaseMessage]) -> str:
-    formatted = []
-    for idx, msg in enumerate(messages):
-        msg_type = getattr(msg, "_getType", lambda: getattr(msg, "type", "unknown"))()
-        if isinstance(msg.content, str):
-            content = msg.content
-        else:
-            content = "\n".join([c.get("text", "") for c in msg.content if "text" in c])
-        formatted.append(f"<{msg_type} index=\"{idx}\">\n{content}\n</{msg_type}>")
-    return "\n".join(formatted)
+    return render_transcript(messages, "xml_indexed")
 
 def create_ai_message_from_web_results(web_results: List[SearchResult]) -> AIMessage:
     """Create an AI message from web search results."""
@@ -271,7 +744,14 @@ async def get_model_from_config(
     config: dict,
     extra: Optional[Dict[str, Any]] = None
 ) -> Any:
-    """Get a chat model instance based on configuration."""
+    """Get a chat model instance based on configuration.
+    
+    Set `extra["cache"]` to serve identical requests from the response cache.
+    
+    Requests and tokens are rate limited per provider and API key. The
+    provider SDKs don't retry; call the model with `ainvoke_model` to retry
+    within the global retry budget.
+    """
     model_config = get_model_config(config, {
         'is_tool_calling': extra.get('is_tool_calling') if extra else False
     })
@@ -280,6 +760,14 @@ async def get_model_from_config(
     model_provider = model_config.get('model_provider')
     azure_config = model_config.get('azure_config')
     api_key = model_config.get('api_key')
+    if model_provider == "azure_openai":
+        api_key = azure_config['azure_openai_api_key']
+    callbacks = [
+        PromptCacheUsageHandler(model_provider),
+        get_token_rate_limit_handler(model_provider, api_key, model_name)
+    ]
+    rate_limiter = get_rate_limiter(model_provider, api_key)
+    cache = get_response_cache() if extra and extra.get('cache') else None
 
     # Build model parameters based on provider
     if model_provider == "azure_openai":
@@ -289,18 +777,124 @@ async def get_model_from_config(
             azure_endpoint=azure_config['azure_openai_base_path'],
             openai_api_key=azure_config['azure_openai_api_key'],
             temperature=extra.get('temperature', 0.7) if extra else 0.7,
-            model_kwargs={"tool_choice": "auto"} if extra and extra.get('is_tool_calling') else {}
+            model_kwargs={"tool_choice": "auto"} if extra and extra.get('is_tool_calling') else {},
+            callbacks=callbacks,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            max_retries=0
         )
     elif model_provider == "openai":
         return ChatOpenAI(
             model_name=model_name,
             openai_api_key=api_key,
             temperature=extra.get('temperature', 0.7) if extra else 0.7,
-            model_kwargs={"tool_choice": "auto"} if extra and extra.get('is_tool_calling') else {}
+            model_kwargs={"tool_choice": "auto"} if extra and extra.get('is_tool_calling') else {},
+            callbacks=callbacks,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            max_retries=0
+        )
+    elif model_provider == "anthropic":
+        return ChatAnthropic(
+            model=model_name,
+            anthropic_api_key=api_key,
+            temperature=extra.get('temperature', 0.7) if extra else 0.7,
+            max_tokens=extra.get('max_tokens', 4096) if extra else 4096,
+            callbacks=callbacks,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            max_retries=0
         )
     else:
         raise ValueError(f"Unsupported model provider: {model_provider}")
 
+class PromptCacheUsageHandler(BaseCallbackHandler):
+    """Records the prompt cache usage providers report for each model call.
+    
+    Token counts are added to the `prompt_cache.<provider>.*` metrics. Read
+    them with `get_prompt_cache_stats`.
+    """
+
+    def __init__(self, model_provider: str):
+        self.model_provider = model_provider
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                details = usage.get("input_token_details") or {}
+                prefix = f"prompt_cache.{self.model_provider}"
+                metrics.increment(f"{prefix}.calls")
+                metrics.increment(f"{prefix}.input_tokens", usage.get("input_tokens", 0))
+                metrics.increment(f"{prefix}.cache_read_tokens", details.get("cache_read") or 0)
+                metrics.increment(f"{prefix}.cache_creation_tokens", details.get("cache_creation") or 0)
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Get prompt cache usage per provider, including the share of input tokens read from cache."""
+    stats: Dict[str, Dict[str, float]] = {}
+    for name, value in metrics.get_metrics("prompt_cache.").items():
+        _, provider, key = name.split(".", 2)
+        stats.setdefault(provider, {})[key] = value
+    for provider_stats in stats.values():
+        input_tokens = provider_stats.get("input_tokens", 0)
+        provider_stats["cache_hit_ratio"] = (
+            provider_stats.get("cache_read_tokens", 0) / input_tokens if input_tokens else 0.0
+        )
+    return stats
+
+def _with_cache_control(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    blocks = [{"type": "text", "text": content}] if isinstance(content, str) else [
+        dict(block) if isinstance(block, dict) else {"type": "text", "text": block}
+        for block in content
+    ]
+    if not blocks:
+        return message
+    blocks[-1] = {**blocks[-1], "cache_control": PROMPT_CACHE_CONTROL}
+    return message.model_copy(update={"content": blocks})
+
+def build_prompt_messages(
+    config: dict,
+    system_prompt: str,
+    context_docs: Optional[List[Any]] = None,
+    messages: Optional[List[Any]] = None,
+    reflections: Optional[str] = None
+) -> List[BaseMessage]:
+    """Assemble a model prompt so providers can cache its prefix.
+    
+    Blocks are ordered from most to least stable: the system prompt, then the
+    context documents, then the conversation, then the reflections selected
+    for the current request. OpenAI caches matching prefixes automatically.
+    For Anthropic models, cache breakpoints are set after the stable blocks
+    and on the last message of the conversation, so the next turn of the
+    conversation reads the whole previous prompt from cache.
+    
+    Args:
+        config: Configuration dictionary
+        system_prompt: The system prompt. Sent as a user message to o1-mini.
+            Its reflections should be `REFLECTIONS_AFTER_CONVERSATION`.
+        context_docs: Context document messages
+        messages: The conversation
+        reflections: Optional formatted reflections for the current request
+        
+    Returns:
+        List[BaseMessage]: The prompt messages
+    """
+    stable = convert_to_messages([
+        {"role": "user" if is_using_o1_mini_model(config) else "system", "content": system_prompt},
+        *(context_docs or [])
+    ])
+    conversation = convert_to_messages(messages or [])
+    if get_model_config(config).get("model_provider") == "anthropic":
+        stable[-1] = _with_cache_control(stable[-1])
+        if conversation:
+            conversation[-1] = _with_cache_control(conversation[-1])
+    if reflections:
+        conversation.append(HumanMessage(content=RELEVANT_REFLECTIONS_PROMPT.format(reflections=reflections)))
+    return [*stable, *conversation]
+
 def is_using_o1_mini_model(config: dict) -> bool:
     """Check if the model being used is o1-mini.
     
@@ -334,12 +928,123 @@ async def get_context_documents(config: dict) -> List[ContextDocument]:
     Returns:
         List[ContextDocument]: List of context documents or empty list
     """
-    store = config.get('store')
+    store = get_store_from_config(config)
     assistant_id = config.get('configurable', {}).get('assistant_id')
     
-    if not store or not assistant_id:
+    if store is None or not assistant_id:
         return []
 
-    result = await store.get(CONTEXT_DOCUMENTS_NAMESPACE, assistant_id)
+    result = await coalesced_store_get(store, CONTEXT_DOCUMENTS_NAMESPACE, assistant_id)
     return result.get('value', {}).get('documents', []) if result else []
 
+async def get_context_document_messages(config: dict) -> List[Any]:
+    """Get the assistant's context documents, converted for the configured model.
+    
+    Args:
+        config: Configuration dictionary containing store and assistant_id
+        
+    Returns:
+        List[Any]: The context document contents, for `build_prompt_messages`
+    """
+    documents = await get_context_documents(config)
+    if not documents:
+        return []
+    model_config = get_model_config(config)
+    return await create_context_document_messages(
+        documents,
+        model_config.get("model_provider"),
+        model_config.get("model_name")
+    )
+
+def get_checkpointer_from_config(config: dict) -> Any:
+    """Get the checkpointer from config, if one is available in this process.
+    
+    Args:
+        config: Configuration dictionary
+        
+    Returns:
+        Any: The checkpointer, or None
+    """
+    configurable = config.get('configurable', {})
+    # `__pregel_checkpointer` is where LangGraph passes the checkpointer to nodes
+    return (
+        config.get('checkpointer')
+        or configurable.get('checkpointer')
+        or configurable.get('__pregel_checkpointer')
+    )
+
+async def get_thread_values(
+    config: dict,
+    thread_id: str,
+    checkpoint_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Get the state values of an Open Canvas thread.
+    
+    Reads from the checkpointer when it is available in this process, and
+    falls back to the LangGraph API otherwise.
+    
+    Args:
+        config: Configuration dictionary
+        thread_id: The ID of the thread to read
+        checkpoint_id: Optional checkpoint to read instead of the latest
+        
+    Returns:
+        Dict[str, Any]: The thread's state values, or an empty dict if not found
+    """
+    checkpointer = get_checkpointer_from_config(config)
+    if checkpointer:
+        checkpoint_config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        if checkpoint_id:
+            checkpoint_config["configurable"]["checkpoint_id"] = checkpoint_id
+        checkpoint_tuple = await checkpointer.aget_tuple(checkpoint_config)
+        return dict(checkpoint_tuple.checkpoint["channel_values"]) if checkpoint_tuple else {}
+
+    client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+    if checkpoint_id:
+        thread_state = await client.threads.get_state(thread_id, checkpoint_id=checkpoint_id)
+    else:
+        thread_state = await client.threads.get_state(thread_id)
+    values = dict(thread_state.get("values") or {}) if thread_state else {}
+    for key in ("messages", "_messages"):
+        if values.get(key):
+            values[key] = convert_to_messages(values[key])
+    return values
+
+# Thread updates are applied as this node, which only leads to END, so they
+# don't schedule any node
+THREAD_UPDATE_AS_NODE = "cleanState"
+
+async def update_thread(
+    config: dict,
+    thread_id: str,
+    values: Optional[Dict[str, Any]] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> None:
+    """Update the state values or metadata of an Open Canvas thread.
+    
+    Writes through the checkpointer when it is available in this process, and
+    falls back to the LangGraph API otherwise. Values go through the state's
+    reducers. In this process, metadata is recorded on the new checkpoint.
+    
+    Args:
+        config: Configuration dictionary
+        thread_id: The ID of the thread to update
+        values: State values to write
+        metadata: Thread metadata to set
+    """
+    checkpointer = get_checkpointer_from_config(config)
+    if checkpointer:
+        # Imported here, as the Open Canvas graph imports this module
+        from agents.src.open_canvas.index import graph as open_canvas_graph
+        await open_canvas_graph.copy(update={"checkpointer": checkpointer}).aupdate_state(
+            {"configurable": {"thread_id": thread_id}, "metadata": metadata or {}},
+            values or {},
+            as_node=THREAD_UPDATE_AS_NODE
+        )
+        return
+
+    client = get_client(url=f"http://localhost:{os.getenv('PORT', '8000')}")
+    if values:
+        await client.threads.update_state(thread_id, values, as_node=THREAD_UPDATE_AS_NODE)
+    if metadata:
+        await client.threads.update(thread_id, metadata=metadata)
@@ -1,10 +1,12 @@
 from typing import Dict, Any
-from langchain_anthropic import ChatAnthropic
 from pydantic import BaseModel, Field
 from agents.src.web_search.state import WebSearchState
+from agents.src.failover import invoke_with_failover
 
 __all__ = ["classify_message"]
 
+CLASSIFIER_MODEL_NAME = "claude-3-5-sonnet-latest"
+
 CLASSIFIER_PROMPT = """You're a helpful AI assistant tasked with classifying the user's latest message.
 The user has enabled web search for their conversation, however not all messages should be searched.
 
@@ -30,14 +32,6 @@ async def classify_message(state: WebSearchState) -> Dict[str, Any]:
     Returns:
         Dict containing should_search boolean
     """
-    model = ChatAnthropic(
-        model="claude-3-5-sonnet-latest",
-        temperature=0
-    ).bind_tools(
-        [ClassificationSchema],
-        tool_choice={"type": "function", "function": {"name": "ClassificationSchema"}}
-    )
-
     # Get the latest message content
     latest_message = state.messages[-1].content
     if isinstance(latest_message, list):
@@ -47,7 +41,14 @@ async def classify_message(state: WebSearchState) -> Dict[str, Any]:
     formatted_prompt = CLASSIFIER_PROMPT.format(message=latest_message)
     
     # Get classification from model
-    response = await model.ainvoke([("user", formatted_prompt)])
+    # Classification is short and idempotent, so it may be hedged
+    response = await invoke_with_failover(
+        {"configurable": {"custom_model_name": CLASSIFIER_MODEL_NAME}},
+        [("user", formatted_prompt)],
+        extra={"temperature": 0},
+        bind=lambda model: model.bind_tools([ClassificationSchema], tool_choice="ClassificationSchema"),
+        hedge=True
+    )
     
     if not response.tool_calls:
         return {"should_search": False}
@@ -2,6 +2,7 @@ from typing import Dict, Any
 from langchain_anthropic import ChatAnthropic
 from datetime import datetime
 from agents.src.web_search.state import WebSearchState
+from agents.src.utils import ainvoke_model
 
 QUERY_GENERATOR_PROMPT = """You're a helpful AI assistant tasked with writing a query to search the web.
 You're provided with a list of messages between a user and an AI assistant.
@@ -42,6 +43,6 @@ async def query_generator(state: WebSearchState) -> Dict[str, Any]:
     )
     
     # Invoke model
-    response = await model.ainvoke([("user", prompt)])
+    response = await ainvoke_model(model, [("user", prompt)])
     
     return {"query": response.content} 
\ No newline at end of file
@@ -2,14 +2,26 @@ from typing import List, Dict, Any
 from shared.src.types import ProgrammingLanguageOptions
 
 OC_SUMMARIZED_MESSAGE_KEY = "__oc_summarized_message"
+OC_SUMMARY_WATERMARK_KEY = "__oc_summary_watermark"
 OC_HIDE_FROM_UI_KEY = "__oc_hide_from_ui"
 OC_WEB_SEARCH_RESULTS_MESSAGE_KEY = "__oc_web_search_results_message"
 
+# Name of the custom stream event carrying artifact text while it is generated
+OC_ARTIFACT_STREAM_EVENT = "oc_artifact_stream"
+# Name of the custom stream event carrying a reasoning model's thinking text
+OC_THINKING_STREAM_EVENT = "oc_thinking_stream"
+
 CONTEXT_DOCUMENTS_NAMESPACE = ["context_documents"]
 
+# Fraction of the active model's context window `_messages` may fill before
+# the summarizer is triggered (~75k tokens on a 128k window model).
+SUMMARIZATION_CONTEXT_RATIO = 0.6
+
 DEFAULT_INPUTS = {
     "highlighted_code": None,
     "highlighted_text": None,
+    "highlighted_codes": None,
+    "highlighted_texts": None,
     "next": None,
     "language": None,
     "artifact_length": None,
@@ -115,6 +115,8 @@ class GraphInput(BaseModel):
     messages: Optional[List[Dict[str, Any]]] = None
     highlighted_code: Optional[CodeHighlight] = None
     highlighted_text: Optional[TextHighlight] = None
+    highlighted_codes: Optional[List[CodeHighlight]] = None
+    highlighted_texts: Optional[List[TextHighlight]] = None
     artifact: Optional[ArtifactV3] = None
     next: Optional[str] = None
     language: Optional[LanguageOptions] = None
@@ -143,6 +145,30 @@ THINKING_MODELS = [
     "groq/deepseek-r1-distill-llama-70b"
 ]
 
+# Context window (input + output tokens) per model. Names are matched exactly
+# first, then by longest prefix, so dated snapshots resolve to their family.
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o1-mini": 128000,
+    "o3-mini": 200000,
+    "claude-3-5-sonnet": 200000,
+    "claude-3-5-haiku": 200000,
+    "claude-3-opus": 200000,
+    "claude-3-haiku": 200000,
+    "gemini-1.5-flash": 1048576,
+    "gemini-1.5-pro": 2097152,
+    "gemini-2.0-flash": 1048576,
+    "accounts/fireworks/models/llama-v3p3-70b-instruct": 131072,
+    "accounts/fireworks/models/deepseek-r1": 163840,
+    "groq/deepseek-r1-distill-llama-70b": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+
 # Model lists (simplified for brevity)
 OPENAI_MODELS = [
     ModelConfigurationParams(
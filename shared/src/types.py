@@ -1,4 +1,5 @@
-from typing import List, Literal, Optional, Union, Dict, Any, TypedDict
+from typing import List, Literal, Optional, Union, Dict, Any
+from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 from langchain_core.documents import Document
 
@@ -83,6 +84,9 @@ class TextHighlight(BaseModel):
     full_markdown: str
     markdown_block: str
     selected_text: str
+    # Offset of `markdown_block` in `full_markdown`, if the client knows it.
+    # Otherwise the block is searched for, in the order highlights are given.
+    block_start: Optional[int] = None
 
 class CustomQuickAction(BaseModel):
     id: str
@@ -130,6 +134,8 @@ class GraphInput(BaseModel):
     messages: Optional[List[Dict[str, Any]]] = None
     highlighted_code: Optional[CodeHighlight] = None
     highlighted_text: Optional[TextHighlight] = None
+    highlighted_codes: Optional[List[CodeHighlight]] = None
+    highlighted_texts: Optional[List[TextHighlight]] = None
     artifact: Optional[ArtifactV3] = None
     next: Optional[str] = None
     language: Optional[LanguageOptions] = None
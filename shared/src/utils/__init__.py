@@ -2,7 +2,38 @@ from .thinking import (
     extract_thinking_and_response_tokens,
     handle_rewrite_artifact_thinking,
     is_thinking_model,
-    ThinkingAndResponseTokens
+    ThinkingAndResponseTokens,
+    ThinkingMessageStream,
+    ThinkingStreamParser
+)
+from .edits import (
+    TextEdit,
+    apply_text_edits,
+    find_blocks,
+    merge_nested_ranges,
+    merge_overlapping_ranges
+)
+from .outline import (
+    ArtifactOutline,
+    format_artifact_outline,
+    get_artifact_outline
+)
+from .partial_json import PartialJsonObjectParser
+from .relevance import (
+    LexicalIndex,
+    dedupe_texts,
+    get_lexical_index
+)
+from .tokens import (
+    count_message_tokens,
+    count_messages_tokens,
+    count_text_tokens,
+    get_model_context_window,
+    get_summarization_threshold
+)
+from .transcript import (
+    render_message,
+    render_transcript
 )
 from .urls import extract_urls
 
@@ -11,5 +42,26 @@ __all__ = [
     "handle_rewrite_artifact_thinking",
     "is_thinking_model",
     "ThinkingAndResponseTokens",
+    "ThinkingMessageStream",
+    "ThinkingStreamParser",
+    "TextEdit",
+    "apply_text_edits",
+    "find_blocks",
+    "merge_nested_ranges",
+    "merge_overlapping_ranges",
+    "ArtifactOutline",
+    "format_artifact_outline",
+    "get_artifact_outline",
+    "PartialJsonObjectParser",
+    "LexicalIndex",
+    "dedupe_texts",
+    "get_lexical_index",
+    "count_message_tokens",
+    "count_messages_tokens",
+    "count_text_tokens",
+    "get_model_context_window",
+    "get_summarization_threshold",
+    "render_message",
+    "render_transcript",
     "extract_urls"
 ]
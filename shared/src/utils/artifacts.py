@@ -1,6 +1,12 @@
 from typing import Any, Dict, List, TypeVar, Union, Optional
 from shared.src.types import ArtifactCodeV3, ArtifactMarkdownV3, ArtifactV3, Artifact
 
+def _get_content_type(content: Any) -> Optional[str]:
+    # Artifact contents are models in graph state, and dicts when read over the API
+    if isinstance(content, dict):
+        return content.get("type")
+    return getattr(content, "type", None)
+
 def is_artifact_code_content(content: Any) -> bool:
     """
     Check if the content is of type ArtifactCodeV3.
@@ -11,11 +17,7 @@ def is_artifact_code_content(content: Any) -> bool:
     Returns:
         bool: True if content is ArtifactCodeV3, False otherwise
     """
-    return (
-        isinstance(content, dict) 
-        and "type" in content 
-        and content["type"] == "code"
-    )
+    return _get_content_type(content) == "code"
 
 def is_artifact_markdown_content(content: Any) -> bool:
     """
@@ -27,11 +29,7 @@ def is_artifact_markdown_content(content: Any) -> bool:
     Returns:
         bool: True if content is ArtifactMarkdownV3, False otherwise
     """
-    return (
-        isinstance(content, dict) 
-        and "type" in content 
-        and content["type"] == "text"
-    )
+    return _get_content_type(content) == "text"
 
 def is_deprecated_artifact_type(artifact: Any) -> bool:
     """
@@ -0,0 +1,142 @@
+from typing import List, Optional, Sequence, Tuple
+from pydantic import BaseModel, Field
+
+class TextEdit(BaseModel):
+    start: int = Field(..., description="Start offset of the replaced range in the original text")
+    end: int = Field(..., description="End offset (exclusive) of the replaced range in the original text")
+    text: str = Field(..., description="The replacement text")
+
+class TextRegion(BaseModel):
+    start: int
+    end: int
+    members: List[int] = Field(default_factory=list, description="Indexes of the ranges merged into this region")
+
+def merge_overlapping_ranges(ranges: List[Tuple[int, int]]) -> List[TextRegion]:
+    """
+    Merge overlapping ranges into regions that can be edited independently.
+
+    Ranges that overlap, or are identical empty ranges, conflict: editing
+    them separately would leave no single correct result, so they are merged
+    into one region covering all of them.
+
+    Args:
+        ranges: (start, end) offsets, end exclusive
+
+    Returns:
+        List[TextRegion]: Non-overlapping regions, in order of their start offset
+    """
+    regions: List[TextRegion] = []
+    for idx in sorted(range(len(ranges)), key=lambda i: ranges[i]):
+        start, end = ranges[idx]
+        last = regions[-1] if regions else None
+        if last and (start < last.end or (start == last.start and start == end)):
+            last.end = max(last.end, end)
+            last.members.append(idx)
+        else:
+            regions.append(TextRegion(start=start, end=end, members=[idx]))
+    return regions
+
+def merge_nested_ranges(ranges: List[Tuple[int, int]]) -> List[TextRegion]:
+    """
+    Merge highlighted ranges that nest in each other into the outermost range.
+
+    A range inside another, e.g. a selection inside a highlighted block, is
+    rewritten as part of the outer range. Ranges that only partially overlap
+    have no single range to rewrite, so they are rejected.
+
+    Args:
+        ranges: (start, end) offsets, end exclusive
+
+    Returns:
+        List[TextRegion]: Non-overlapping regions, each equal to one of the ranges
+
+    Raises:
+        ValueError: If two ranges partially overlap
+    """
+    regions = merge_overlapping_ranges(ranges)
+    for region in regions:
+        if (region.start, region.end) not in {ranges[i] for i in region.members}:
+            raise ValueError("Highlights partially overlap, highlight them separately")
+    return regions
+
+def find_blocks(text: str, blocks: Sequence[str], starts: Optional[Sequence[Optional[int]]] = None) -> List[Tuple[int, int]]:
+    """
+    Locate blocks of text, e.g. the markdown blocks of highlights, by offset.
+
+    A block with a known start offset is checked against the text at that
+    offset. Otherwise, it is searched for from the end of the previous block,
+    so blocks given in document order find their own occurrence of repeated
+    text, then from the start of the text. An occurrence already claimed by
+    another block isn't used again.
+
+    Args:
+        text: The text to search
+        blocks: The blocks to locate
+        starts: Known start offsets of the blocks, or None where unknown
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) offsets of each block, end exclusive
+
+    Raises:
+        ValueError: If a block is not found, or not at its given offset
+    """
+    ranges: List[Tuple[int, int]] = []
+    claimed = set()
+    search_from = 0
+    for idx, block in enumerate(blocks):
+        start = starts[idx] if starts else None
+        if start is not None:
+            if text[start:start + len(block)] != block:
+                raise ValueError(f"Block {idx} not found at offset {start}")
+        else:
+            start = _find_unclaimed(text, block, search_from, claimed)
+            if start == -1:
+                start = _find_unclaimed(text, block, 0, claimed)
+            if start == -1:
+                raise ValueError(f"Block {idx} not found in the text")
+        claimed.add((start, start + len(block)))
+        ranges.append((start, start + len(block)))
+        search_from = start + len(block)
+    return ranges
+
+def _find_unclaimed(text: str, block: str, position: int, claimed: set) -> int:
+    start = text.find(block, position)
+    while start != -1 and (start, start + len(block)) in claimed:
+        start = text.find(block, start + 1)
+    return start
+
+def _sort_edits(length: int, edits: List[TextEdit]) -> List[TextEdit]:
+    ordered = sorted(edits, key=lambda e: (e.start, e.end))
+    position = 0
+    for edit in ordered:
+        if edit.start < 0 or edit.end < edit.start or edit.end > length:
+            raise ValueError(f"Edit range {edit.start}-{edit.end} is outside of the text (length {length})")
+        if edit.start < position:
+            raise ValueError(f"Edit range {edit.start}-{edit.end} overlaps another edit ending at {position}")
+        position = edit.end
+    return ordered
+
+def apply_text_edits(text: str, edits: List[TextEdit]) -> str:
+    """
+    Apply edits to ranges of the original text in a single pass.
+
+    Offsets refer to the original text, so the edits don't shift each other.
+
+    Args:
+        text: The original text
+        edits: The edits to apply, in any order
+
+    Returns:
+        str: The edited text
+
+    Raises:
+        ValueError: If an edit is out of bounds, or edits overlap
+    """
+    parts: List[str] = []
+    position = 0
+    for edit in _sort_edits(len(text), edits):
+        parts.append(text[position:edit.start])
+        parts.append(edit.text)
+        position = edit.end
+    parts.append(text[position:])
+    return "".join(parts)
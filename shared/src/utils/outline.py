@@ -0,0 +1,132 @@
+import re
+from functools import lru_cache
+from typing import List, Optional
+from pydantic import BaseModel
+
+# Outlines list at most this many headings or symbols
+MAX_OUTLINE_ENTRIES = 40
+# Characters of the artifact's opening lines included in its outline
+OUTLINE_PREVIEW_CHARS = 200
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+# Definitions in the languages artifacts are written in, e.g. `class Foo`, `def foo`, `fn foo`
+_SYMBOL = re.compile(
+    r"^(?P<indent>\s*)(?:(?:export|public|private|protected|internal|static|abstract|final|async|pub(?:\([^)]*\))?|default)\s+)*"
+    r"(?P<kind>class|interface|struct|enum|trait|impl|type|def|fn|func|function|defn|defmacro|module|namespace|"
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:TABLE|VIEW|FUNCTION|PROCEDURE|INDEX))\b\s*(?:\([^)]*\)\s*)?\*?\s*(?P<name>[\w.$]+(?:::[\w$]+)*)",
+    re.IGNORECASE
+)
+_CONST_FUNCTION = re.compile(
+    r"^(?P<indent>\s*)(?:export\s+)?(?:const|let|var)\s+(?P<name>[\w$]+)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[\w$]+\s*=>)"
+)
+
+class ArtifactOutline(BaseModel):
+    title: str
+    type: str
+    language: Optional[str] = None
+    characters: int
+    lines: int
+    headings: List[str]
+    symbols: List[str]
+    preview: str
+
+def _limit(entries: List[str]) -> List[str]:
+    if len(entries) <= MAX_OUTLINE_ENTRIES:
+        return entries
+    return [*entries[:MAX_OUTLINE_ENTRIES], f"... and {len(entries) - MAX_OUTLINE_ENTRIES} more"]
+
+def _extract_headings(text: str) -> List[str]:
+    headings = []
+    in_fence = False
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            headings.append(f"{'  ' * (len(match.group(1)) - 1)}{match.group(2)}")
+    return headings
+
+def _extract_symbols(text: str) -> List[str]:
+    symbols = []
+    for line in text.splitlines():
+        match = _SYMBOL.match(line)
+        if match:
+            kind = " ".join(match.group("kind").split())
+            symbols.append(f"{match.group('indent').replace(chr(9), '    ')}{kind} {match.group('name')}")
+            continue
+        match = _CONST_FUNCTION.match(line)
+        if match:
+            symbols.append(f"{match.group('indent').replace(chr(9), '    ')}function {match.group('name')}")
+    return symbols
+
+@lru_cache(maxsize=256)
+def get_artifact_outline(
+    title: str,
+    artifact_type: str,
+    text: str,
+    language: Optional[str] = None
+) -> ArtifactOutline:
+    """
+    Get a compact outline of an artifact version: its size, headings and defined symbols.
+
+    Artifact versions are immutable, so the cache is keyed by the content
+    itself and each version is outlined once.
+
+    Args:
+        title: The artifact title
+        artifact_type: "text" or "code"
+        text: The markdown or code of the version
+        language: The programming language of code artifacts
+
+    Returns:
+        ArtifactOutline: The outline of the version
+
+    Example:
+        >>> outline = get_artifact_outline("Demo", "code", "class Foo:\\n    def bar(self):\\n        pass\\n", "python")
+        >>> outline.symbols
+        ['class Foo', '    def bar']
+    """
+    preview_lines = []
+    preview_length = 0
+    for line in text.splitlines():
+        if line.strip():
+            preview_lines.append(line.rstrip())
+            preview_length += len(line)
+        if preview_length >= OUTLINE_PREVIEW_CHARS or len(preview_lines) >= 3:
+            break
+    preview = "\n".join(preview_lines)
+    if len(preview) > OUTLINE_PREVIEW_CHARS:
+        preview = preview[:OUTLINE_PREVIEW_CHARS] + "..."
+
+    # Markdown can hold code blocks, but its outline is its headings
+    is_code = artifact_type == "code"
+    return ArtifactOutline(
+        title=title,
+        type=artifact_type,
+        language=language if is_code else None,
+        characters=len(text),
+        lines=len(text.splitlines()),
+        headings=_limit([] if is_code else _extract_headings(text)),
+        symbols=_limit(_extract_symbols(text) if is_code else []),
+        preview=preview
+    )
+
+def _format_entries(entries: List[str]) -> str:
+    # Nested entries are indented, so keep the indentation before the bullet
+    return "\n".join(f"{entry[:len(entry) - len(entry.lstrip())]}- {entry.lstrip()}" for entry in entries)
+
+def format_artifact_outline(outline: ArtifactOutline) -> str:
+    """Format an outline for a prompt."""
+    lines = [f"Title: {outline.title}", f"Artifact type: {outline.type}"]
+    if outline.language:
+        lines.append(f"Language: {outline.language}")
+    lines.append(f"Size: {outline.characters} characters, {outline.lines} lines")
+    if outline.headings:
+        lines.append("Headings:\n" + _format_entries(outline.headings))
+    if outline.symbols:
+        lines.append("Definitions:\n" + _format_entries(outline.symbols))
+    if outline.preview:
+        lines.append(f"Opening lines:\n{outline.preview}")
+    return "\n".join(lines)
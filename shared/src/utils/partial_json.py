@@ -0,0 +1,244 @@
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t"
+}
+
+# Parser states
+_START = "start"
+_KEY_OR_END = "key_or_end"
+_KEY = "key"
+_COLON = "colon"
+_VALUE = "value"
+_STRING_VALUE = "string_value"
+_SCALAR_VALUE = "scalar_value"
+_NESTED_VALUE = "nested_value"
+_AFTER_VALUE = "after_value"
+_DONE = "done"
+
+class PartialJsonObjectParser:
+    """
+    Incrementally parses a JSON object as it streams in, e.g. tool call arguments.
+
+    Each delta is only scanned once, so parsing a stream is linear in its
+    length rather than re-parsing the whole buffer on every delta. String
+    values are decoded as they arrive, so callers can show them before the
+    object is complete. Other values are set once they are complete.
+
+    Example:
+        >>> parser = PartialJsonObjectParser()
+        >>> parser.feed('{"title": "Hi", "artifact": "Hello wo')
+        {'title': 'Hi', 'artifact': 'Hello wo'}
+        >>> parser.feed('rld"}')
+        {'artifact': 'rld'}
+        >>> parser.values
+        {'title': 'Hi', 'artifact': 'Hello world'}
+    """
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self._state = _START
+        self._key: List[str] = []
+        self._current_key: Optional[str] = None
+        self._raw: List[str] = []
+        self._depth = 0
+        self._in_nested_string = False
+        # Escape sequence read so far, e.g. "\\u00", if a delta ended inside one
+        self._escape = ""
+        # High surrogate of a \\u escape pair, waiting for its low surrogate
+        self._high_surrogate = ""
+        self._position = 0
+
+    @property
+    def done(self) -> bool:
+        """Whether the closing brace of the object has been parsed."""
+        return self._state == _DONE
+
+    def feed(self, delta: str) -> Dict[str, str]:
+        """
+        Parse the next part of the object.
+
+        Args:
+            delta: The text following everything fed so far
+
+        Returns:
+            Dict[str, str]: The text appended to each string value by this delta, by key
+
+        Raises:
+            ValueError: If the text is not a valid JSON object
+        """
+        string_deltas: Dict[str, str] = {}
+        i = 0
+        while i < len(delta):
+            state = self._state
+            if state in (_KEY, _STRING_VALUE):
+                i, text, closed = self._read_string(delta, i)
+                if state == _KEY:
+                    self._key.append(text)
+                    if closed:
+                        self._current_key = "".join(self._key)
+                        self._key = []
+                        self._state = _COLON
+                else:
+                    if text:
+                        self.values[self._current_key] += text
+                        string_deltas[self._current_key] = string_deltas.get(self._current_key, "") + text
+                    if closed:
+                        self._state = _AFTER_VALUE
+                continue
+
+            char = delta[i]
+            i += 1
+            if state == _NESTED_VALUE:
+                self._read_nested(char)
+                continue
+            if state == _SCALAR_VALUE:
+                if char in ",}" or char.isspace():
+                    self._set_raw_value()
+                    self._state = _AFTER_VALUE
+                    self._after_value(char, i)
+                else:
+                    self._raw.append(char)
+                continue
+            if char.isspace():
+                continue
+
+            if state == _START:
+                self._expect(char, "{", i)
+                self._state = _KEY_OR_END
+            elif state == _KEY_OR_END:
+                if char == '"':
+                    self._state = _KEY
+                elif char == "}":
+                    self._state = _DONE
+                else:
+                    self._error(char, i)
+            elif state == _COLON:
+                self._expect(char, ":", i)
+                self._state = _VALUE
+            elif state == _VALUE:
+                if char == '"':
+                    self.values[self._current_key] = ""
+                    self._state = _STRING_VALUE
+                elif char in "{[":
+                    self._raw = [char]
+                    self._depth = 1
+                    self._state = _NESTED_VALUE
+                else:
+                    self._raw = [char]
+                    self._state = _SCALAR_VALUE
+            elif state == _AFTER_VALUE:
+                self._after_value(char, i)
+            else:
+                self._error(char, i)
+        self._position += len(delta)
+        return string_deltas
+
+    def _read_string(self, text: str, i: int):
+        # Returns the index after what was read, the decoded text, and whether the string closed
+        parts: List[str] = []
+        while i < len(text):
+            if self._escape:
+                self._escape += text[i]
+                i += 1
+                decoded = self._decode_escape(i)
+                if decoded is not None:
+                    parts.append(decoded)
+                continue
+            match = _STRING_SPECIAL.search(text, i)
+            end = match.start() if match else len(text)
+            if end > i or (match and match.group() == '"'):
+                parts.append(self._flush_surrogate())
+            parts.append(text[i:end])
+            if match is None:
+                return len(text), "".join(parts), False
+            i = match.end()
+            if match.group() == '"':
+                return i, "".join(parts), True
+            self._escape = "\\"
+        return i, "".join(parts), False
+
+    def _decode_escape(self, i: int) -> Optional[str]:
+        escape = self._escape
+        if escape[1] != "u":
+            if escape[1] not in _SIMPLE_ESCAPES:
+                self._error(escape, i)
+            self._escape = ""
+            return self._flush_surrogate() + _SIMPLE_ESCAPES[escape[1]]
+        if len(escape) < 6:
+            return None
+        self._escape = ""
+        try:
+            code_point = int(escape[2:], 16)
+        except ValueError:
+            self._error(escape, i)
+        if 0xD800 <= code_point <= 0xDBFF:
+            pending = self._flush_surrogate()
+            self._high_surrogate = chr(code_point)
+            return pending
+        if 0xDC00 <= code_point <= 0xDFFF and self._high_surrogate:
+            high = ord(self._high_surrogate)
+            self._high_surrogate = ""
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code_point - 0xDC00))
+        return self._flush_surrogate() + chr(code_point)
+
+    def _flush_surrogate(self) -> str:
+        # An unpaired high surrogate is kept as is, like `json.loads` does
+        pending, self._high_surrogate = self._high_surrogate, ""
+        return pending
+
+    def _read_nested(self, char: str) -> None:
+        self._raw.append(char)
+        if self._in_nested_string:
+            if self._escape:
+                self._escape = ""
+            elif char == "\\":
+                self._escape = "\\"
+            elif char == '"':
+                self._in_nested_string = False
+            return
+        if char == '"':
+            self._in_nested_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._set_raw_value()
+                self._state = _AFTER_VALUE
+
+    def _set_raw_value(self) -> None:
+        raw = "".join(self._raw)
+        self._raw = []
+        try:
+            self.values[self._current_key] = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON value for {self._current_key!r}: {e}") from e
+
+    def _after_value(self, char: str, i: int) -> None:
+        if char.isspace():
+            return
+        if char == ",":
+            self._current_key = None
+            self._state = _KEY_OR_END
+        elif char == "}":
+            self._state = _DONE
+        else:
+            self._error(char, i)
+
+    def _expect(self, char: str, expected: str, i: int) -> None:
+        if char != expected:
+            self._error(char, i)
+
+    def _error(self, text: str, i: int) -> None:
+        raise ValueError(f"Unexpected {text!r} at position {self._position + i - 1} of JSON object")
@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from shared.src.models import DEFAULT_MODEL_CONFIG
+from shared.src.utils.tokens import (
+    CHARS_PER_TOKEN,
+    _get_encoding,
+    count_text_tokens,
+    get_encoding_name,
+    get_model_context_window
+)
+
+# Tokens kept free for the model's response when none is configured
+DEFAULT_OUTPUT_TOKEN_RESERVE = DEFAULT_MODEL_CONFIG.max_tokens["current"]
+
+# Share of the context window the prompt may use. Leaves headroom for
+# providers whose tokenizer is only approximated locally.
+PROMPT_BUDGET_SAFETY_RATIO = 0.95
+
+TRUNCATION_MARKER = "\n... (truncated)"
+
+class PromptSegment(BaseModel):
+    name: str
+    text: str
+    priority: int = Field(0, description="Segments with the lowest priority are trimmed first")
+    min_tokens: int = Field(0, description="Tokens the segment is never trimmed below. 0 allows dropping it entirely.")
+    required: bool = Field(False, description="Never trim this segment, e.g. content the model must rewrite in full")
+
+class PromptBudgetResult(BaseModel):
+    texts: Dict[str, str] = Field(default_factory=dict, description="The fitted text of each segment, by name")
+    tokens: Dict[str, int] = Field(default_factory=dict, description="The token count of each fitted segment, by name")
+    budget: int
+    total_tokens: int = Field(..., description="Tokens of the fitted segments plus the fixed tokens")
+    trimmed: Dict[str, int] = Field(default_factory=dict, description="Tokens removed from each trimmed segment")
+    dropped: List[str] = Field(default_factory=list, description="Names of the segments removed entirely")
+
+def get_prompt_token_budget(model_name: Optional[str], output_tokens: Optional[int] = None) -> int:
+    """
+    Get the max prompt tokens for a model, from the model registry.
+
+    Args:
+        model_name: The name of the model
+        output_tokens: Tokens reserved for the response. Defaults to `DEFAULT_OUTPUT_TOKEN_RESERVE`.
+
+    Returns:
+        int: The prompt token budget
+    """
+    reserve = output_tokens if output_tokens is not None else DEFAULT_OUTPUT_TOKEN_RESERVE
+    return max(0, int(get_model_context_window(model_name) * PROMPT_BUDGET_SAFETY_RATIO) - reserve)
+
+def truncate_text_to_tokens(text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+    """
+    Truncate text to at most `max_tokens` tokens, keeping the beginning.
+
+    Args:
+        text: The text to truncate
+        max_tokens: Max tokens of the result, including the truncation marker
+        model_name: The name of the active model
+
+    Returns:
+        str: The text, with `TRUNCATION_MARKER` appended if it was truncated
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_text_tokens(text, model_name) <= max_tokens:
+        return text
+
+    keep = max(0, max_tokens - count_text_tokens(TRUNCATION_MARKER, model_name))
+    encoding = _get_encoding(get_encoding_name(model_name))
+    if encoding is None:
+        truncated = text[:keep * CHARS_PER_TOKEN]
+    else:
+        truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    return f"{truncated}{TRUNCATION_MARKER}"
+
+def fit_prompt_segments(
+    segments: List[PromptSegment],
+    budget: int,
+    model_name: Optional[str] = None,
+    fixed_tokens: int = 0
+) -> PromptBudgetResult:
+    """
+    Trim prompt segments so they fit in a token budget.
+
+    Segments are trimmed in order of ascending priority, each down to its
+    `min_tokens` (dropped if that is 0), until the prompt fits. Required
+    segments are never trimmed.
+
+    Args:
+        segments: The prompt segments
+        budget: Max tokens of the whole prompt
+        model_name: The name of the active model
+        fixed_tokens: Tokens of the parts of the prompt that are not segments,
+            e.g. the template and the conversation
+
+    Returns:
+        PromptBudgetResult: The fitted texts and what was trimmed or dropped
+
+    Raises:
+        ValueError: If the prompt does not fit even after trimming every segment
+    """
+    tokens = {segment.name: count_text_tokens(segment.text, model_name) for segment in segments}
+    texts = {segment.name: segment.text for segment in segments}
+    total = fixed_tokens + sum(tokens.values())
+    trimmed: Dict[str, int] = {}
+    dropped: List[str] = []
+
+    # Stable sort, so later segments are trimmed first among equal priorities
+    for segment in sorted(reversed(segments), key=lambda s: s.priority):
+        if total <= budget:
+            break
+        if segment.required or tokens[segment.name] <= segment.min_tokens:
+            continue
+
+        target = max(segment.min_tokens, tokens[segment.name] - (total - budget))
+        texts[segment.name] = truncate_text_to_tokens(segment.text, target, model_name)
+        new_tokens = count_text_tokens(texts[segment.name], model_name)
+        trimmed[segment.name] = tokens[segment.name] - new_tokens
+        total -= trimmed[segment.name]
+        tokens[segment.name] = new_tokens
+        if not texts[segment.name]:
+            dropped.append(segment.name)
+
+    if total > budget:
+        raise ValueError(f"Prompt needs {total} tokens after trimming, but the model allows {budget}")
+
+    return PromptBudgetResult(
+        texts=texts,
+        tokens=tokens,
+        budget=budget,
+        total_tokens=total,
+        trimmed=trimmed,
+        dropped=dropped
+    )
@@ -0,0 +1,123 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has",
+    "have", "i", "if", "in", "into", "is", "it", "its", "me", "my", "not", "of",
+    "on", "or", "so", "than", "that", "the", "their", "them", "they", "this",
+    "to", "was", "we", "were", "what", "when", "which", "will", "with", "you",
+    "your", "user", "users", "should", "always", "never", "do", "does"
+})
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _stem(token: str) -> str:
+    # Light plural folding, so "emails" matches "email"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens, dropping stopwords.
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        List of tokens
+    """
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+class LexicalIndex:
+    """
+    A BM25 index over a small, fixed list of documents.
+
+    Documents are tokenized once when the index is built, so scoring a query
+    only tokenizes the query.
+    """
+
+    def __init__(self, documents: Sequence[str]):
+        self.documents = list(documents)
+        self._term_freqs: List[Counter] = [Counter(tokenize(doc)) for doc in self.documents]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+        doc_freqs: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        num_docs = len(self.documents)
+        self._idf: Dict[str, float] = {
+            term: math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def score(self, query: str) -> List[float]:
+        """Score every document against the query."""
+        query_terms = set(tokenize(query))
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length) if self._avg_length else BM25_K1
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[str]:
+        """
+        Get the `k` documents most relevant to the query.
+
+        Documents are returned in their original order, so the relative order
+        of the selected entries is preserved. Ties keep earlier documents.
+        """
+        if len(self.documents) <= k:
+            return list(self.documents)
+        scores = self.score(query)
+        ranked = sorted(range(len(self.documents)), key=lambda idx: (-scores[idx], idx))
+        return [self.documents[idx] for idx in sorted(ranked[:k])]
+
+@lru_cache(maxsize=512)
+def get_lexical_index(documents: Tuple[str, ...]) -> LexicalIndex:
+    """
+    Get a cached index over a list of documents.
+
+    The cache is keyed by the documents themselves, so each assistant's
+    reflection lists are indexed once and re-indexed only when they change.
+    """
+    return LexicalIndex(documents)
+
+def is_near_duplicate(a: str, b: str, threshold: float = 0.8) -> bool:
+    """Check if two texts share at least `threshold` of their tokens (Jaccard similarity)."""
+    tokens_a, tokens_b = set(tokenize(a)), set(tokenize(b))
+    if not tokens_a or not tokens_b:
+        return a.strip().lower() == b.strip().lower()
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b) >= threshold
+
+def dedupe_texts(texts: Sequence[str], threshold: float = 0.8) -> List[str]:
+    """
+    Remove near-identical texts, keeping the first occurrence.
+
+    Args:
+        texts: The texts to deduplicate
+        threshold: Jaccard similarity above which two texts are duplicates
+
+    Returns:
+        List of texts without near-duplicates
+    """
+    kept: List[str] = []
+    for text in texts:
+        if not any(is_near_duplicate(text, existing, threshold) for existing in kept):
+            kept.append(text)
+    return kept
@@ -42,6 +42,168 @@ def extract_thinking_and_response_tokens(text: str) -> ThinkingAndResponseTokens
     response = (text[:start_idx] + after_start[end_idx + len(think_end_tag):]).strip()
     return ThinkingAndResponseTokens(thinking=thinking, response=response)
 
+THINK_START_TAG = "<think>"
+THINK_END_TAG = "</think>"
+
+# Parser states
+_BEFORE_THINKING = "before_thinking"
+_THINKING = "thinking"
+_AFTER_THINKING = "after_thinking"
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    # Length of the longest suffix of `text` that could be the start of `tag`
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+class _StrippedText:
+    """Accumulates streamed text as if it were stripped of surrounding whitespace.
+
+    Leading whitespace is dropped, and trailing whitespace is held back until
+    more text follows it, so the emitted deltas join to `text.strip()`.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self._held = ""
+
+    def add(self, text: str) -> str:
+        if not self.parts and not self._held:
+            text = text.lstrip()
+        body = text.rstrip()
+        if not body:
+            if self.parts:
+                self._held += text
+            return ""
+        delta = self._held + body
+        self._held = text[len(body):]
+        self.parts.append(delta)
+        return delta
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+class ThinkingStreamParser:
+    """
+    Incrementally separates thinking and response text as a model streams.
+
+    Consumes chunks as they arrive and emits the new thinking and response
+    text of each, so streaming stays linear in the length of the output.
+    Tags split across chunks are held back until they can be told apart from
+    content. The accumulated result matches `extract_thinking_and_response_tokens`
+    of the full text.
+
+    Example:
+        >>> parser = ThinkingStreamParser()
+        >>> parser.feed("Hello <thi")
+        ThinkingAndResponseTokens(thinking='', response='Hello')
+        >>> parser.feed("nk>processing...</think> world")
+        ThinkingAndResponseTokens(thinking='processing...', response='  world')
+    """
+
+    def __init__(self):
+        self._state = _BEFORE_THINKING
+        self._pending = ""
+        self._thinking = _StrippedText()
+        self._response = _StrippedText()
+
+    @property
+    def thinking(self) -> str:
+        """The thinking text so far."""
+        return self._thinking.text
+
+    @property
+    def response(self) -> str:
+        """The response text so far."""
+        return self._response.text
+
+    def feed(self, chunk: str) -> ThinkingAndResponseTokens:
+        """
+        Parse the next chunk of the stream.
+
+        Args:
+            chunk: The text following everything fed so far
+
+        Returns:
+            ThinkingAndResponseTokens: The thinking and response text added by this chunk
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        thinking_delta = ""
+        response_delta = ""
+
+        if self._state == _BEFORE_THINKING:
+            start_idx = text.find(THINK_START_TAG)
+            if start_idx == -1:
+                keep = _partial_tag_length(text, THINK_START_TAG)
+                self._pending = text[len(text) - keep:]
+                return ThinkingAndResponseTokens(thinking="", response=self._response.add(text[:len(text) - keep]))
+            response_delta = self._response.add(text[:start_idx])
+            text = text[start_idx + len(THINK_START_TAG):]
+            self._state = _THINKING
+
+        if self._state == _THINKING:
+            end_idx = text.find(THINK_END_TAG)
+            if end_idx == -1:
+                keep = _partial_tag_length(text, THINK_END_TAG)
+                self._pending = text[len(text) - keep:]
+                thinking_delta = self._thinking.add(text[:len(text) - keep])
+                return ThinkingAndResponseTokens(thinking=thinking_delta, response=response_delta)
+            thinking_delta = self._thinking.add(text[:end_idx])
+            text = text[end_idx + len(THINK_END_TAG):]
+            self._state = _AFTER_THINKING
+
+        response_delta += self._response.add(text)
+        return ThinkingAndResponseTokens(thinking=thinking_delta, response=response_delta)
+
+    def finish(self) -> ThinkingAndResponseTokens:
+        """
+        End the stream, emitting any text held back as a possible partial tag.
+
+        Returns:
+            ThinkingAndResponseTokens: The remaining thinking and response text
+        """
+        pending, self._pending = self._pending, ""
+        if self._state == _THINKING:
+            return ThinkingAndResponseTokens(thinking=self._thinking.add(pending), response="")
+        return ThinkingAndResponseTokens(thinking="", response=self._response.add(pending))
+
+class ThinkingMessageStream:
+    """
+    Streams a response into a thinking message kept in a message list.
+
+    The message list is copied once, and messages are indexed by ID, so the
+    thinking message is inserted or replaced in place instead of searching
+    and copying the list on every chunk.
+    """
+
+    def __init__(self, messages: List[BaseMessage], thinking_id: str):
+        self.thinking_id = thinking_id
+        self.parser = ThinkingStreamParser()
+        self._messages = list(messages)
+        self._positions: Dict[str, int] = {msg.id: idx for idx, msg in enumerate(self._messages) if msg.id}
+
+    def feed(self, chunk: str) -> ThinkingAndResponseTokens:
+        return self.parser.feed(chunk)
+
+    def finish(self) -> ThinkingAndResponseTokens:
+        return self.parser.finish()
+
+    def get_messages(self) -> List[BaseMessage]:
+        """Get the messages, with the thinking message updated to the thinking text so far."""
+        thinking = self.parser.thinking
+        if thinking:
+            message = AIMessage(id=self.thinking_id, content=thinking)
+            position = self._positions.get(self.thinking_id)
+            if position is None:
+                self._positions[self.thinking_id] = len(self._messages)
+                self._messages.append(message)
+            else:
+                self._messages[position] = message
+        return self._messages
+
 class HandleRewriteParams(BaseModel):
     new_content: str
     messages: List[BaseMessage]
@@ -51,31 +213,16 @@ def handle_rewrite_artifact_thinking(params: HandleRewriteParams) -> Tuple[str,
     """
     Processes thinking tokens in artifact content and updates messages.
 
+    For content that is still streaming, use `ThinkingMessageStream` instead,
+    which doesn't rescan the content or copy the messages for every chunk.
+
     Returns:
         Tuple of (cleaned response content, updated messages list)
     """
-    extracted = extract_thinking_and_response_tokens(params.new_content)
-    new_messages = params.messages.copy()
-
-    if extracted.thinking:
-        # Update or create thinking message
-        updated = False
-        for i, msg in enumerate(new_messages):
-            if msg.id == params.thinking_id:
-                new_messages[i] = AIMessage(
-                    id=params.thinking_id,
-                    content=extracted.thinking
-                )
-                updated = True
-                break
-        
-        if not updated:
-            new_messages.append(AIMessage(
-                id=params.thinking_id,
-                content=extracted.thinking
-            ))
-
-    return extracted.response, new_messages
+    stream = ThinkingMessageStream(params.messages, params.thinking_id)
+    stream.feed(params.new_content)
+    stream.finish()
+    return stream.parser.response, stream.get_messages()
 
 def is_thinking_model(model_name: str) -> bool:
     """Check if model is configured for thinking output"""
@@ -0,0 +1,130 @@
+import math
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from shared.src.constants import SUMMARIZATION_CONTEXT_RATIO
+from shared.src.models import MODEL_CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken ships with langchain-openai
+    tiktoken = None
+
+# Used when no tokenizer can be loaded for a model family
+CHARS_PER_TOKEN = 4
+
+# Tokens spent on the role and separators wrapped around every chat message
+MESSAGE_TOKEN_OVERHEAD = 4
+
+MAX_CACHED_MESSAGE_COUNTS = 50000
+
+_message_token_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+
+def get_encoding_name(model_name: Optional[str]) -> str:
+    """
+    Get the tokenizer encoding used for a model family.
+
+    OpenAI models use their published encodings. Other providers do not ship a
+    local tokenizer, so `cl100k_base` is used as the closest approximation.
+
+    Args:
+        model_name: The name of the active model
+
+    Returns:
+        str: The tiktoken encoding name
+    """
+    name = (model_name or "").lower().replace("azure/", "")
+    if name.startswith(("gpt-4o", "o1", "o3")):
+        return "o200k_base"
+    return "cl100k_base"
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str) -> Any:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # e.g. the BPE file cannot be downloaded in an offline deployment
+        print(f"Failed to load tokenizer {encoding_name}, falling back to character estimate: {e}")
+        return None
+
+def count_text_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """
+    Count the tokens in a string using the tokenizer for the model family.
+
+    Args:
+        text: The text to count
+        model_name: The name of the active model
+
+    Returns:
+        int: Number of tokens in the text
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(get_encoding_name(model_name))
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _get_message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "\n".join(c.get("text", "") for c in content if isinstance(c, dict) and "text" in c)
+
+def count_message_tokens(message: BaseMessage, model_name: Optional[str] = None) -> int:
+    """
+    Count the tokens in a single message. Counts are cached by message ID and
+    encoding, so each message is only tokenized once.
+
+    Args:
+        message: The message to count
+        model_name: The name of the active model
+
+    Returns:
+        int: Number of tokens in the message, including per-message overhead
+    """
+    message_id = getattr(message, "id", None)
+    if not message_id:
+        return count_text_tokens(_get_message_text(message), model_name) + MESSAGE_TOKEN_OVERHEAD
+
+    key = (message_id, get_encoding_name(model_name))
+    cached = _message_token_cache.get(key)
+    if cached is not None:
+        _message_token_cache.move_to_end(key)
+        return cached
+
+    count = count_text_tokens(_get_message_text(message), model_name) + MESSAGE_TOKEN_OVERHEAD
+    _message_token_cache[key] = count
+    if len(_message_token_cache) > MAX_CACHED_MESSAGE_COUNTS:
+        _message_token_cache.popitem(last=False)
+    return count
+
+def count_messages_tokens(messages: Iterable[BaseMessage], model_name: Optional[str] = None) -> int:
+    """Count the tokens in a list of messages."""
+    return sum(count_message_tokens(msg, model_name) for msg in messages)
+
+def get_model_context_window(model_name: Optional[str]) -> int:
+    """
+    Get the context window of a model from the model registry.
+
+    Args:
+        model_name: The name of the model. Azure names may include the `azure/` prefix.
+
+    Returns:
+        int: The context window in tokens
+    """
+    name = (model_name or "").replace("azure/", "")
+    if name in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[name]
+
+    matches = [key for key in MODEL_CONTEXT_WINDOWS if name.startswith(key)]
+    if matches:
+        return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+    return DEFAULT_CONTEXT_WINDOW
+
+def get_summarization_threshold(model_name: Optional[str]) -> int:
+    """Get the `_messages` token count above which the summarizer should run."""
+    return int(get_model_context_window(model_name) * SUMMARIZATION_CONTEXT_RATIO)
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage
+
+# How a single message is rendered into a prompt transcript
+TRANSCRIPT_FORMATS = {
+    "xml": "<{type}>\n{content}\n</{type}>",
+    "xml_indexed": "<{type} index=\"{index}\">\n{content}\n</{type}>",
+    "plain": "{type}: {content}",
+}
+
+MAX_CACHED_FRAGMENTS = 50000
+MAX_CACHED_TRANSCRIPTS = 1000
+
+# A message is identified by its ID, type and a hash of its text, so a message
+# edited under the same ID is rendered again
+MessageKey = Tuple[str, str, int]
+
+_fragment_cache: "OrderedDict[Tuple[MessageKey, str, int], str]" = OrderedDict()
+
+# Keyed by (format, separator, first message ID). Each entry holds the keys of
+# the messages rendered, and the rendered transcript.
+_transcript_cache: "OrderedDict[Tuple[str, str, str], Tuple[Tuple[MessageKey, ...], str]]" = OrderedDict()
+
+def get_message_text(message: BaseMessage) -> str:
+    """Get the text of a message, joining the text parts of list content."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "\n".join(c.get("text", "") for c in content if isinstance(c, dict) and "text" in c)
+
+def get_message_key(message: BaseMessage) -> Optional[MessageKey]:
+    """Get the cache key of a message, or None if it has no ID."""
+    message_id = getattr(message, "id", None)
+    if not message_id:
+        return None
+    # `str` caches its hash, so this is cheap for content that did not change
+    return (message_id, message.type, hash(get_message_text(message)))
+
+def render_message(message: BaseMessage, fmt: str = "xml", index: int = 0) -> str:
+    """
+    Render a message into a transcript fragment. Fragments are cached by
+    message ID and content, so each message is only rendered once per format.
+
+    Args:
+        message: The message to render
+        fmt: One of `TRANSCRIPT_FORMATS`
+        index: Position of the message in the transcript, for indexed formats
+
+    Returns:
+        str: The rendered fragment
+    """
+    message_key = get_message_key(message)
+    # Only indexed formats depend on the position
+    key = (message_key, fmt, index if "{index}" in TRANSCRIPT_FORMATS[fmt] else 0)
+    if message_key:
+        cached = _fragment_cache.get(key)
+        if cached is not None:
+            _fragment_cache.move_to_end(key)
+            return cached
+
+    fragment = TRANSCRIPT_FORMATS[fmt].format(
+        type=message.type,
+        content=get_message_text(message),
+        index=index
+    )
+    if message_key:
+        _fragment_cache[key] = fragment
+        if len(_fragment_cache) > MAX_CACHED_FRAGMENTS:
+            _fragment_cache.popitem(last=False)
+    return fragment
+
+def render_transcript(
+    messages: Sequence[BaseMessage],
+    fmt: str = "xml",
+    separator: str = "\n"
+) -> str:
+    """
+    Render a list of messages into a transcript.
+
+    The rendered transcript is cached by its first message. When called again
+    with the same messages plus new ones, only the new messages are rendered
+    and appended to the cached prefix. The whole cached sequence of IDs and
+    contents must match, so removed, reordered or edited messages are never
+    served from a stale prefix.
+
+    Args:
+        messages: The messages to render
+        fmt: One of `TRANSCRIPT_FORMATS`
+        separator: Text placed between fragments
+
+    Returns:
+        str: The rendered transcript
+    """
+    if not messages:
+        return ""
+    first_id = getattr(messages[0], "id", None)
+    if not first_id:
+        return separator.join(render_message(msg, fmt, idx) for idx, msg in enumerate(messages))
+
+    message_keys = [get_message_key(msg) for msg in messages]
+    key = (fmt, separator, first_id)
+    rendered_count, transcript = 0, ""
+    cached = _transcript_cache.get(key)
+    if cached is not None:
+        cached_keys, text = cached
+        count = len(cached_keys)
+        if count <= len(messages) and tuple(message_keys[:count]) == cached_keys:
+            rendered_count, transcript = count, text
+
+    new_fragments: List[str] = [
+        render_message(messages[idx], fmt, idx) for idx in range(rendered_count, len(messages))
+    ]
+    if new_fragments:
+        transcript = separator.join([transcript, *new_fragments] if rendered_count else new_fragments)
+
+    if all(message_keys):
+        _transcript_cache[key] = (tuple(message_keys), transcript)
+        _transcript_cache.move_to_end(key)
+        if len(_transcript_cache) > MAX_CACHED_TRANSCRIPTS:
+            _transcript_cache.popitem(last=False)
+    return transcript
@@ -23,7 +23,7 @@ def extract_urls(text: str) -> List[str]:
     processed_text = re.sub(markdown_link_regex, replace_with_spaces, text)
     
     # Then look for any remaining plain URLs in the text
-    plain_url_regex = r'https?:\/\/[^\s<\]]+(?:[^<.,:;"\']\]\s)]|(?=\s|$))'
+    plain_url_regex = r'https?:\/\/[^\s<\]]+(?:[^<.,:;"\'\]\s)]|(?=\s|$))'
     plain_urls = re.findall(plain_url_regex, processed_text)
     urls.update(plain_urls)
     
@@ -0,0 +1,98 @@
+import os
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Keep the caches, rate limits and background queue of the tests in memory or in a temp dir
+os.environ.setdefault("OC_RESPONSE_CACHE_PATH", "")
+os.environ.setdefault("OC_RATE_LIMIT_PATH", "")
+os.environ.setdefault("OC_BACKGROUND_QUEUE_PATH", ":memory:")
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+def get_tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        return tool.get("name") or tool.get("function", {}).get("name")
+    return getattr(tool, "name", None) or tool.__name__
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering with `respond(messages, tool_names)`, to drive nodes without a provider.
+
+    Streaming splits the content into words, and tool call arguments into
+    small chunks, like providers do.
+    """
+
+    respond: Callable[[List[BaseMessage], List[str]], AIMessage]
+    tool_names: List[str] = []
+    calls: List[Dict[str, Any]]
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools: List[Any], tool_choice: Optional[str] = None, **kwargs: Any) -> "FakeChatModel":
+        return self.model_copy(update={"tool_names": [get_tool_name(tool) for tool in tools]})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        self.calls.append({"messages": messages, "tool_names": self.tool_names})
+        return self.respond(messages, self.tool_names)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._respond(messages)
+        for idx, tool_call in enumerate(message.tool_calls):
+            args = json.dumps(tool_call["args"])
+            for start in range(0, len(args), 7):
+                first = start == 0
+                yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": tool_call["name"] if first else None,
+                    "id": tool_call["id"] if first else None,
+                    "args": args[start:start + 7],
+                    "index": idx
+                }]))
+        if isinstance(message.content, str) and message.content:
+            words = message.content.split(" ")
+            for idx, word in enumerate(words):
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word if idx == 0 else f" {word}"))
+
+def tool_call_message(name: str, args: Dict[str, Any]) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}"}])
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Replace the provider chat models with a `FakeChatModel`.
+
+    Set `fake_model.respond` to choose the responses. By default, tool calls
+    get no response and other calls get "Hello there!".
+    """
+    from agents.src import utils
+
+    model = FakeChatModel(respond=lambda messages, tool_names: AIMessage(content="Hello there!"), calls=[])
+    monkeypatch.setattr(utils, "ChatOpenAI", lambda **kwargs: model)
+    monkeypatch.setattr(utils, "ChatAnthropic", lambda **kwargs: model)
+    return model
+
+class FakeBackgroundExecutor:
+    def __init__(self):
+        self.jobs: List[Dict[str, Any]] = []
+
+    async def submit(self, graph_name: str, input: Dict[str, Any], config: Dict[str, Any], **kwargs: Any) -> bool:
+        self.jobs.append({"graph": graph_name, "input": input, "config": config, **kwargs})
+        return True
+
+@pytest.fixture
+def background_jobs(monkeypatch) -> List[Dict[str, Any]]:
+    """Record the background graph runs the Open Canvas nodes schedule, instead of running them."""
+    from agents.src.open_canvas import index
+    from agents.src.open_canvas.nodes import generate_title, reflect, summarizer
+
+    executor = FakeBackgroundExecutor()
+    monkeypatch.setattr(index, "start_background_executor", lambda store=None, checkpointer=None: executor)
+    for module in (generate_title, reflect, summarizer):
+        monkeypatch.setattr(module, "use_in_process_background_execution", lambda: True)
+        monkeypatch.setattr(module, "get_background_executor", lambda: executor)
+    return executor.jobs
@@ -0,0 +1,169 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+from agents.src.open_canvas.index import builder
+from agents.src import metrics
+from shared.src.constants import OC_ARTIFACT_STREAM_EVENT
+from shared.src.types import ArtifactMarkdownV3, ArtifactV3
+from tests.conftest import tool_call_message
+
+CONFIG = {
+    "configurable": {
+        "thread_id": "thread-1",
+        "assistant_id": "assistant-1",
+        "custom_model_name": "gpt-4o-mini"
+    }
+}
+
+def route_to(route):
+    def respond(messages, tool_names):
+        if "route_query" in tool_names:
+            return tool_call_message("route_query", {"route": route})
+        return AIMessage(content="Hello there!")
+    return respond
+
+def test_reply_to_general_input_end_to_end(fake_model, background_jobs):
+    fake_model.respond = route_to("reply_to_general_input")
+    graph = builder.compile(store=InMemoryStore())
+    message = HumanMessage(content="Hi! What can you do?", id="human-1")
+
+    result = asyncio.run(graph.ainvoke({"messages": [message], "_messages": [message]}, CONFIG))
+
+    assert [msg.content for msg in result["messages"]] == ["Hi! What can you do?", "Hello there!"]
+    assert [msg.content for msg in result["_messages"]] == ["Hi! What can you do?", "Hello there!"]
+    assert all(msg.id for msg in result["_messages"])
+    # Routed, then replied
+    assert [call["tool_names"] for call in fake_model.calls] == [["route_query"], []]
+    # The first turn schedules a title, and `cleanState` resets the inputs
+    assert [job["graph"] for job in background_jobs] == ["thread_title"]
+    assert result.get("next") is None
+    assert result["_messages_token_count"] > 0
+
+@pytest.mark.parametrize("as_dict", [False, True])
+def test_reply_to_general_input_with_an_artifact(fake_model, background_jobs, as_dict):
+    fake_model.respond = route_to("reply_to_general_input")
+    graph = builder.compile(store=InMemoryStore())
+    message = HumanMessage(content="What is this poem about?", id="human-1")
+    artifact = ArtifactV3(current_index=1, contents=[
+        ArtifactMarkdownV3(index=1, type="text", title="Roses", full_markdown="Roses are red,\nviolets are blue.")
+    ])
+
+    result = asyncio.run(graph.ainvoke(
+        {"messages": [message], "_messages": [message], "artifact": artifact.dict() if as_dict else artifact},
+        CONFIG
+    ))
+
+    assert result["messages"][-1].content == "Hello there!"
+    reply_call = fake_model.calls[-1]
+    assert "Roses are red" in reply_call["messages"][0].content
+
+def test_generate_artifact_streams_the_tool_call(fake_model, background_jobs):
+    def respond(messages, tool_names):
+        if "route_query" in tool_names:
+            return tool_call_message("route_query", {"route": "generate_artifact"})
+        if "generate_artifact" in tool_names:
+            return tool_call_message("generate_artifact", {
+                "type": "text",
+                "language": "other",
+                "title": "Roses",
+                "artifact": "Roses are red,\nviolets are blue."
+            })
+        return AIMessage(content="Here is your poem. Want another?")
+    fake_model.respond = respond
+    graph = builder.compile(store=InMemoryStore())
+    message = HumanMessage(content="Write me a poem", id="human-1")
+
+    async def run():
+        deltas, result = [], None
+        async for event in graph.astream_events({"messages": [message], "_messages": [message]}, CONFIG, version="v2"):
+            if event["event"] == "on_custom_event" and event["name"] == OC_ARTIFACT_STREAM_EVENT:
+                deltas.append(event["data"])
+            elif event["event"] == "on_chain_end" and event["name"] == graph.get_name():
+                result = event["data"]["output"]
+        return deltas, result
+
+    deltas, result = asyncio.run(run())
+
+    # The artifact text arrived in several deltas, before the tool call finished
+    assert len(deltas) > 1
+    assert "".join(delta["delta"] for delta in deltas) == "Roses are red,\nviolets are blue."
+    assert deltas[-1]["title"] == "Roses"
+    [content] = result["artifact"].contents
+    assert (content.type, content.title, content.full_markdown) == ("text", "Roses", "Roses are red,\nviolets are blue.")
+    assert result["messages"][-1].content == "Here is your poem. Want another?"
+    assert sorted(job["graph"] for job in background_jobs) == ["reflection", "thread_title"]
+
+def test_rewrite_uses_the_speculative_result_when_the_type_is_unchanged(fake_model, background_jobs):
+    def respond(messages, tool_names):
+        if "route_query" in tool_names:
+            return tool_call_message("route_query", {"route": "rewrite_artifact"})
+        if "optionally_update_artifact_meta" in tool_names:
+            return tool_call_message("optionally_update_artifact_meta", {"type": "text", "language": "other"})
+        if "Roses are red" in messages[0].content:
+            return AIMessage(content="Roses are red,\nviolets are blue,\nsugar is sweet.")
+        return AIMessage(content="I made it longer.")
+    fake_model.respond = respond
+    metrics.reset_metrics("rewrite_artifact.")
+    graph = builder.compile(store=InMemoryStore())
+    message = HumanMessage(content="Make it longer", id="human-1")
+    artifact = ArtifactV3(current_index=1, contents=[
+        ArtifactMarkdownV3(index=1, type="text", title="Roses", full_markdown="Roses are red,\nviolets are blue.")
+    ])
+
+    result = asyncio.run(graph.ainvoke({"messages": [message], "_messages": [message], "artifact": artifact}, CONFIG))
+
+    assert metrics.get_metrics("rewrite_artifact.") == {"rewrite_artifact.speculation_hits": 1}
+    rewrite_calls = [call for call in fake_model.calls if "Roses are red" in call["messages"][0].content and not call["tool_names"]]
+    assert len(rewrite_calls) == 1
+    assert result["artifact"].current_index == 2
+    new_content = result["artifact"].contents[-1]
+    assert (new_content.index, new_content.title) == (2, "Roses")
+    assert new_content.full_markdown == "Roses are red,\nviolets are blue,\nsugar is sweet."
+
+def test_rewrite_artifact_theme_translates_a_client_artifact(fake_model, background_jobs):
+    fake_model.respond = lambda messages, tool_names: AIMessage(content="Las rosas son rojas.")
+    store = InMemoryStore()
+    store.put(("memories", "assistant-1"), "reflection", {"style_rules": ["Keep poems short"], "content": []})
+    graph = builder.compile(store=store)
+    message = HumanMessage(content="Translate it", id="human-1")
+    # Sent by the client, so the artifact is a dict
+    artifact = {"current_index": 1, "contents": [
+        {"index": 1, "type": "text", "title": "Roses", "full_markdown": "Roses are red."}
+    ]}
+
+    result = asyncio.run(graph.ainvoke(
+        {"messages": [message], "_messages": [message], "artifact": artifact, "language": "spanish"},
+        CONFIG
+    ))
+
+    assert result["artifact"].current_index == 2
+    assert result["artifact"].contents[-1].full_markdown == "Las rosas son rojas."
+    assert "Keep poems short" in fake_model.calls[0]["messages"][0].content
+
+def test_custom_action_rewrites_the_artifact(fake_model, background_jobs):
+    fake_model.respond = lambda messages, tool_names: AIMessage(content="ROSES ARE RED.")
+    store = InMemoryStore()
+    store.put(("custom_actions", "user-1"), "actions", {"action-1": {
+        "id": "action-1",
+        "title": "Shout",
+        "prompt": "Rewrite it in capitals",
+        "include_reflections": True,
+        "include_prefix": True,
+        "include_recent_history": True
+    }})
+    graph = builder.compile(store=store)
+    message = HumanMessage(content="Shout it", id="human-1")
+    artifact = ArtifactV3(current_index=1, contents=[
+        ArtifactMarkdownV3(index=1, type="text", title="Roses", full_markdown="Roses are red.")
+    ])
+    config = {"configurable": {**CONFIG["configurable"], "supabase_user_id": "user-1"}}
+
+    result = asyncio.run(graph.ainvoke(
+        {"messages": [message], "_messages": [message], "artifact": artifact, "custom_quick_action_id": "action-1"},
+        config
+    ))
+
+    new_content = result["artifact"].contents[-1]
+    assert (new_content.index, new_content.title, new_content.full_markdown) == (2, "Roses", "ROSES ARE RED.")
+    assert "Rewrite it in capitals" in fake_model.calls[0]["messages"][0].content
@@ -0,0 +1,45 @@
+import asyncio
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import StateGraph, START
+from agents.src.open_canvas import index
+from agents.src.open_canvas.state import OpenCanvasGraphState
+
+CONFIG = {"configurable": {"thread_id": "thread-1", "custom_model_name": "gpt-4o-mini"}}
+
+def run_schedule_node(state):
+    # Run the node in a graph, so `config` is injected the way it is in Open Canvas
+    graph = (
+        StateGraph(OpenCanvasGraphState)
+        .add_node("scheduleTitleOrSummary", index.schedule_title_or_summary)
+        .add_edge(START, "scheduleTitleOrSummary")
+        .compile()
+    )
+    return asyncio.run(graph.ainvoke(state, CONFIG))
+
+def test_first_turn_schedules_title(background_jobs):
+    messages = [HumanMessage(content="Hi", id="1"), AIMessage(content="Hello!", id="2")]
+    run_schedule_node({"messages": messages, "_messages": messages})
+
+    assert background_jobs == [{
+        "graph": "thread_title",
+        "input": {"thread_id": "thread-1"},
+        "config": {"configurable": {"open_canvas_thread_id": "thread-1"}},
+        "checkpointer": None
+    }]
+
+def test_long_conversation_schedules_summary(background_jobs, monkeypatch):
+    monkeypatch.setattr(index, "get_summarization_threshold", lambda model_name: 10)
+    messages = [
+        HumanMessage(content=f"Message number {idx} of a long conversation", id=str(idx))
+        for idx in range(6)
+    ]
+    run_schedule_node({"messages": messages, "_messages": messages})
+
+    assert [job["graph"] for job in background_jobs] == ["summarizer"]
+    assert background_jobs[0]["input"] == {"thread_id": "thread-1"}
+
+def test_short_later_turn_schedules_nothing(background_jobs):
+    messages = [HumanMessage(content=f"Message {idx}", id=str(idx)) for idx in range(4)]
+    run_schedule_node({"messages": messages, "_messages": messages})
+
+    assert background_jobs == []
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import StateGraph, START
+from langgraph.store.memory import InMemoryStore
+from agents.src.open_canvas.nodes.update_artifact import update_artifact
+from agents.src.open_canvas.state import OpenCanvasGraphState
+
+CONFIG = {"configurable": {"assistant_id": "assistant-1", "custom_model_name": "gpt-4o-mini"}}
+CODE = "a = 1\nb = 2\nc = 3\n"
+
+def upper_case_highlight(messages, tool_names):
+    highlighted = messages[0].content.split("</highlight>", 1)[0].rsplit("<highlight>", 1)[1]
+    return AIMessage(content=highlighted.upper())
+
+def highlight(text):
+    start = CODE.index(text)
+    return {"start_char_index": start, "end_char_index": start + len(text)}
+
+def run_update(highlights):
+    graph = (
+        StateGraph(OpenCanvasGraphState)
+        .add_node("updateArtifact", update_artifact)
+        .add_edge(START, "updateArtifact")
+        .compile(store=InMemoryStore())
+    )
+    artifact = {
+        "current_index": 1,
+        "contents": [{"index": 1, "type": "code", "title": "Vars", "language": "python", "code": CODE}]
+    }
+    message = HumanMessage(content="Upper case it", id="human-1")
+    result = asyncio.run(graph.ainvoke(
+        {"_messages": [message], "artifact": artifact, "highlighted_codes": highlights}, CONFIG
+    ))
+    assert result["artifact"].current_index == 2
+    return result["artifact"].contents[-1]
+
+@pytest.fixture
+def upper_case_model(fake_model):
+    fake_model.respond = upper_case_highlight
+    return fake_model
+
+def test_separate_highlights_are_updated_in_one_version(upper_case_model):
+    content = run_update([highlight("c = 3"), highlight("a = 1")])
+
+    assert (content.index, content.title, content.language) == (2, "Vars", "python")
+    assert content.code == "A = 1\nb = 2\nC = 3\n"
+    assert len(upper_case_model.calls) == 2
+
+def test_nested_highlight_is_updated_with_the_outer_one(upper_case_model):
+    content = run_update([highlight("b = 2\nc = 3"), highlight("c")])
+
+    assert content.code == "a = 1\nB = 2\nC = 3\n"
+    assert len(upper_case_model.calls) == 1
+
+def test_partially_overlapping_highlights_raise(upper_case_model):
+    with pytest.raises(ValueError, match="partially overlap"):
+        run_update([highlight("a = 1\nb"), highlight("b = 2")])
+    assert upper_case_model.calls == []
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import StateGraph, START
+from agents.src.open_canvas.nodes.update_highlighted_text import update_highlighted_text
+from agents.src.open_canvas.state import OpenCanvasGraphState
+
+CONFIG = {"configurable": {"custom_model_name": "gpt-4o-mini"}}
+MARKDOWN = "Same\n\nMiddle\n\nSame"
+
+def upper_case_block(messages, tool_names):
+    block = messages[0].content.split("# Text block\n", 1)[1].split("\n\nYour task", 1)[0]
+    return AIMessage(content=block.upper())
+
+def highlight(block, **kwargs):
+    return {"full_markdown": MARKDOWN, "markdown_block": block, "selected_text": block, **kwargs}
+
+def run_update(highlights):
+    graph = (
+        StateGraph(OpenCanvasGraphState)
+        .add_node("updateHighlightedText", update_highlighted_text)
+        .add_edge(START, "updateHighlightedText")
+        .compile()
+    )
+    artifact = {
+        "current_index": 1,
+        "contents": [{"index": 1, "type": "text", "title": "Notes", "full_markdown": MARKDOWN}]
+    }
+    message = HumanMessage(content="Shout it", id="human-1")
+    result = asyncio.run(graph.ainvoke(
+        {"_messages": [message], "artifact": artifact, "highlighted_texts": highlights}, CONFIG
+    ))
+    assert result["artifact"].current_index == 2
+    return result["artifact"].contents[-1].full_markdown
+
+@pytest.fixture
+def upper_case_model(fake_model):
+    fake_model.respond = upper_case_block
+    return fake_model
+
+def test_repeated_block_is_updated_where_it_was_highlighted(upper_case_model):
+    assert run_update([highlight("Middle"), highlight("Same")]) == "Same\n\nMIDDLE\n\nSAME"
+    assert run_update([highlight("Same", block_start=14)]) == "Same\n\nMiddle\n\nSAME"
+
+def test_partially_overlapping_blocks_raise(upper_case_model):
+    with pytest.raises(ValueError, match="partially overlap"):
+        run_update([highlight("Same\n\nMiddle"), highlight("Middle\n\nSame")])
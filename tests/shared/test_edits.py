@@ -0,0 +1,42 @@
+import pytest
+from shared.src.utils.edits import TextEdit, apply_text_edits, find_blocks, merge_nested_ranges, merge_overlapping_ranges
+
+def test_edits_use_offsets_of_the_original_text():
+    text = "one two three"
+    edits = [TextEdit(start=8, end=13, text="3"), TextEdit(start=0, end=3, text="1")]
+
+    assert apply_text_edits(text, edits) == "1 two 3"
+
+def test_overlapping_edits_raise():
+    with pytest.raises(ValueError):
+        apply_text_edits("one two", [TextEdit(start=0, end=4, text="x"), TextEdit(start=3, end=5, text="y")])
+
+def test_overlapping_ranges_are_merged():
+    regions = merge_overlapping_ranges([(10, 15), (0, 5), (12, 20), (5, 8)])
+
+    assert [(region.start, region.end, region.members) for region in regions] == [
+        (0, 5, [1]), (5, 8, [3]), (10, 20, [0, 2])
+    ]
+
+def test_nested_ranges_merge_into_the_outer_range():
+    regions = merge_nested_ranges([(12, 14), (0, 5), (10, 20)])
+
+    assert [(region.start, region.end, sorted(region.members)) for region in regions] == [(0, 5, [1]), (10, 20, [0, 2])]
+
+def test_partially_overlapping_ranges_raise():
+    with pytest.raises(ValueError, match="partially overlap"):
+        merge_nested_ranges([(0, 10), (5, 15)])
+
+def test_repeated_blocks_are_found_after_the_previous_block():
+    text = "Same\n\nMiddle\n\nSame"
+
+    assert find_blocks(text, ["Middle", "Same"]) == [(6, 12), (14, 18)]
+    # Blocks out of document order fall back to the first unclaimed occurrence
+    assert find_blocks(text, ["Same", "Middle", "Same"]) == [(0, 4), (6, 12), (14, 18)]
+    assert find_blocks(text, ["Same", "Same"], [14, None]) == [(14, 18), (0, 4)]
+
+def test_missing_blocks_raise():
+    with pytest.raises(ValueError):
+        find_blocks("Same\n\nMiddle", ["Other"])
+    with pytest.raises(ValueError):
+        find_blocks("Same\n\nMiddle", ["Same"], [3])
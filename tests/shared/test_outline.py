@@ -0,0 +1,64 @@
+from shared.src.utils import outline
+from shared.src.utils.outline import format_artifact_outline, get_artifact_outline
+
+CODE = """import os
+
+export async function loadUser(id) {
+  return fetch(id)
+}
+
+const render = (user) => user.name
+
+class UserCard:
+    def show(self):
+        pass
+"""
+
+MARKDOWN = """# Guide
+
+Some intro text.
+
+## Setup
+
+```python
+# Not a heading
+def not_a_symbol():
+    pass
+```
+
+### Details
+"""
+
+def test_code_outline_lists_definitions():
+    result = get_artifact_outline("Users", "code", CODE, "javascript")
+
+    assert result.symbols == ["function loadUser", "function render", "class UserCard", "    def show"]
+    assert result.headings == []
+    assert (result.language, result.lines, result.characters) == ("javascript", 11, len(CODE))
+
+def test_markdown_outline_skips_fenced_code():
+    result = get_artifact_outline("Guide", "text", MARKDOWN, "python")
+
+    assert result.headings == ["Guide", "  Setup", "    Details"]
+    assert result.symbols == []
+    assert result.language is None
+    assert result.preview == "# Guide\nSome intro text.\n## Setup"
+
+def test_long_outlines_are_truncated(monkeypatch):
+    monkeypatch.setattr(outline, "MAX_OUTLINE_ENTRIES", 2)
+    text = "\n".join(f"def f{idx}(): pass" for idx in range(5))
+
+    result = get_artifact_outline("Many", "code", text, "python")
+
+    assert result.symbols == ["def f0", "def f1", "... and 3 more"]
+
+def test_format_outline():
+    formatted = format_artifact_outline(get_artifact_outline("Guide", "text", MARKDOWN))
+
+    assert formatted == (
+        "Title: Guide\n"
+        "Artifact type: text\n"
+        f"Size: {len(MARKDOWN)} characters, 13 lines\n"
+        "Headings:\n- Guide\n  - Setup\n    - Details\n"
+        "Opening lines:\n# Guide\nSome intro text.\n## Setup"
+    )
@@ -0,0 +1,46 @@
+import json
+import pytest
+from shared.src.utils.partial_json import PartialJsonObjectParser
+
+ARGS = {
+    "type": "code",
+    "title": "Café \"menu\"",
+    "artifact": "print('hi')\n\tdone \U0001F600",
+    "tags": ["a", {"b": "}"}],
+    "count": 3,
+    "done": True
+}
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1000])
+def test_streamed_object_matches_json_loads(chunk_size):
+    text = json.dumps(ARGS)
+    parser = PartialJsonObjectParser()
+
+    artifact_deltas = []
+    for start in range(0, len(text), chunk_size):
+        artifact_deltas.append(parser.feed(text[start:start + chunk_size]).get("artifact", ""))
+
+    assert parser.done
+    assert parser.values == ARGS
+    assert "".join(artifact_deltas) == ARGS["artifact"]
+
+def test_strings_are_available_before_they_close():
+    parser = PartialJsonObjectParser()
+
+    assert parser.feed('{"title": "Hi", "artifact": "Hello wo') == {"title": "Hi", "artifact": "Hello wo"}
+    assert parser.values == {"title": "Hi", "artifact": "Hello wo"}
+    assert not parser.done
+
+def test_escapes_split_across_deltas():
+    parser = PartialJsonObjectParser()
+
+    for delta in ['{"a": "x\\', 'u00', 'e9\\', 'ud83d', '\\ude00"}']:
+        parser.feed(delta)
+
+    assert parser.values == {"a": "xé\U0001F600"}
+
+def test_invalid_json_raises():
+    parser = PartialJsonObjectParser()
+
+    with pytest.raises(ValueError):
+        parser.feed('{"a" 1}')
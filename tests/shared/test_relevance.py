@@ -0,0 +1,32 @@
+from shared.src.utils.relevance import LexicalIndex, dedupe_texts, tokenize
+
+RULES = [
+    "Write emails in a formal tone",
+    "Use tabs in Python code",
+    "Keep poems short",
+    "Sign emails with the user's first name"
+]
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("The user writes Stories and emails") == ["write", "story", "email"]
+
+def test_top_k_keeps_the_original_order():
+    index = LexicalIndex(RULES)
+
+    assert index.top_k("Draft an email to my boss", 2) == [RULES[0], RULES[3]]
+
+def test_top_k_returns_everything_when_there_are_few_documents():
+    index = LexicalIndex(RULES)
+
+    assert index.top_k("anything", 4) == RULES
+
+def test_unmatched_documents_score_zero():
+    scores = LexicalIndex(RULES).score("python")
+
+    assert scores[1] > 0
+    assert [scores[0], scores[2], scores[3]] == [0, 0, 0]
+
+def test_dedupe_texts_keeps_the_first_near_duplicate():
+    texts = ["Use tabs in Python code", "use tabs in python code!", "Keep poems short"]
+
+    assert dedupe_texts(texts) == ["Use tabs in Python code", "Keep poems short"]
@@ -0,0 +1,53 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from shared.src.utils.thinking import (
+    HandleRewriteParams,
+    ThinkingStreamParser,
+    extract_thinking_and_response_tokens,
+    handle_rewrite_artifact_thinking
+)
+
+TEXTS = [
+    "Hello <think>processing...</think> world",
+    "  <think>\n  plan it  \n</think>\n\nThe answer  ",
+    "No thinking here",
+    "<think>Still thinking",
+    "Less than < signs <thin and </think tags"
+]
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_streamed_text_matches_the_full_parse(text, chunk_size):
+    parser = ThinkingStreamParser()
+    thinking, response = [], []
+    for start in range(0, len(text), chunk_size):
+        tokens = parser.feed(text[start:start + chunk_size])
+        thinking.append(tokens.thinking)
+        response.append(tokens.response)
+    tokens = parser.finish()
+    thinking.append(tokens.thinking)
+    response.append(tokens.response)
+
+    expected = extract_thinking_and_response_tokens(text)
+    assert ("".join(thinking), "".join(response)) == (expected.thinking, expected.response)
+    assert (parser.thinking, parser.response) == (expected.thinking, expected.response)
+
+def test_partial_tags_are_held_back():
+    parser = ThinkingStreamParser()
+
+    assert parser.feed("Hello <thi").response == "Hello"
+    assert parser.feed("nk>processing").thinking == "processing"
+
+def test_rewrite_thinking_replaces_the_thinking_message():
+    messages = [HumanMessage(content="Hi", id="1"), AIMessage(content="old", id="thinking-1")]
+
+    response, updated = handle_rewrite_artifact_thinking(HandleRewriteParams(
+        new_content="<think>new thoughts</think>The artifact",
+        messages=messages,
+        thinking_id="thinking-1"
+    ))
+
+    assert response == "The artifact"
+    assert [(msg.id, msg.content) for msg in updated] == [("1", "Hi"), ("thinking-1", "new thoughts")]
+    # The input list is not modified
+    assert messages[1].content == "old"
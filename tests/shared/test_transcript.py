@@ -0,0 +1,24 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from shared.src.utils.transcript import render_transcript
+
+def test_appended_messages_extend_the_cached_prefix():
+    messages = [SystemMessage(content="S", id="s"), HumanMessage(content="a", id="a")]
+    render_transcript(messages)
+    messages = [*messages, AIMessage(content="b", id="b")]
+
+    assert render_transcript(messages) == "<system>\nS\n</system>\n<human>\na\n</human>\n<ai>\nb\n</ai>"
+
+def test_same_ends_with_different_middle_is_not_served_from_cache():
+    s, a, b, c, d = [HumanMessage(content=name, id=name) for name in "Sabcd"]
+    render_transcript([s, a, b], "plain")
+
+    assert render_transcript([s, c, b, d], "plain") == "human: S\nhuman: c\nhuman: b\nhuman: d"
+    assert render_transcript([s, b], "plain") == "human: S\nhuman: b"
+
+def test_edited_message_is_rendered_again():
+    first = HumanMessage(content="Hello", id="h1")
+    render_transcript([first], "xml_indexed")
+    edited = HumanMessage(content="Hello again", id="h1")
+
+    assert render_transcript([edited], "xml_indexed") == '<human index="0">\nHello again\n</human>'
+    assert render_transcript([edited, AIMessage(content="Hi", id="a1")], "plain") == "human: Hello again\nai: Hi"
@@ -0,0 +1,92 @@
+import asyncio
+from langchain_core.load import dumpd
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, START
+from langgraph.store.memory import InMemoryStore
+from typing_extensions import TypedDict
+from agents.src import background
+from agents.src.background import BackgroundExecutor
+from agents.src.utils import get_checkpointer_from_config, get_store_from_config
+
+class JobState(TypedDict):
+    thread_id: str
+
+def recording_graph(runs):
+    async def run(state: JobState, config: RunnableConfig):
+        runs.append({
+            "thread_id": state["thread_id"],
+            "store": get_store_from_config(config),
+            "checkpointer": get_checkpointer_from_config(config)
+        })
+        return {}
+    return StateGraph(JobState).add_node("run", run).add_edge(START, "run").compile()
+
+def use_graph(monkeypatch, graph):
+    class Module:
+        pass
+    module = Module()
+    module.graph = graph
+    monkeypatch.setattr(background.importlib, "import_module", lambda name: module)
+
+async def wait_for_empty_queue(executor):
+    for _ in range(100):
+        if await executor.pending_count() == 0:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Jobs did not run")
+
+def test_jobs_get_the_store_and_checkpointer(monkeypatch, tmp_path):
+    runs = []
+    use_graph(monkeypatch, recording_graph(runs))
+    executor = BackgroundExecutor(queue_path=str(tmp_path / "jobs.sqlite3"))
+    store, checkpointer = InMemoryStore(), InMemorySaver()
+
+    async def main():
+        assert await executor.submit("thread_title", {"thread_id": "thread-1"}, {}, store=store, checkpointer=checkpointer)
+        await wait_for_empty_queue(executor)
+
+    asyncio.run(main())
+
+    assert runs == [{"thread_id": "thread-1", "store": store, "checkpointer": checkpointer}]
+
+def test_queued_jobs_resume_on_start(monkeypatch, tmp_path):
+    runs = []
+    use_graph(monkeypatch, recording_graph(runs))
+    queue_path = str(tmp_path / "jobs.sqlite3")
+    # Queued by a process that stopped before running them
+    BackgroundExecutor(queue_path=queue_path)._insert_job(
+        "thread_title", dumpd({"thread_id": "thread-1"}), {}, 0, None, None
+    )
+    executor = BackgroundExecutor(queue_path=queue_path)
+
+    async def main():
+        executor.start()
+        await wait_for_empty_queue(executor)
+
+    asyncio.run(main())
+
+    assert [run["thread_id"] for run in runs] == ["thread-1"]
+
+def test_store_graphs_wait_for_a_store(monkeypatch, tmp_path):
+    runs = []
+    use_graph(monkeypatch, recording_graph(runs))
+    queue_path = str(tmp_path / "jobs.sqlite3")
+    BackgroundExecutor(queue_path=queue_path)._insert_job(
+        "reflection", dumpd({"thread_id": "thread-1"}), {}, 0, None, None
+    )
+    executor = BackgroundExecutor(queue_path=queue_path)
+    store = InMemoryStore()
+
+    async def main():
+        executor.start()
+        await asyncio.sleep(0.05)
+        assert runs == []
+        assert await executor.pending_count() == 1
+
+        executor.start(store=store)
+        await wait_for_empty_queue(executor)
+
+    asyncio.run(main())
+
+    assert [run["store"] for run in runs] == [store]
@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from agents.src import failover, metrics
+
+class ServerError(Exception):
+    status_code = 503
+
+class BadRequestError(Exception):
+    status_code = 400
+
+@pytest.fixture
+def models(monkeypatch):
+    """Fake the model calls. Map a model name to an exception to raise, or a delay before responding."""
+    behavior = {}
+    calls = []
+
+    async def get_model_from_config(config, extra=None):
+        return config["configurable"]["custom_model_name"]
+
+    async def coalesced_invoke(model, messages, run_config=None):
+        calls.append(model)
+        result = behavior.get(model, 0)
+        if isinstance(result, Exception):
+            raise result
+        await asyncio.sleep(result)
+        return f"response from {model}"
+
+    monkeypatch.setattr(failover, "_health", {})
+    monkeypatch.setattr(failover, "get_model_from_config", get_model_from_config)
+    monkeypatch.setattr(failover, "coalesced_invoke", coalesced_invoke)
+    monkeypatch.setattr(failover, "get_model_alternatives", lambda name: {"primary": ["backup"]}.get(name, []))
+    metrics.reset_metrics("failover.")
+    return behavior, calls
+
+def invoke(**kwargs):
+    return asyncio.run(failover.invoke_with_failover({"configurable": {"custom_model_name": "primary"}}, [], **kwargs))
+
+def test_retryable_errors_fail_over(models):
+    behavior, calls = models
+    behavior["primary"] = ServerError()
+
+    assert invoke() == "response from backup"
+    assert calls == ["primary", "backup"]
+    assert metrics.get_metrics("failover.") == {"failover.primary.failovers": 1, "failover.primary.fallback_wins": 1}
+
+def test_bad_requests_do_not_fail_over(models):
+    behavior, calls = models
+    behavior["primary"] = BadRequestError()
+
+    with pytest.raises(BadRequestError):
+        invoke()
+    assert calls == ["primary"]
+
+def test_open_circuits_are_skipped(models):
+    behavior, calls = models
+    for _ in range(failover.CIRCUIT_FAILURE_THRESHOLD):
+        failover.get_model_health("primary").record_failure()
+
+    assert invoke() == "response from backup"
+    assert calls == ["backup"]
+
+def test_slow_requests_are_hedged(models, monkeypatch):
+    behavior, calls = models
+    behavior["primary"] = 1.0
+    monkeypatch.setenv(failover.HEDGED_REQUESTS_ENV, "true")
+    monkeypatch.setattr(failover, "MIN_HEDGE_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(failover, "DEFAULT_HEDGE_DELAY_SECONDS", 0.01)
+
+    assert invoke(hedge=True) == "response from backup"
+    assert calls == ["primary", "backup"]
+    assert metrics.get_metrics("failover.") == {"failover.primary.hedges": 1, "failover.primary.fallback_wins": 1}
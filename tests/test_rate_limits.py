@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+from agents.src.rate_limits import ProviderRateLimiter, RetryBudget, TokenBucketStore, get_retry_delay
+
+def test_take_waits_for_refill(tmp_path):
+    for store in (TokenBucketStore(None), TokenBucketStore(str(tmp_path / "buckets.sqlite3"))):
+        assert store.take("bucket", 2, rate=1, capacity=2) == 0
+        wait = store.take("bucket", 1, rate=1, capacity=2)
+        assert 0.9 < wait <= 1
+
+def test_amounts_over_capacity_are_admitted_once_full():
+    store = TokenBucketStore(None)
+
+    assert store.take("bucket", 10, rate=1, capacity=2) == 0
+    # The bucket is left in debt
+    assert store.take("bucket", 1, rate=1, capacity=2) > 8
+
+def test_buckets_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    TokenBucketStore(path).take("bucket", 2, rate=0.001, capacity=2)
+
+    assert TokenBucketStore(path).take("bucket", 1, rate=0.001, capacity=2) > 0
+
+def test_waiting_for_the_database_does_not_block_the_loop(tmp_path):
+    store = TokenBucketStore(str(tmp_path / "buckets.sqlite3"))
+    # Another thread holds the store, like a slow transaction in another process
+    store._lock.acquire()
+    threading.Timer(0.2, store._lock.release).start()
+
+    async def main():
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        ticker = asyncio.ensure_future(tick())
+        started = time.monotonic()
+        assert await store.atake("bucket", 1, rate=1, capacity=1) == 0
+        ticker.cancel()
+        return ticks, time.monotonic() - started
+
+    ticks, elapsed = asyncio.run(main())
+
+    assert elapsed >= 0.15
+    assert ticks > 5
+
+def test_limiter_waits_for_the_request_bucket(monkeypatch):
+    monkeypatch.setenv("OC_RATE_LIMITS", '{"openai": {"requests_per_minute": 60, "tokens_per_minute": 0}}')
+    limiter = ProviderRateLimiter("openai", "key", TokenBucketStore(None))
+
+    async def main():
+        for _ in range(60):
+            assert await limiter.aacquire(blocking=False)
+        return await limiter.aacquire(blocking=False)
+
+    assert asyncio.run(main()) is False
+
+def test_retry_budget_is_earned_by_successes():
+    budget = RetryBudget(TokenBucketStore(None))
+
+    async def main():
+        spent = 0
+        while await budget.atry_spend():
+            spent += 1
+        for _ in range(10):
+            await budget.arecord_success()
+        return spent, await budget.atry_spend()
+
+    spent, retried = asyncio.run(main())
+    assert spent == 20
+    assert retried
+
+def test_retry_delay_honors_retry_after():
+    class Response:
+        headers = {"retry-after": "3"}
+    class RateLimitError(Exception):
+        response = Response()
+
+    assert get_retry_delay(RateLimitError(), 1) == 3
+    assert 0 <= get_retry_delay(Exception(), 2) <= 4
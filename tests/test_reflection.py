@@ -0,0 +1,48 @@
+import asyncio
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+from agents.src.reflection import index as reflection
+from tests.conftest import tool_call_message
+
+CONFIG = {"configurable": {"open_canvas_assistant_id": "assistant-1"}}
+
+def add_rule(messages, tool_names):
+    return tool_call_message("generate_reflections", {"style_rules": [{"action": "add", "text": "Be brief"}], "content": []})
+
+def reflect(store, messages):
+    graph = reflection.graph.copy(update={"store": store})
+    asyncio.run(graph.ainvoke({"thread_id": "thread-1", "messages": messages}, CONFIG))
+
+def reflected_conversations(fake_model):
+    return [call["messages"][-1].content for call in fake_model.calls]
+
+def test_messages_without_ids_are_not_reflected_on_twice(fake_model, monkeypatch):
+    monkeypatch.setattr(reflection, "ChatAnthropic", lambda **kwargs: fake_model)
+    fake_model.respond = add_rule
+    store = InMemoryStore()
+    messages = [HumanMessage(content="Keep it short"), AIMessage(content="Sure.")]
+
+    reflect(store, messages)
+    reflect(store, messages)
+
+    assert len(fake_model.calls) == 1
+    assert store.get(("memories", "assistant-1"), "reflection").value["style_rules"] == ["Be brief"]
+
+def test_turns_over_the_budget_are_reflected_on_next_time(fake_model, monkeypatch):
+    monkeypatch.setattr(reflection, "ChatAnthropic", lambda **kwargs: fake_model)
+    monkeypatch.setitem(reflection.CONVERSATION_WINDOW_TOKEN_BUDGETS, "reflection", 50)
+    fake_model.respond = add_rule
+    store = InMemoryStore()
+    messages = [
+        HumanMessage(content=f"Message {idx}: " + "words " * 10, id=str(idx))
+        for idx in range(4)
+    ]
+
+    reflect(store, messages)
+    reflect(store, messages)
+    reflect(store, messages)
+
+    first, second = reflected_conversations(fake_model)
+    assert "Message 0" in first and "Message 1" in first and "Message 2" not in first
+    assert "Message 1" not in second and "Message 2" in second and "Message 3" in second
+    assert store.get(("memories", "assistant-1"), reflection.WATERMARKS_KEY).value["thread-1"]["message_id"] == "3"
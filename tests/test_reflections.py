@@ -0,0 +1,45 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from agents.src.utils import build_prompt_messages, format_reflections, get_reflections_query
+
+REFLECTIONS = {
+    "style_rules": [
+        "Write poems in rhyming couplets",
+        "Use British spelling",
+        "Keep code comments short",
+        "Prefer Python type hints"
+    ],
+    "content": ["The user likes roses"]
+}
+
+ANTHROPIC_CONFIG = {"configurable": {"custom_model_name": "claude-3-5-sonnet-latest"}}
+
+def test_reflections_are_selected_for_the_latest_request():
+    messages = [
+        HumanMessage(content="Write me a poem about roses"),
+        AIMessage(content="Here is your poem."),
+        HumanMessage(content="Now add Python type hints to the code")
+    ]
+
+    formatted = format_reflections(REFLECTIONS, query=get_reflections_query(messages), top_k=2)
+
+    assert "Prefer Python type hints" in formatted
+    assert "Write poems in rhyming couplets" not in formatted
+
+def test_selected_rules_keep_their_stored_order():
+    formatted = format_reflections(REFLECTIONS, query="type hints and code comments", top_k=2)
+
+    assert "- Keep code comments short\n- Prefer Python type hints" in formatted
+
+def test_reflections_follow_the_cached_prefix():
+    conversation = [HumanMessage(content="Write me a poem"), AIMessage(content="Done."), HumanMessage(content="Shorter")]
+
+    prompts = [
+        build_prompt_messages(ANTHROPIC_CONFIG, "System prompt", messages=conversation, reflections=reflections)
+        for reflections in ("- Keep poems short", "- Use British spelling")
+    ]
+
+    # Only the last message, after the cache breakpoint, differs between requests
+    assert prompts[0][:-1] == prompts[1][:-1]
+    assert prompts[0][-2].content[-1]["cache_control"] == {"type": "ephemeral"}
+    assert "- Keep poems short" in prompts[0][-1].content
+    assert "- Use British spelling" in prompts[1][-1].content
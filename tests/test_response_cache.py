@@ -0,0 +1,57 @@
+import json
+import asyncio
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from agents.src import metrics, response_cache
+from agents.src.response_cache import ResponseCache
+
+LLM_STRING = "fake-model"
+
+def prompt(message_id, content="Hi"):
+    return json.dumps([{"type": "human", "data": {"id": message_id, "content": content}}])
+
+def generations(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+def cached_text(value):
+    return value[0].message.content if value else None
+
+def test_replayed_prompts_hit_the_normalized_key():
+    cache = ResponseCache(path=None)
+    cache.update(prompt("a"), LLM_STRING, generations("Hello!"))
+
+    assert cached_text(cache.lookup(prompt("b", " Hi\n"), LLM_STRING)) == "Hello!"
+    assert cache.lookup(prompt("a"), "other-model") is None
+
+def test_entries_survive_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    metrics.reset_metrics("response_cache.")
+
+    async def main():
+        await ResponseCache(path=path).aupdate(prompt("a"), LLM_STRING, generations("Hello!"))
+        return await ResponseCache(path=path).alookup(prompt("b"), LLM_STRING)
+
+    assert cached_text(asyncio.run(main())) == "Hello!"
+    assert metrics.get_metrics("response_cache.") == {"response_cache.hits.persistent": 1}
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=-1)
+    cache.update(prompt("a"), LLM_STRING, generations("Hello!"))
+
+    assert cache.lookup(prompt("a"), LLM_STRING) is None
+
+def test_least_recently_used_entries_are_evicted_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "EVICTION_INTERVAL_WRITES", 5)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path=path, max_memory_entries=1, max_persistent_entries=3)
+
+    for idx in range(4):
+        cache.update(prompt(str(idx), f"Question {idx}"), LLM_STRING, generations(f"Answer {idx}"))
+    # Under the eviction interval, the table may exceed its max size
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 4
+
+    cache.update(prompt("4", "Question 4"), LLM_STRING, generations("Answer 4"))
+    restarted = ResponseCache(path=path)
+    assert [cached_text(restarted.lookup(prompt(str(idx), f"Question {idx}"), LLM_STRING)) for idx in range(5)] == [
+        None, None, "Answer 2", "Answer 3", "Answer 4"
+    ]
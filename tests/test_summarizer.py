@@ -0,0 +1,84 @@
+import asyncio
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from agents.src.open_canvas.index import graph as open_canvas_graph
+from agents.src.open_canvas.state import add_internal_messages
+from agents.src.summarizer import index as summarizer
+from shared.src.constants import OC_SUMMARIZED_MESSAGE_KEY, OC_SUMMARY_WATERMARK_KEY
+from shared.src.utils.tokens import count_text_tokens
+
+def summary_message(watermark, id="summary"):
+    return HumanMessage(
+        content=f"{summarizer.SUMMARY_MESSAGE_PREFIX}Earlier turns",
+        id=id,
+        additional_kwargs={OC_SUMMARIZED_MESSAGE_KEY: True, OC_SUMMARY_WATERMARK_KEY: watermark}
+    )
+
+def test_internal_messages_get_ids():
+    messages = add_internal_messages([], [HumanMessage(content="Hi")])
+    messages = add_internal_messages(messages, [AIMessage(content="Hello!")])
+
+    assert [msg.content for msg in messages] == ["Hi", "Hello!"]
+    assert all(msg.id for msg in messages)
+
+def test_summary_replaces_the_messages_it_folded():
+    current = [HumanMessage(content=str(idx), id=str(idx)) for idx in range(5)]
+    # Summarized 0-1 and kept 2-3 as the tail, while 4 was added
+    update = [summary_message("1"), *current[2:4]]
+
+    messages = add_internal_messages(current, update)
+
+    assert [msg.id for msg in messages] == ["summary", "2", "3", "4"]
+
+def test_split_starts_after_the_watermark():
+    messages = [
+        summary_message("1"),
+        *[HumanMessage(content=f"Message {idx}", id=str(idx)) for idx in range(1, 5)]
+    ]
+
+    previous, to_fold, tail = summarizer.split_messages_for_summary(messages, 0, summarizer.SUMMARIZER_MODEL_NAME)
+
+    assert previous.id == "summary"
+    assert [msg.id for msg in to_fold] == ["2", "3"]
+    assert [msg.id for msg in tail] == ["4"]
+
+def test_summarizer_graph_records_the_watermark(fake_model, monkeypatch):
+    monkeypatch.setattr(summarizer, "ChatAnthropic", lambda **kwargs: fake_model)
+    fake_model.respond = lambda messages, tool_names: AIMessage(content="The user said hi a few times.")
+    checkpointer = InMemorySaver()
+    thread = {"configurable": {"thread_id": "thread-1"}}
+    open_canvas = open_canvas_graph.copy(update={"checkpointer": checkpointer})
+    # Messages added to `_messages` get IDs from its reducer
+    asyncio.run(open_canvas.aupdate_state(
+        thread,
+        {"_messages": [HumanMessage(content=f"Hi number {idx}") for idx in range(4)]},
+        as_node="cleanState"
+    ))
+    messages = asyncio.run(open_canvas.aget_state(thread)).values["_messages"]
+
+    asyncio.run(summarizer.graph.ainvoke(
+        {"thread_id": "thread-1"},
+        {"configurable": {"summarizer_tail_tokens": 0, "checkpointer": checkpointer}}
+    ))
+
+    # The summary is written to the thread through the checkpointer
+    summary, *tail = asyncio.run(open_canvas.aget_state(thread)).values["_messages"]
+    assert summary.content == f"{summarizer.SUMMARY_MESSAGE_PREFIX}The user said hi a few times."
+    assert summary.additional_kwargs[OC_SUMMARY_WATERMARK_KEY] == messages[2].id
+    assert [msg.id for msg in tail] == [messages[3].id]
+
+def test_map_reduce_prompts_fit_the_chunk_budget(fake_model):
+    budget = 400
+    # Every partial summary fills a call on its own, so they can't be grouped
+    fake_model.respond = lambda messages, tool_names: AIMessage(content="summary " * budget)
+    messages = [HumanMessage(content=f"Message {idx}: " + "words " * 100, id=str(idx)) for idx in range(12)]
+
+    asyncio.run(summarizer.map_reduce_summarize(
+        fake_model, messages, "The previous summary. " * 100, budget, 4, 100
+    ))
+
+    prompts = [call["messages"][-1].content for call in fake_model.calls]
+    reduce_prompts = [prompt for prompt in prompts if prompt.startswith("The conversation was split")]
+    assert len(reduce_prompts) > 1
+    assert all(count_text_tokens(prompt, summarizer.SUMMARIZER_MODEL_NAME) <= budget for prompt in reduce_prompts)
+    assert "<existing-summary>" in prompts[-1]
@@ -0,0 +1,26 @@
+import asyncio
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from agents.src.open_canvas.index import graph as open_canvas_graph
+from agents.src.thread_title.index import graph as thread_title_graph
+from tests.conftest import tool_call_message
+
+def test_title_is_written_through_the_checkpointer(fake_model):
+    fake_model.respond = lambda messages, tool_names: tool_call_message("generate_title", {"title": "Greetings"})
+    checkpointer = InMemorySaver()
+    thread = {"configurable": {"thread_id": "thread-1"}}
+    open_canvas = open_canvas_graph.copy(update={"checkpointer": checkpointer})
+    messages = [HumanMessage(content="Hi"), AIMessage(content="Hello!")]
+    asyncio.run(open_canvas.aupdate_state(thread, {"messages": messages}, as_node="cleanState"))
+
+    asyncio.run(thread_title_graph.ainvoke(
+        {"thread_id": "thread-1"},
+        {"configurable": {"checkpointer": checkpointer}}
+    ))
+
+    state = asyncio.run(open_canvas.aget_state(thread))
+    assert state.metadata["thread_title"] == "Greetings"
+    assert [msg.content for msg in state.values["messages"]] == ["Hi", "Hello!"]
+    assert state.next == ()
+    # The conversation was read from the thread
+    assert "Hello!" in fake_model.calls[0]["messages"][-1].content